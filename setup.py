@@ -14,7 +14,8 @@ VERSION = "1.0.0"
 
 REQUIRES = [
     "connexion",
-    "swagger-ui-bundle>=0.0.2"
+    "swagger-ui-bundle>=0.0.2",
+    "PyJWT[crypto]>=2.4.0"
 ]
 
 setup(
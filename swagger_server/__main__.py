@@ -2,13 +2,14 @@
 
 import connexion
 
-from swagger_server import encoder
+from swagger_server import deadline, encoder
 
 
 def main():
     app = connexion.App(__name__, specification_dir='./swagger/')
     app.app.json_encoder = encoder.JSONEncoder
     app.add_api('swagger.yaml', arguments={'title': 'Tienda y Pasarela de Pago (TPP)', 'host': '0.0.0.0'}, pythonic_params=True)
+    deadline.instalar(app.app)
     app.run(port=8082)
 
 
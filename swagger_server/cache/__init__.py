@@ -0,0 +1,4 @@
+from .single_flight import SingleFlight
+from .ttl_cache import TTLCache
+
+__all__ = ['SingleFlight', 'TTLCache']
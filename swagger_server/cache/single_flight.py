@@ -0,0 +1,72 @@
+"""
+Agrupación de llamadas concurrentes idénticas (single-flight).
+
+Cuando varios hilos piden a la vez el mismo recurso (p. ej. validar el mismo
+token al cargar una página que lanza /cart, /payment y /purchase en paralelo),
+solo el primero ejecuta la llamada al origen; el resto espera su resultado
+en lugar de repetir la petición.
+"""
+
+import threading
+
+
+class _Llamada(object):
+    """Llamada en curso: evento de finalización y su resultado o excepción."""
+
+    __slots__ = ('evento', 'resultado', 'error')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Ejecuta como mucho una llamada en curso por clave.
+
+    Examples:
+        >>> grupo = SingleFlight()
+        >>> user_info = grupo.do(clave, lambda: consultar_syu(token))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def do(self, key, fn, timeout=None):
+        """
+        Ejecuta `fn()` o, si ya hay una llamada en curso con la misma clave,
+        espera a que termine y retorna su mismo resultado (o relanza su
+        excepción).
+
+        Args:
+            key: Clave que identifica la llamada.
+            fn (Callable): Función sin argumentos a ejecutar.
+            timeout (float, optional): Segundos máximos de espera para los
+                hilos que no ejecutan la llamada.
+
+        Raises:
+            TimeoutError: Si la llamada en curso no termina dentro de `timeout`.
+        """
+        with self._lock:
+            llamada = self._en_curso.get(key)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[key] = _Llamada()
+
+        if lider:
+            try:
+                llamada.resultado = fn()
+            except Exception as e:
+                llamada.error = e
+            finally:
+                with self._lock:
+                    del self._en_curso[key]
+                llamada.evento.set()
+        elif not llamada.evento.wait(timeout):
+            raise TimeoutError(f"La llamada en curso para {key!r} no terminó en {timeout}s")
+
+        if llamada.error is not None:
+            raise llamada.error
+        return llamada.resultado
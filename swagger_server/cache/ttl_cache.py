@@ -0,0 +1,103 @@
+"""
+Caché en memoria con caducidad (TTL) y tamaño acotado (LRU).
+
+Pensada para datos por usuario que se leen mucho más de lo que se escriben
+(métodos de pago, validaciones de token...). Cada proceso tiene su propia
+copia, por lo que el TTL acota el tiempo que un proceso puede servir un dato
+modificado desde otro.
+
+Características:
+    - Thread-safe (un único lock por caché)
+    - Expulsión LRU al superar `maxsize` entradas
+    - Caducidad por entrada; TTL 0 desactiva la caché (set no guarda nada)
+    - Contadores de aciertos y fallos para métricas
+    - Protección frente a escrituras obsoletas: un lector que empezó antes de
+      una invalidación no puede volver a guardar el valor antiguo (ver
+      `generation`)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_NO_ENCONTRADO = object()
+
+
+class TTLCache(object):
+    """
+    Caché clave → valor con TTL y expulsión LRU.
+
+    Args:
+        maxsize (int): Número máximo de entradas.
+        ttl (float): Segundos de vida de cada entrada.
+
+    Examples:
+        >>> cache = TTLCache(maxsize=1000, ttl=60)
+        >>> generacion = cache.generation
+        >>> valor = cache.get(user_id)
+        >>> if valor is None:
+        ...     valor = consultar_bd(user_id)
+        ...     cache.set(user_id, valor, generation=generacion)
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        """Contador que se incrementa con cada invalidación (pop/clear)."""
+        return self._generation
+
+    def get(self, key, default=None):
+        """Retorna el valor de `key` si existe y no ha caducado, o `default`."""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(key, _NO_ENCONTRADO)
+            if entrada is not _NO_ENCONTRADO:
+                valor, caduca = entrada
+                if caduca > ahora:
+                    self._datos.move_to_end(key)
+                    self.hits += 1
+                    return valor
+                del self._datos[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, generation=None):
+        """
+        Guarda `value` en `key` durante `ttl` segundos (por defecto el de la caché).
+
+        Si se indica `generation` y desde entonces ha habido alguna
+        invalidación, el valor se descarta por poder estar obsoleto.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._datos[key] = (value, time.monotonic() + ttl)
+            self._datos.move_to_end(key)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def pop(self, key):
+        """Invalida la entrada `key` (si existe)."""
+        with self._lock:
+            self._generation += 1
+            self._datos.pop(key, None)
+
+    def clear(self):
+        """Invalida todas las entradas."""
+        with self._lock:
+            self._generation += 1
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
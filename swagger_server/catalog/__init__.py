@@ -0,0 +1,6 @@
+from .blobstore import BlobStore, BlobsEnMemoria
+from .covers import Cover, CoverRef, CoverStore, cover_store
+from .search import SearchIndex
+from .snapshot import CatalogCache, CatalogSnapshot, catalog_cache
+
+__all__ = ['BlobStore', 'BlobsEnMemoria', 'Cover', 'CoverRef', 'CoverStore', 'CatalogCache', 'CatalogSnapshot', 'SearchIndex', 'catalog_cache', 'cover_store']
@@ -0,0 +1,489 @@
+"""
+Almacén en disco de blobs direccionados por contenido (portadas).
+
+Las portadas decodificadas se guardan una sola vez por contenido (sha256) en
+un fichero de datos de solo-añadir, con un índice hash → (offset, longitud,
+tipo MIME) en un fichero de texto aparte. El fichero de datos se lee mediante
+mmap, por lo que las imágenes no ocupan memoria del heap de Python: viven en
+la caché de páginas del sistema operativo, compartida entre workers, y se
+conservan entre reinicios.
+
+Formato:
+    - <dir>/covers.blob: concatenación de los blobs
+    - <dir>/covers.idx: una línea por blob "<sha256> <offset> <longitud> <mime>"
+    - <dir>/covers.lock: fichero vacío para serializar escrituras entre procesos
+    - <dir>/covers.vivos.<host>.<pid>: hashes que referencia el catálogo vivo
+      de cada proceso (ver retener()), uno por línea
+
+Compactación:
+    Los ficheros solo crecen al añadir portadas nuevas, así que cuando el de
+    datos supera `max_bytes` se reescriben (covers.blob y covers.idx nuevos que
+    sustituyen a los anteriores con os.replace) conservando solo los blobs
+    usados (put, get u open) desde la compactación anterior o en el periodo
+    previo a ella, y los que retiene el catálogo vivo de cualquier proceso
+    (ficheros covers.vivos.*). Las portadas del catálogo se vuelven a guardar
+    en cada refresco, así que una portada que ya no usa nadie desaparece en
+    como mucho dos compactaciones. El siguiente umbral es el doble de lo que
+    queda, para no compactar en bucle si las portadas vivas ocupan casi
+    `max_bytes`. Los ficheros covers.vivos.* de procesos que ya no existen
+    (en el mismo host) o que no se renuevan en `caducidad_vivos` segundos se
+    borran al compactar.
+
+Concurrencia:
+    - Entre hilos, un lock protege escrituras y relecturas del índice
+    - Entre procesos (varios workers sobre el mismo directorio), las
+      escrituras y compactaciones se serializan con fcntl.flock cuando está
+      disponible (no lo está en Windows: allí un único proceso debe escribir)
+    - Antes de escribir, y cuando se pide un hash desconocido, se leen las
+      entradas que otros procesos hayan añadido al índice. Si otro proceso ha
+      compactado (cambia el inodo del índice, que se mantiene abierto para
+      que no se reutilice) el índice se relee entero, y put() vuelve a
+      guardar los blobs que hayan desaparecido
+    - Cada proceso publica con retener() los blobs de su catálogo vivo, y
+      ninguna compactación los descarta aunque ese proceso no los haya usado
+      recientemente
+"""
+
+import hashlib
+import mmap
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_PREFIJO_VIVOS = "covers.vivos."
+# Segundos entre renovaciones (mtime) de un fichero covers.vivos.* sin cambios
+_RENOVAR_VIVOS = 60
+
+
+def _proceso_vivo(pid):
+    """True si existe un proceso con ese pid en este host (siempre True fuera de POSIX)."""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SegmentoBlob(object):
+    """
+    Objeto fichero de solo lectura limitado a un blob dentro del fichero de datos.
+
+    Expone fileno() y está posicionado al inicio del blob, de modo que los
+    servidores WSGI con wsgi.file_wrapper pueden enviarlo con sendfile (sin
+    copias) limitándose a Content-Length. Si no, read() sirve trozos del mmap.
+    """
+
+    def __init__(self, fichero, offset, vista):
+        self._fichero = fichero
+        self._fichero.seek(offset)
+        self._vista = vista
+        self._posicion = 0
+
+    def fileno(self):
+        return self._fichero.fileno()
+
+    def read(self, size=-1):
+        fin = len(self._vista) if size is None or size < 0 else min(len(self._vista), self._posicion + size)
+        trozo = bytes(self._vista[self._posicion:fin])
+        self._posicion = fin
+        return trozo
+
+    def close(self):
+        self._fichero.close()
+        self._vista.release()
+
+
+class BlobStore(object):
+    """
+    Almacén de blobs direccionado por sha256 sobre un fichero mapeado en memoria.
+
+    Args:
+        directorio (str): Directorio donde se guardan covers.blob y covers.idx
+            (se crea si no existe).
+        max_bytes (int, optional): Tamaño del fichero de datos a partir del
+            cual se compacta. 0 = nunca.
+        caducidad_vivos (float, optional): Segundos tras los que se ignora (y
+            borra) el fichero covers.vivos.* de un proceso que no lo renueva.
+    """
+
+    def __init__(self, directorio, max_bytes=0, caducidad_vivos=86400):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.caducidad_vivos = caducidad_vivos
+        self.ruta_datos = os.path.join(directorio, "covers.blob")
+        self.ruta_indice = os.path.join(directorio, "covers.idx")
+        self.ruta_lock = os.path.join(directorio, "covers.lock")
+        self.max_bytes = max_bytes
+        self._limite = max_bytes
+        # Crear los ficheros si no existen (modo 'a' no trunca)
+        for ruta in (self.ruta_datos, self.ruta_indice, self.ruta_lock):
+            open(ruta, 'ab').close()
+        self._indice = {}
+        self._leido = 0
+        self._inodos = None
+        # Índice y datos cargados, abiertos mientras sean los vigentes: así el
+        # sistema no puede reutilizar sus inodos tras una compactación de otro
+        # proceso (el índice sustituido pasaría por vigente)
+        self._ficheros = ()
+        self._mapa = None
+        # Blobs usados desde la última compactación y en el periodo anterior
+        self._usados = set()
+        self._anteriores = set()
+        # Blobs del catálogo vivo de este proceso, publicados en ruta_vivos
+        self._host = socket.gethostname()
+        self._retenidos = frozenset()
+        self._ruta_retenidos = None
+        self._retenidos_en = 0.0
+        self._lock = threading.Lock()
+        with self._lock, self._bloqueo_procesos():
+            self._leer_indice(bloqueado=True)
+
+    @contextmanager
+    def _bloqueo_procesos(self):
+        with open(self.ruta_lock, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _indice_sustituido(self):
+        """True si otro proceso ha compactado desde la última lectura del índice."""
+        return self._inodos is not None and os.stat(self.ruta_indice).st_ino != self._inodos[0]
+
+    def _leer_indice(self, bloqueado=False):
+        """
+        Incorpora las líneas del índice añadidas desde la última lectura, o lo
+        relee entero si otro proceso lo ha compactado.
+
+        Args:
+            bloqueado (bool): Si el llamante ya tiene el bloqueo entre procesos.
+        """
+        if self._indice_sustituido():
+            if not bloqueado:
+                # Esperar a que la compactación termine de sustituir ambos ficheros
+                with self._bloqueo_procesos():
+                    return self._leer_indice(bloqueado=True)
+            self._inodos = None
+        if self._inodos is None:
+            self._indice = {}
+            self._leido = 0
+            self._mapa = None
+            self._fijar_ficheros()
+
+        tam_datos = os.path.getsize(self.ruta_datos)
+        with open(self.ruta_indice, 'rb') as f:
+            f.seek(self._leido)
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break  # Línea a medio escribir por otro proceso
+                self._leido += len(linea)
+                try:
+                    blob_hash, offset, longitud, mimetype = linea.decode("ascii").split()
+                    offset, longitud = int(offset), int(longitud)
+                except ValueError:
+                    continue
+                if offset + longitud <= tam_datos:
+                    self._indice[blob_hash] = (offset, longitud, mimetype)
+
+    def _fijar_ficheros(self):
+        """Abre el índice y los datos vigentes y toma sus inodos como referencia."""
+        for f in self._ficheros:
+            f.close()
+        self._ficheros = (open(self.ruta_indice, 'rb'), open(self.ruta_datos, 'rb'))
+        self._inodos = tuple(os.fstat(f.fileno()).st_ino for f in self._ficheros)
+
+    def _abrir_datos(self):
+        """
+        Abre el fichero de datos comprobando que es el del índice cargado.
+
+        Returns:
+            file|None: Fichero abierto, o None si otro proceso lo ha compactado.
+        """
+        f = open(self.ruta_datos, 'rb')
+        if os.fstat(f.fileno()).st_ino != self._inodos[1]:
+            f.close()
+            return None
+        return f
+
+    def _vista(self, offset, longitud):
+        """
+        memoryview de solo lectura sobre el mmap, remapeando si el fichero
+        creció, o None si el fichero de datos ya no es el del índice.
+        """
+        if self._mapa is None or len(self._mapa) < offset + longitud:
+            # Los mmap anteriores se liberan solos cuando no quedan vistas sobre ellos
+            f = self._abrir_datos()
+            if f is None:
+                return None
+            with f:
+                self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mapa)[offset:offset + longitud]
+
+    def put(self, data, mimetype):
+        """
+        Guarda `data` si su contenido no estaba ya y retorna su sha256.
+        """
+        blob_hash = hashlib.sha256(data).hexdigest()
+        self._usados.add(blob_hash)
+        # Si otro proceso ha compactado, el blob puede haber desaparecido
+        if blob_hash in self._indice and not self._indice_sustituido():
+            return blob_hash
+        with self._lock, self._bloqueo_procesos():
+            self._leer_indice(bloqueado=True)
+            if blob_hash in self._indice:
+                return blob_hash
+            with open(self.ruta_datos, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(data)
+            with open(self.ruta_indice, 'ab') as f:
+                f.write(f"{blob_hash} {offset} {len(data)} {mimetype}\n".encode("ascii"))
+                self._leido = f.tell()
+            self._indice[blob_hash] = (offset, len(data), mimetype)
+            if self._limite and offset + len(data) > self._limite:
+                self._compactar()
+        return blob_hash
+
+    def retener(self, hashes):
+        """
+        Publica los blobs que referencia el catálogo vivo de este proceso.
+
+        Ninguna compactación, de este ni de otro proceso, los descarta mientras
+        el fichero covers.vivos.<host>.<pid> siga vigente. Llamarlo de nuevo
+        con el mismo conjunto solo renueva el fichero (como mucho una vez cada
+        _RENOVAR_VIVOS segundos).
+
+        Args:
+            hashes (Iterable[str]): sha256 de los blobs a conservar.
+        """
+        hashes = frozenset(hashes)
+        ruta = os.path.join(self.directorio, f"{_PREFIJO_VIVOS}{self._host}.{os.getpid()}")
+        with self._lock, self._bloqueo_procesos():
+            ahora = time.time()
+            if hashes == self._retenidos and ruta == self._ruta_retenidos and os.path.exists(ruta):
+                if ahora - self._retenidos_en >= _RENOVAR_VIVOS:
+                    os.utime(ruta)
+                    self._retenidos_en = ahora
+                return
+            tmp = ruta + ".tmp"
+            with open(tmp, 'w') as f:
+                f.write("".join(h + "\n" for h in sorted(hashes)))
+            os.replace(tmp, ruta)
+            self._retenidos = hashes
+            self._ruta_retenidos = ruta
+            self._retenidos_en = ahora
+
+    def _retenidos_por_procesos(self):
+        """
+        Hashes retenidos por el catálogo vivo de todos los procesos, borrando
+        los ficheros de procesos terminados o sin renovar.
+        """
+        retenidos = set(self._retenidos)
+        ahora = time.time()
+        for nombre in os.listdir(self.directorio):
+            if not nombre.startswith(_PREFIJO_VIVOS) or nombre.endswith(".tmp"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            host, _, pid = nombre[len(_PREFIJO_VIVOS):].rpartition(".")
+            try:
+                if ahora - os.path.getmtime(ruta) > self.caducidad_vivos or \
+                        (host == self._host and not _proceso_vivo(int(pid))):
+                    os.remove(ruta)
+                    continue
+                with open(ruta) as f:
+                    retenidos.update(linea.strip() for linea in f)
+            except (OSError, ValueError):
+                continue
+        return retenidos
+
+    def compactar(self):
+        """
+        Reescribe el almacén solo con los blobs usados recientemente o
+        retenidos por el catálogo vivo de algún proceso.
+
+        Returns:
+            int: Bytes liberados en el fichero de datos.
+        """
+        with self._lock, self._bloqueo_procesos():
+            self._leer_indice(bloqueado=True)
+            return self._compactar()
+
+    def _compactar(self):
+        """Compactación con ambos bloqueos ya adquiridos."""
+        conservar = self._usados | self._anteriores | self._retenidos_por_procesos()
+        antes = os.path.getsize(self.ruta_datos)
+        tmp_datos = self.ruta_datos + ".tmp"
+        tmp_indice = self.ruta_indice + ".tmp"
+        nuevo = {}
+        with open(self.ruta_datos, 'rb') as origen, open(tmp_datos, 'wb') as datos, \
+                open(tmp_indice, 'wb') as indice:
+            for blob_hash, (offset, longitud, mimetype) in self._indice.items():
+                if blob_hash not in conservar:
+                    continue
+                origen.seek(offset)
+                nuevo[blob_hash] = (datos.tell(), longitud, mimetype)
+                datos.write(origen.read(longitud))
+                indice.write(f"{blob_hash} {nuevo[blob_hash][0]} {longitud} {mimetype}\n".encode("ascii"))
+        # Las vistas y mmaps abiertos siguen apuntando a los ficheros anteriores
+        for f in self._ficheros:
+            f.close()
+        self._ficheros = ()
+        os.replace(tmp_datos, self.ruta_datos)
+        os.replace(tmp_indice, self.ruta_indice)
+        self._indice = nuevo
+        self._leido = os.path.getsize(self.ruta_indice)
+        self._fijar_ficheros()
+        self._mapa = None
+        self._anteriores, self._usados = self._usados, set()
+        despues = os.path.getsize(self.ruta_datos)
+        if self.max_bytes:
+            self._limite = max(self.max_bytes, 2 * despues)
+        print(f"[DEBUG] blobstore: Compactado {self.ruta_datos}: {antes} → {despues} bytes, {len(nuevo)} blobs")
+        return antes - despues
+
+    def _entrada(self, blob_hash, usar=True):
+        if self._indice_sustituido():
+            with self._lock:
+                self._leer_indice()
+        entrada = self._indice.get(blob_hash)
+        if entrada is None:
+            with self._lock:
+                self._leer_indice()
+            entrada = self._indice.get(blob_hash)
+        if entrada is not None and usar:
+            self._usados.add(blob_hash)
+        return entrada
+
+    def get(self, blob_hash):
+        """
+        Retorna (memoryview, mimetype) del blob, o None si no existe.
+
+        La vista apunta directamente al mmap: no copia el contenido.
+        """
+        entrada = self._entrada(blob_hash)
+        if entrada is None:
+            return None
+        offset, longitud, mimetype = entrada
+        with self._lock:
+            vista = self._vista(offset, longitud)
+        return (vista, mimetype) if vista is not None else None
+
+    def metadatos(self, blob_hash):
+        """Retorna (longitud, mimetype) del blob, o None si no existe."""
+        entrada = self._entrada(blob_hash)
+        if entrada is None:
+            return None
+        _, longitud, mimetype = entrada
+        return longitud, mimetype
+
+    def open(self, blob_hash):
+        """Retorna un SegmentoBlob para enviar el blob por WSGI, o None si no existe."""
+        entrada = self._entrada(blob_hash)
+        if entrada is None:
+            return None
+        offset, longitud, _ = entrada
+        with self._lock:
+            vista = self._vista(offset, longitud)
+            if vista is None:
+                return None
+            fichero = self._abrir_datos()
+            if fichero is None:
+                vista.release()
+                return None
+        return SegmentoBlob(fichero, offset, vista)
+
+    def __contains__(self, blob_hash):
+        return self._entrada(blob_hash, usar=False) is not None
+
+    def __len__(self):
+        return len(self._indice)
+
+
+class BlobsEnMemoria(object):
+    """
+    Almacén de blobs en memoria con la misma interfaz que BlobStore.
+
+    Se usa cuando no hay directorio para el almacén en disco. Al superar
+    `max_bytes` descarta, igual que la compactación de BlobStore, los blobs
+    que no se han usado desde la limpieza anterior ni en el periodo previo ni
+    retiene el catálogo vivo.
+
+    Args:
+        max_bytes (int, optional): Bytes a partir de los cuales se limpia. 0 = nunca.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._limite = max_bytes
+        self._blobs = {}
+        self._bytes = 0
+        self._usados = set()
+        self._anteriores = set()
+        self._retenidos = frozenset()
+        self._lock = threading.Lock()
+
+    def put(self, data, mimetype):
+        blob_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._usados.add(blob_hash)
+            if blob_hash not in self._blobs:
+                self._blobs[blob_hash] = (bytes(data), mimetype)
+                self._bytes += len(data)
+                if self._limite and self._bytes > self._limite:
+                    self._compactar()
+        return blob_hash
+
+    def retener(self, hashes):
+        self._retenidos = frozenset(hashes)
+
+    def compactar(self):
+        with self._lock:
+            return self._compactar()
+
+    def _compactar(self):
+        conservar = self._usados | self._anteriores | self._retenidos
+        antes = self._bytes
+        self._blobs = {h: blob for h, blob in self._blobs.items() if h in conservar}
+        self._bytes = sum(len(data) for data, _ in self._blobs.values())
+        self._anteriores, self._usados = self._usados, set()
+        if self.max_bytes:
+            self._limite = max(self.max_bytes, 2 * self._bytes)
+        return antes - self._bytes
+
+    def _entrada(self, blob_hash):
+        blob = self._blobs.get(blob_hash)
+        if blob is not None:
+            self._usados.add(blob_hash)
+        return blob
+
+    def get(self, blob_hash):
+        blob = self._entrada(blob_hash)
+        return (memoryview(blob[0]), blob[1]) if blob is not None else None
+
+    def metadatos(self, blob_hash):
+        blob = self._entrada(blob_hash)
+        return (len(blob[0]), blob[1]) if blob is not None else None
+
+    def open(self, blob_hash):
+        """Retorna los bytes del blob (no hay fichero que enviar), o None."""
+        blob = self._entrada(blob_hash)
+        return blob[0] if blob is not None else None
+
+    def __contains__(self, blob_hash):
+        return blob_hash in self._blobs
+
+    def __len__(self):
+        return len(self._blobs)
@@ -0,0 +1,255 @@
+"""
+Portadas del catálogo servidas como binario.
+
+TyA entrega las portadas como cadenas base64 (a veces con prefijo data URI)
+dentro de cada producto, y son la mayor parte del tamaño de /store y /cart.
+Este módulo las decodifica una sola vez y permite servirlas aparte en
+GET /store/cover/{kind}/{productId}?v=<hash>, de modo que los listados pueden
+llevar solo una URL (coverUrl) y el navegador cachea cada imagen por separado.
+
+Características:
+    - Los productos del catálogo (snapshot y modo "paged") no guardan el
+      base64: tya.map_* registra cada portada aquí y deja en `cover` solo una
+      CoverRef (hash y prefijo). Con covers=inline la cadena de TyA se
+      reconstruye byte a byte desde el almacén al serializar (inline()); con
+      covers=url basta el hash (url()). Las cadenas que no son base64 válido
+      se conservan tal cual
+    - Tipo MIME tomado del data URI o deducido de la firma del fichero
+    - ETag por contenido (sha256), usado también como `?v=` en coverUrl para
+      poder cachear las portadas como inmutables y para localizar la portada
+      al servirla, sin pasar por el catálogo
+    - Los bytes decodificados se guardan deduplicados en un BlobStore en disco
+      (TPP_COVER_BLOB_DIR) y se sirven desde él: en memoria solo quedan los
+      metadatos de cada portada. Sin directorio configurado se guardan en
+      memoria (BlobsEnMemoria). En ambos casos el almacén se compacta al
+      superar TPP_COVER_BLOB_MAX_MB, sin descartar las portadas del catálogo
+      vivo de ningún worker (retener())
+"""
+
+import base64
+import binascii
+import hashlib
+import sys
+
+from swagger_server.cache import TTLCache
+from swagger_server.catalog.blobstore import BlobStore, BlobsEnMemoria
+from swagger_server.controllers.config import (
+    COVER_CACHE_MAXSIZE, COVER_CACHE_TTL, COVER_BLOB_DIR, COVER_BLOB_MAX_MB
+)
+
+COVER_PATH = "/store/cover/{tipo}/{product_id}"
+
+# Firmas de los formatos de imagen habituales
+_FIRMAS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class Cover(object):
+    """
+    Portada decodificada.
+
+    Attributes:
+        data (bytes|None): Contenido binario de la imagen (None si está en
+            el BlobStore).
+        mimetype (str): Tipo MIME de la imagen.
+        etag (str): Huella del contenido (sha256).
+        blob (str|None): sha256 del contenido en el BlobStore (igual a etag).
+        size (int): Tamaño en bytes.
+    """
+
+    __slots__ = ('data', 'mimetype', 'etag', 'blob', 'size')
+
+    def __init__(self, data, mimetype, etag, blob=None, size=None):
+        self.data = data
+        self.mimetype = mimetype
+        self.etag = etag
+        self.blob = blob
+        self.size = len(data) if size is None else size
+
+
+class CoverRef(object):
+    """
+    Referencia a una portada registrada, en lugar de su base64.
+
+    Attributes:
+        etag (str): Hash (sha256) del contenido en el almacén.
+        prefijo (str): Prefijo data URI de la cadena de TyA ("" si no tenía).
+        original (str|None): Cadena de TyA completa, solo si no coincide con
+            prefijo + base64 canónico del contenido (saltos de línea, sin
+            relleno...) y por tanto no se puede reconstruir.
+    """
+
+    __slots__ = ('etag', 'prefijo', 'original')
+
+    def __init__(self, etag, prefijo="", original=None):
+        self.etag = etag
+        self.prefijo = prefijo
+        self.original = original
+
+    def __str__(self):
+        # Representación estable para la huella del catálogo (json default=str)
+        return self.original if self.original is not None else self.prefijo + self.etag
+
+    def __repr__(self):
+        return f"CoverRef({self.etag!r}, {self.prefijo!r})"
+
+
+def _tipo_mime(data, declarado=None):
+    if declarado:
+        return declarado
+    for firma, mimetype in _FIRMAS:
+        if data.startswith(firma):
+            return mimetype
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def decodificar_cover(cover):
+    """
+    Decodifica una portada de TyA.
+
+    Args:
+        cover (str): Base64, con o sin prefijo "data:image/...;base64,".
+
+    Returns:
+        Cover|None: Portada decodificada, o None si está vacía o no es base64.
+    """
+    if not cover:
+        return None
+    declarado = None
+    if cover.startswith("data:"):
+        cabecera, _, cover = cover.partition(",")
+        declarado = cabecera[5:].split(";")[0] or None
+    try:
+        data = base64.b64decode(cover, validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    if not data:
+        return None
+    return Cover(data, _tipo_mime(data, declarado), hashlib.sha256(data).hexdigest())
+
+
+class CoverStore(object):
+    """
+    Portadas decodificadas direccionadas por el hash (sha256) de su contenido.
+
+    Args:
+        maxsize (int): Número máximo de metadatos de portadas en memoria.
+        ttl (float): Segundos que se conservan los metadatos de cada portada.
+        blobs (BlobStore|BlobsEnMemoria): Almacén del contenido.
+    """
+
+    def __init__(self, maxsize, ttl, blobs):
+        self._por_hash = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.blobs = blobs
+
+    def registrar(self, cover):
+        """
+        Decodifica una portada de TyA y guarda su contenido en el almacén.
+
+        Args:
+            cover (str): Base64, con o sin prefijo data URI.
+
+        Returns:
+            CoverRef|str|None: Referencia a la portada, o la propia cadena si
+            está vacía o no es base64 válido (se sirve tal cual).
+        """
+        decodificada = decodificar_cover(cover)
+        if decodificada is None:
+            return cover
+        self.blobs.put(decodificada.data, decodificada.mimetype)
+        prefijo = sys.intern(cover[:cover.index(",") + 1]) if cover.startswith("data:") else ""
+        canonica = prefijo + base64.b64encode(decodificada.data).decode("ascii")
+        return CoverRef(decodificada.etag, prefijo, None if canonica == cover else cover)
+
+    def retener(self, productos):
+        """
+        Protege de la compactación las portadas de `productos` (el catálogo
+        vivo de este proceso), también frente a la de otros workers.
+        """
+        self.blobs.retener(p['cover'].etag for p in productos if isinstance(p.get('cover'), CoverRef))
+
+    def por_hash(self, etag):
+        """
+        Retorna la Cover con ese hash de contenido (el `?v=` de coverUrl), o
+        None si no se ha registrado o ya no está.
+
+        Los metadatos se cachean en memoria; si no están, se buscan en el
+        almacén (que puede haber recibido la portada de otro worker o antes
+        de un reinicio).
+        """
+        if not etag:
+            return None
+        cover = self._por_hash.get(etag)
+        if cover is None:
+            metadatos = self.blobs.metadatos(etag)
+            if metadatos is not None:
+                longitud, mimetype = metadatos
+                cover = Cover(None, mimetype, etag, blob=etag, size=longitud)
+                self._por_hash.set(etag, cover)
+        return cover
+
+    def open(self, cover):
+        """
+        Cuerpo para servir una Cover: un SegmentoBlob del BlobStore (apto para
+        wsgi.file_wrapper/sendfile) o sus bytes si el almacén está en memoria.
+        None si el blob ya no existe.
+        """
+        return self.blobs.open(cover.blob)
+
+    def inline(self, cover):
+        """
+        Portada tal como la entregó TyA (covers=inline), reconstruida desde el
+        almacén al serializar.
+
+        Args:
+            cover (CoverRef|str|None): Valor de `cover` de un producto.
+
+        Returns:
+            str|None: La cadena original de TyA, byte a byte (None si no
+            tenía portada o su contenido ya no está en el almacén).
+        """
+        if not isinstance(cover, CoverRef):
+            return cover
+        if cover.original is not None:
+            return cover.original
+        resultado = self.blobs.get(cover.etag)
+        if resultado is None:
+            return None
+        vista, _ = resultado
+        try:
+            return cover.prefijo + base64.b64encode(vista).decode("ascii")
+        finally:
+            vista.release()
+
+    def url(self, tipo, product_id, cover):
+        """
+        URL de la portada de un producto, o None si no tiene portada válida.
+
+        Incluye `?v=<hash>` para que la URL cambie cuando cambia la imagen y
+        para localizarla al servirla.
+        """
+        if not isinstance(cover, CoverRef):
+            return None
+        return COVER_PATH.format(tipo=tipo, product_id=product_id) + f"?v={cover.etag}"
+
+
+def _crear_cover_store():
+    blobs = None
+    max_bytes = COVER_BLOB_MAX_MB * 1024 * 1024
+    if COVER_BLOB_DIR:
+        try:
+            blobs = BlobStore(COVER_BLOB_DIR, max_bytes=max_bytes)
+        except OSError as e:
+            print(f"[DEBUG] covers: No se pudo abrir el almacén {COVER_BLOB_DIR}, portadas en memoria: {e}")
+    if blobs is None:
+        blobs = BlobsEnMemoria(max_bytes=max_bytes)
+    return CoverStore(maxsize=COVER_CACHE_MAXSIZE, ttl=COVER_CACHE_TTL, blobs=blobs)
+
+
+cover_store = _crear_cover_store()
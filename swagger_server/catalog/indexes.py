@@ -0,0 +1,174 @@
+"""
+Índices en memoria para filtrar y ordenar el catálogo sin recorrerlo.
+
+Se construyen una vez por snapshot (al refrescarse el catálogo) y a partir de
+ahí cada consulta de /store con filtros trabaja solo con posiciones (enteros)
+dentro de CatalogSnapshot.products:
+
+    - Índices invertidos por género, artista y tipo: valor → posiciones
+    - Órdenes precalculados por precio, fecha de lanzamiento y nombre
+      (ascendente y descendente) y el rango de cada producto en cada orden
+    - Precios ordenados para resolver minPrice/maxPrice con búsqueda binaria
+
+Una consulta recorre solo el filtro más selectivo y comprueba el resto como
+predicados O(1) (pertenencia a un frozenset o precio dentro del rango); luego
+ordena el resultado por rango, o recorre el orden precalculado si el
+resultado es grande. El coste depende del tamaño del filtro más selectivo,
+no del catálogo.
+
+Los rangos sirven también de clave estable para la paginación por cursor: el
+resultado de una consulta está ordenado por rango (o por posición si no hay
+orden), así que el punto de reanudación se encuentra con búsqueda binaria.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from swagger_server.catalog import tya
+
+
+def _texto(valor):
+    return valor.casefold() if isinstance(valor, str) else ""
+
+
+# Campo de ordenación → clave de cada producto (None = sin valor, va al final)
+CLAVES_ORDEN = {
+    "price": lambda p: p.get('price'),
+    "releaseDate": lambda p: p.get('releaseDate'),
+    "name": lambda p: _texto(p.get('name')) if p.get('name') else None,
+}
+
+SORTS = tuple(CLAVES_ORDEN) + tuple("-" + campo for campo in CLAVES_ORDEN)
+
+
+def _invertir(products, clave):
+    indice = {}
+    for posicion, producto in enumerate(products):
+        valor = clave(producto)
+        if valor is not None:
+            indice.setdefault(valor, []).append(posicion)
+    return {valor: frozenset(posiciones) for valor, posiciones in indice.items()}
+
+
+def _ordenes(products, clave):
+    """Órdenes ascendente y descendente (estables, sin valor al final)."""
+    con_valor = [i for i, p in enumerate(products) if clave(p) is not None]
+    sin_valor = [i for i, p in enumerate(products) if clave(p) is None]
+    ascendente = sorted(con_valor, key=lambda i: clave(products[i]))
+    descendente = sorted(con_valor, key=lambda i: clave(products[i]), reverse=True)
+    return tuple(ascendente + sin_valor), tuple(descendente + sin_valor)
+
+
+class CatalogIndexes(object):
+    """
+    Índices de filtrado y ordenación sobre una lista de productos.
+
+    Args:
+        products (List[dict]): Productos en formato Product (los del snapshot).
+    """
+
+    def __init__(self, products):
+        self.total = len(products)
+        self.por_genero = _invertir(products, lambda p: p.get('genre'))
+        self.por_artista = _invertir(products, lambda p: p.get('artist'))
+        self.por_tipo = _invertir(products, lambda p: tya.tipo_producto(p)[0])
+
+        self.orden = {}
+        self.rango = {}
+        for campo, clave in CLAVES_ORDEN.items():
+            ascendente, descendente = _ordenes(products, clave)
+            for sort, orden in ((campo, ascendente), ("-" + campo, descendente)):
+                rango = [0] * self.total
+                for r, posicion in enumerate(orden):
+                    rango[posicion] = r
+                self.orden[sort] = orden
+                self.rango[sort] = rango
+
+        # Posiciones ordenadas por precio y sus precios, para filtrar por rango
+        self._precio_de = [p.get('price') for p in products]
+        self._por_precio = tuple(i for i in self.orden['price'] if self._precio_de[i] is not None)
+        self._precios = [self._precio_de[i] for i in self._por_precio]
+
+    def _rango_precio(self, min_price, max_price):
+        """Límites (inicio, fin) en _por_precio de los productos dentro del rango."""
+        inicio = 0 if min_price is None else bisect_left(self._precios, min_price)
+        fin = len(self._precios) if max_price is None else bisect_right(self._precios, max_price)
+        return inicio, max(inicio, fin)
+
+    def buscar(self, genre=None, artist=None, tipo=None, min_price=None, max_price=None, sort=None):
+        """
+        Posiciones de los productos que cumplen todos los filtros, ordenadas.
+
+        Args:
+            genre (int, optional): ID de género.
+            artist (int, optional): ID del artista principal.
+            tipo (str, optional): "song", "album" o "merch".
+            min_price (float, optional): Precio mínimo (incluido).
+            max_price (float, optional): Precio máximo (incluido).
+            sort (str, optional): Campo de SORTS; con "-" delante, descendente.
+                Sin él se mantiene el orden del catálogo.
+
+        Returns:
+            Sequence[int]: Posiciones en CatalogSnapshot.products.
+        """
+        vacio = frozenset()
+        conjuntos = []
+        if genre is not None:
+            conjuntos.append(self.por_genero.get(genre, vacio))
+        if artist is not None:
+            conjuntos.append(self.por_artista.get(artist, vacio))
+        if tipo is not None:
+            conjuntos.append(self.por_tipo.get(tipo, vacio))
+        rango_precio = None
+        if min_price is not None or max_price is not None:
+            rango_precio = self._rango_precio(min_price, max_price)
+
+        if not conjuntos and rango_precio is None:
+            return self.orden[sort] if sort else range(self.total)
+
+        # Partir del filtro más pequeño y comprobar el resto como predicados
+        # (set.intersection recorre siempre el conjunto menor)
+        conjuntos.sort(key=len)
+        if rango_precio is not None and (not conjuntos or rango_precio[1] - rango_precio[0] < len(conjuntos[0])):
+            candidatos = set(self._por_precio[rango_precio[0]:rango_precio[1]]).intersection(*conjuntos)
+        else:
+            candidatos = set(conjuntos[0]).intersection(*conjuntos[1:])
+            if rango_precio is not None:
+                minimo = float("-inf") if min_price is None else min_price
+                maximo = float("inf") if max_price is None else max_price
+                precio_de = self._precio_de
+                candidatos = {i for i in candidatos
+                              if precio_de[i] is not None and minimo <= precio_de[i] <= maximo}
+
+        if not sort:
+            return sorted(candidatos)
+        if len(candidatos) * 16 > self.total:
+            # Resultado grande: recorrer el orden precalculado evita ordenar
+            return [i for i in self.orden[sort] if i in candidatos]
+        return sorted(candidatos, key=self.rango[sort].__getitem__)
+
+    def rango_de(self, posicion, sort=None):
+        """Rango de la posición `posicion` en el orden `sort` (sin orden, la propia posición)."""
+        return self.rango[sort][posicion] if sort else posicion
+
+    def inicio_tras(self, posiciones, rango, sort=None):
+        """
+        Índice en `posiciones` del primer producto que va después de `rango`.
+
+        Args:
+            posiciones (Sequence[int]): Resultado de buscar() con el mismo `sort`.
+            rango (int): Rango (ver rango_de) del último producto ya entregado.
+            sort (str, optional): Orden de la consulta.
+
+        Returns:
+            int: Índice de inicio de la página siguiente (O(log n)).
+        """
+        clave = self.rango[sort] if sort else None
+        inicio, fin = 0, len(posiciones)
+        while inicio < fin:
+            medio = (inicio + fin) // 2
+            valor = clave[posiciones[medio]] if clave is not None else posiciones[medio]
+            if valor <= rango:
+                inicio = medio + 1
+            else:
+                fin = medio
+        return inicio
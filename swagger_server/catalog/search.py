@@ -0,0 +1,162 @@
+"""
+Búsqueda de texto completo sobre el catálogo (GET /store/search).
+
+Índice invertido en memoria sobre el nombre, la descripción y el nombre del
+artista de cada producto:
+
+    - Tokenización por caracteres alfanuméricos, en minúsculas y sin tildes
+      ("Canción" y "cancion" son el mismo término; la ñ se conserva)
+    - Se descartan palabras vacías frecuentes en español e inglés
+    - Pesos por campo: nombre > artista > descripción, ponderados por IDF
+    - Todos los términos de la consulta deben aparecer; el último también
+      puede coincidir como prefijo (búsqueda mientras se escribe)
+
+Actualización incremental:
+    Al reconstruirse el snapshot del catálogo, SearchIndex.actualizar compara
+    el texto indexado de cada producto con el anterior y solo reindexa los
+    productos nuevos o modificados y elimina los que ya no existen.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from swagger_server.catalog import tya
+
+PESOS = (("name", 3.0), ("artist", 2.0), ("description", 1.0))
+
+PALABRAS_VACIAS = frozenset((
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los", "o",
+    "para", "por", "se", "un", "una", "y", "and", "of", "the",
+))
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ni diéresis (conservando la ñ)."""
+    texto = texto.casefold().replace("ñ", "\0")
+    texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return texto.replace("\0", "ñ")
+
+
+def tokenizar(texto):
+    """Términos indexables de un texto (normalizados, sin palabras vacías)."""
+    if not texto:
+        return []
+    return [t for t in _TOKEN.findall(normalizar(texto)) if t not in PALABRAS_VACIAS]
+
+
+class SearchIndex(object):
+    """
+    Índice invertido incremental sobre los productos del catálogo.
+
+    Los documentos se identifican por (tipo, id), la misma clave que
+    CatalogSnapshot.index, para resolver los resultados contra el snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._textos = {}     # clave → (nombre, artista, descripción) indexados
+        self._terminos = {}   # clave → {término: peso}
+        self._postings = {}   # término → {clave: peso}
+        self._vocabulario = None  # términos ordenados (para prefijos), se recalcula al cambiar
+
+    def __len__(self):
+        return len(self._textos)
+
+    def _quitar(self, clave):
+        for termino in self._terminos.pop(clave, {}):
+            documentos = self._postings[termino]
+            del documentos[clave]
+            if not documentos:
+                del self._postings[termino]
+        self._textos.pop(clave, None)
+
+    def _añadir(self, clave, textos):
+        terminos = {}
+        for (_, peso), texto in zip(PESOS, textos):
+            for termino in tokenizar(texto):
+                terminos[termino] = terminos.get(termino, 0.0) + peso
+        for termino, peso in terminos.items():
+            self._postings.setdefault(termino, {})[clave] = peso
+        self._terminos[clave] = terminos
+        self._textos[clave] = textos
+
+    def actualizar(self, products, artists):
+        """
+        Sincroniza el índice con los productos del catálogo.
+
+        Args:
+            products (List[dict]): Productos en formato Product.
+            artists (List[dict]): Catálogo de artistas de TyA (artistId, artisticName).
+
+        Returns:
+            Tuple[int, int]: (productos reindexados, productos eliminados).
+        """
+        nombres = {}
+        for artista in artists or []:
+            if isinstance(artista, dict):
+                nombres[tya._to_int(artista.get("artistId"))] = artista.get("artisticName") or artista.get("name")
+
+        actuales = {}
+        for producto in products:
+            actuales[tya.tipo_producto(producto)] = (
+                producto.get("name"), nombres.get(producto.get("artist")), producto.get("description")
+            )
+
+        with self._lock:
+            eliminados = [clave for clave in self._textos if clave not in actuales]
+            for clave in eliminados:
+                self._quitar(clave)
+            reindexados = 0
+            for clave, textos in actuales.items():
+                if self._textos.get(clave) != textos:
+                    self._quitar(clave)
+                    self._añadir(clave, textos)
+                    reindexados += 1
+            if reindexados or eliminados:
+                self._vocabulario = None
+        return reindexados, len(eliminados)
+
+    def _por_prefijo(self, prefijo):
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self._postings)
+        inicio = bisect_left(self._vocabulario, prefijo)
+        documentos = {}
+        for termino in self._vocabulario[inicio:]:
+            if not termino.startswith(prefijo):
+                break
+            for clave, peso in self._postings[termino].items():
+                # Una coincidencia por prefijo vale la mitad que una exacta
+                documentos[clave] = max(documentos.get(clave, 0.0), peso / 2)
+        return documentos
+
+    def buscar(self, consulta):
+        """
+        Claves (tipo, id) de los productos que contienen todos los términos,
+        de mayor a menor relevancia.
+        """
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return []
+        with self._lock:
+            total = len(self._textos) or 1
+            puntuacion = None
+            for n, termino in enumerate(terminos):
+                documentos = self._postings.get(termino, {})
+                if n == len(terminos) - 1 and len(termino) >= 2:
+                    documentos = {**self._por_prefijo(termino), **documentos}
+                if not documentos:
+                    return []
+                idf = math.log(1 + total / len(documentos))
+                if puntuacion is None:
+                    puntuacion = {clave: peso * idf for clave, peso in documentos.items()}
+                else:
+                    puntuacion = {clave: p + documentos[clave] * idf
+                                  for clave, p in puntuacion.items() if clave in documentos}
+                if not puntuacion:
+                    return []
+        return sorted(puntuacion, key=lambda clave: (-puntuacion[clave], clave))
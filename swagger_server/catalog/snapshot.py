@@ -0,0 +1,367 @@
+"""
+Caché en memoria del catálogo de la tienda (snapshot con TTL).
+
+El catálogo de TyA cambia pocas veces al día, pero el escaparate se consulta en
+cada visita. Esta caché guarda un snapshot de cada recurso del catálogo y lo
+sirve directamente desde memoria siguiendo la estrategia
+stale-while-revalidate:
+
+    - Si un recurso no se ha cargado nunca, se carga de forma síncrona.
+    - Si está fresco (edad < TTL), se sirve tal cual.
+    - Si está caducado, se sirve igualmente y se lanza un refresco en segundo
+      plano (como mucho uno por recurso a la vez).
+
+Las cargas de los distintos recursos se ejecutan en paralelo en el pool de
+hilos de TyA (tya.executor), de modo que una carga completa tarda lo que la
+cadena filter → list más lenta y no la suma de las 8 peticiones.
+
+Si un refresco falla (TyA caído) se conserva el último valor bueno. Con TTL 0
+la caché se desactiva y cada consulta recarga el catálogo completo.
+
+Coalescencia de cargas (single-flight):
+    Las cargas de un mismo recurso que coinciden en el tiempo (arranque en frío,
+    invalidación, TTL 0 o un refresco en segundo plano en curso) comparten una
+    única cadena filter → list contra TyA: el resto de peticiones espera su
+    resultado. La espera está acotada (TPP_CATALOG_FETCH_WAIT); si se agota,
+    se sirve el último valor conocido del recurso (o vacío si no lo hay).
+
+Presupuesto por petición:
+    Las cargas son compartidas, así que se ejecutan con sus timeouts normales;
+    lo que se acota con el presupuesto de la petición (swagger_server.deadline)
+    es la espera. Si se agota con algún recurso sin cargar, snapshot() retorna
+    un snapshot parcial (completo=False) que no se guarda.
+
+Reconstrucción del snapshot:
+    Construir el snapshot (índices de filtrado y ordenación) y actualizar el
+    índice de búsqueda es caro con catálogos grandes, así que se hace fuera
+    del lock y en el hilo que carga el recurso que ha cambiado (normalmente el
+    del refresco en segundo plano). Bajo el lock solo se sustituye la
+    referencia. Mientras tanto las peticiones siguen sirviendo el snapshot
+    anterior; solo en frío (sin snapshot) espera la petición a que se
+    construya.
+
+Portadas:
+    Cada snapshot que se instala publica en cover_store (retener()) las
+    portadas que referencia, y cada carga posterior lo renueva, de modo que
+    la compactación del almacén de portadas de otro worker no las descarta
+    mientras este las sigue sirviendo.
+
+Versionado:
+    Cada recurso guarda una huella (sha256 de su contenido). Un refresco que
+    trae exactamente los mismos datos no cambia la versión del catálogo, de
+    modo que las cachés derivadas (páginas serializadas, ETags) siguen siendo
+    válidas mientras TyA no cambie.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent import futures
+
+from swagger_server import deadline
+from swagger_server.cache import SingleFlight
+from swagger_server.catalog import tya
+from swagger_server.catalog.covers import cover_store
+from swagger_server.catalog.indexes import CatalogIndexes
+from swagger_server.catalog.search import SearchIndex
+from swagger_server.controllers.config import CATALOG_TTL_SECONDS, CATALOG_FETCH_WAIT
+
+# Clave de la reconstrucción del snapshot en el SingleFlight de las cargas
+_SNAPSHOT = "__snapshot__"
+
+
+class CatalogSnapshot(object):
+    """
+    Vista de solo lectura del catálogo en un instante dado.
+
+    Attributes:
+        products (List[dict]): Canciones, álbumes y merch en formato Product.
+        genres (List[dict]): Catálogo de géneros de TyA.
+        artists (List[dict]): Catálogo de artistas de TyA.
+        version (str): Huella del contenido; cambia solo si cambia algún recurso.
+        index (Dict[Tuple[str, int], dict]): (tipo, id) → producto.
+        posicion (Dict[Tuple[str, int], int]): (tipo, id) → posición en products.
+        indexes (CatalogIndexes): Índices de filtrado y ordenación.
+        completo (bool): False si falta algún recurso (presupuesto agotado).
+    """
+
+    __slots__ = ('products', 'genres', 'artists', 'version', 'index', 'posicion', 'indexes', 'completo')
+
+    def __init__(self, products, genres, artists, version, completo=True):
+        self.products = products
+        self.genres = genres
+        self.artists = artists
+        self.version = version
+        self.completo = completo
+        self.posicion = {tya.tipo_producto(p): i for i, p in enumerate(products)}
+        self.index = {clave: products[i] for clave, i in self.posicion.items()}
+        self.indexes = CatalogIndexes(products)
+
+
+def _huella(value):
+    """sha256 del contenido JSON de un recurso (independiente del orden de claves)."""
+    datos = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+
+class _Entry(object):
+    """Valor cacheado de un recurso junto con su instante de carga y su huella."""
+
+    __slots__ = ('value', 'loaded_at', 'failed', 'fingerprint')
+
+    def __init__(self, value, loaded_at, failed=False):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.failed = failed
+        self.fingerprint = _huella(value)
+
+
+class CatalogCache(object):
+    """
+    Caché stale-while-revalidate de los recursos del catálogo.
+
+    Args:
+        loaders (OrderedDict): Nombre de recurso → función sin argumentos que
+            retorna el valor del recurso, o None si el origen falla.
+        ttl (float): Segundos que un recurso se considera fresco.
+        executor (Executor): Pool en el que se ejecutan las cargas.
+        espera (float, optional): Segundos máximos que se espera a una carga
+            en curso del mismo recurso. None = sin límite.
+    """
+
+    def __init__(self, loaders, ttl, executor, espera=None):
+        self._loaders = loaders
+        self.ttl = ttl
+        self._executor = executor
+        self.espera = espera
+        self._cargas = SingleFlight()
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._snapshot = None
+        self._snapshot_generation = -1
+        # Índice de búsqueda compartido entre snapshots: se actualiza de forma
+        # incremental cada vez que se reconstruye el snapshot
+        self.search = SearchIndex()
+
+    def _store(self, resource, value):
+        """
+        Guarda el resultado de una carga conservando el último valor bueno.
+
+        La generación solo avanza si el contenido del recurso cambia.
+        """
+        now = time.monotonic()
+        nueva = _Entry(value, now) if value is not None else None
+        with self._lock:
+            actual = self._entries.get(resource)
+            if nueva is not None:
+                if actual is not None and actual.fingerprint == nueva.fingerprint:
+                    # Mismos datos: solo se renueva la frescura
+                    actual.loaded_at = now
+                    actual.failed = False
+                    return actual.value
+                self._entries[resource] = nueva
+            elif actual is not None:
+                # TyA no disponible: mantener el valor anterior y reintentar luego
+                actual.failed = True
+                return actual.value
+            else:
+                # Sin valor previo: catálogo vacío hasta el siguiente refresco
+                self._entries[resource] = _Entry([], now, failed=True)
+            self._generation += 1
+            return self._entries[resource].value
+
+    def _load(self, resource):
+        """
+        Carga un recurso de TyA, compartiendo la petición con las cargas
+        concurrentes del mismo recurso.
+
+        Si la carga en curso no termina dentro de `espera`, retorna el último
+        valor conocido (vacío si nunca se cargó) sin esperar más.
+        """
+        espera = self.espera if deadline.restante() is None else deadline.timeout(self.espera)
+        try:
+            return self._cargas.do(resource, lambda: self._cargar(resource), timeout=espera)
+        except TimeoutError:
+            entry = self._entries.get(resource)
+            print(f"[DEBUG] catalog: '{resource}' sigue cargándose tras {self.espera}s, se sirve el último valor")
+            return entry.value if entry is not None else []
+
+    def _cargar(self, resource):
+        """
+        Carga un recurso de TyA y, si su contenido ha cambiado, reconstruye el
+        snapshot en este mismo hilo (el de la carga, no el de la petición).
+        """
+        generacion = self._generation
+        valor = self._store(resource, self._loaders[resource]())
+        if self._generation != generacion:
+            self._reconstruir()
+        else:
+            # Sin cambios: renovar las portadas retenidas por el snapshot actual
+            snapshot = self._snapshot
+            if snapshot is not None:
+                cover_store.retener(snapshot.products)
+        return valor
+
+    def _reconstruir(self):
+        """
+        Reconstruye el snapshot si está desactualizado; las reconstrucciones
+        concurrentes comparten una única construcción.
+
+        Returns:
+            CatalogSnapshot: Snapshot actual, o None si falta algún recurso.
+        """
+        return self._cargas.do(_SNAPSHOT, self._construir)
+
+    def _construir(self):
+        with self._lock:
+            if any(r not in self._entries for r in self._loaders):
+                return None
+            if self._snapshot is not None and self._snapshot_generation == self._generation:
+                return self._snapshot
+            generacion = self._generation
+            entries = dict(self._entries)
+
+        # Fuera del lock: índices y búsqueda pueden tardar segundos con
+        # catálogos grandes y las peticiones siguen con el snapshot anterior
+        huellas = "".join(entries[r].fingerprint for r in self._loaders)
+        snapshot = CatalogSnapshot(
+            products=entries['songs'].value + entries['albums'].value + entries['merch'].value,
+            genres=entries['genres'].value,
+            artists=entries['artists'].value,
+            version=hashlib.sha256(huellas.encode("ascii")).hexdigest()[:32]
+        )
+        reindexados, eliminados = self.search.actualizar(snapshot.products, snapshot.artists)
+        print(f"[DEBUG] catalog: Índice de búsqueda actualizado ({reindexados} reindexados, {eliminados} eliminados)")
+
+        with self._lock:
+            instalado = self._snapshot is None or generacion > self._snapshot_generation
+            if instalado:
+                self._snapshot = snapshot
+                self._snapshot_generation = generacion
+            actual = self._snapshot
+        if instalado:
+            cover_store.retener(snapshot.products)
+        return actual
+
+    def _refresh_in_background(self, resource):
+        with self._lock:
+            if resource in self._refreshing:
+                return
+            self._refreshing.add(resource)
+
+        def run():
+            try:
+                if resource == _SNAPSHOT:
+                    print("[DEBUG] catalog: Reconstruyendo el snapshot en segundo plano")
+                    self._reconstruir()
+                else:
+                    print(f"[DEBUG] catalog: Refrescando '{resource}' en segundo plano")
+                    self._load(resource)
+            except Exception as e:
+                print(f"[DEBUG] catalog: ERROR refrescando '{resource}': {type(e).__name__}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(resource)
+
+        self._executor.submit(run)
+
+    def _is_stale(self, entry, now):
+        return entry.failed or now - entry.loaded_at >= self.ttl
+
+    def get(self, resource):
+        """
+        Retorna el valor cacheado de un recurso.
+
+        Carga síncrona la primera vez (o siempre si el TTL es 0); si el valor
+        está caducado lo retorna igualmente y programa un refresco.
+        """
+        entry = self._entries.get(resource)
+        if entry is None or self.ttl <= 0:
+            return self._load(resource)
+        if self._is_stale(entry, time.monotonic()):
+            self._refresh_in_background(resource)
+        return entry.value
+
+    def snapshot(self):
+        """
+        Retorna el CatalogSnapshot actual.
+
+        El snapshot solo se reconstruye cuando algún recurso ha cambiado, por
+        lo que en régimen normal servir una página es un simple slice. La
+        reconstrucción la hace el hilo que carga el recurso; si aun así el
+        snapshot está desactualizado se sirve el anterior y se reconstruye en
+        segundo plano. Solo sin snapshot previo se construye en esta petición.
+        """
+        pendientes = [r for r in self._loaders if self.ttl <= 0 or r not in self._entries]
+        if pendientes:
+            # Cargas síncronas en paralelo: una cadena filter → list por recurso.
+            # Se esperan como mucho el presupuesto restante de la petición.
+            try:
+                list(self._executor.map(self._load, pendientes, timeout=deadline.restante()))
+            except futures.TimeoutError:
+                print("[DEBUG] catalog: Presupuesto agotado esperando la carga del catálogo")
+        for resource in self._loaders:
+            if resource not in pendientes:
+                self.get(resource)
+        with self._lock:
+            if any(r not in self._entries for r in self._loaders):
+                return self._snapshot_parcial()
+            actual = self._snapshot
+            if actual is not None and self._snapshot_generation == self._generation:
+                return actual
+        if actual is not None:
+            self._refresh_in_background(_SNAPSHOT)
+            return actual
+        return self._reconstruir() or self._snapshot_parcial()
+
+    def _snapshot_parcial(self):
+        """Snapshot (no cacheado) con los recursos ya cargados; el resto vacíos."""
+        entries = self._entries
+
+        def valor(resource):
+            return entries[resource].value if resource in entries else []
+
+        huellas = "".join(entries[r].fingerprint if r in entries else "-" for r in self._loaders)
+        return CatalogSnapshot(
+            products=valor('songs') + valor('albums') + valor('merch'),
+            genres=valor('genres'),
+            artists=valor('artists'),
+            version="p" + hashlib.sha256(huellas.encode("ascii")).hexdigest()[:31],
+            completo=False
+        )
+
+    def degradado(self):
+        """
+        True si algún recurso se está sirviendo con datos antiguos porque su
+        última carga falló (TyA caído o con el circuito abierto).
+        """
+        return any(entry.failed for entry in list(self._entries.values()))
+
+    def ultimo(self):
+        """Último snapshot construido, sin cargar ni refrescar nada (None si no hay)."""
+        return self._snapshot
+
+    def invalidate(self):
+        """Descarta todos los recursos cacheados (se recargarán al pedirlos)."""
+        with self._lock:
+            self._entries = {}
+            self._snapshot = None
+            self._generation += 1
+
+
+catalog_cache = CatalogCache(
+    OrderedDict([
+        ('songs', tya.fetch_songs),
+        ('albums', tya.fetch_albums),
+        ('merch', tya.fetch_merch),
+        ('genres', tya.fetch_genres),
+        ('artists', tya.fetch_artists),
+    ]),
+    ttl=CATALOG_TTL_SECONDS,
+    executor=tya.executor,
+    espera=CATALOG_FETCH_WAIT
+)
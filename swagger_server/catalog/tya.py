@@ -0,0 +1,489 @@
+"""
+Acceso al catálogo del microservicio de Temas y Autores (TyA).
+
+Este módulo agrupa las peticiones HTTP a TyA necesarias para construir el
+escaparate de la tienda y la transformación de sus respuestas al formato
+Product de TPP. Cada recurso del catálogo (canciones, álbumes, merch, géneros
+y artistas) tiene su propia función de carga, de forma que la caché del
+catálogo puede refrescarlos de manera independiente.
+
+Endpoints utilizados:
+    - GET /song/filter, /album/filter, /merch/filter, /artist/filter: IDs
+    - GET /song/list, /album/list, /merch/list, /artist/list ?ids=...: detalles
+    - GET /genres: catálogo de géneros
+
+Concurrencia:
+    Las cadenas filter → list de cada recurso son independientes entre sí, por
+    lo que se ejecutan en paralelo en el pool `executor`. Cada /list arranca en
+    cuanto termina su /filter, y la latencia total es la de la cadena más lenta
+    en lugar de la suma de todas las peticiones.
+
+Modo paged:
+    Las peticiones /filter de fetch_product_refs() se comparten entre las
+    peticiones concurrentes (single-flight por tipo) con espera acotada. Si
+    TyA falla o la espera se agota, se usan los últimos IDs conocidos del tipo.
+
+Hedged requests y reintentos:
+    Los GET a TyA son idempotentes, así que _get_json aplica la política de
+    cada endpoint (config TYA_HEDGE_*, TYA_RETRIES*):
+        - Hedge: si no hay respuesta al llegar al p95 de latencia observado
+          para el endpoint, se envía un duplicado y gana la primera respuesta.
+          Recorta la cola de latencia (p99) a costa de unas pocas peticiones
+          extra, solo en los /list, que son los que cargan más datos.
+        - Reintentos ante errores de conexión o 502/503/504, con backoff
+          exponencial acotado y jitter, sin superar el presupuesto de la
+          petición. Con el circuito abierto no se reintenta.
+    `contadores` lleva por endpoint las peticiones, reintentos, hedges
+    enviados y hedges ganados (ver estadisticas()).
+
+Presupuesto por petición:
+    Las tareas del modo paged se lanzan con deadline.propagar() para que sus
+    peticiones hereden el presupuesto de la petición de /store, y se esperan
+    como mucho el tiempo restante: las que no terminan se tratan como fallidas.
+
+Convención de errores:
+    Las funciones de carga retornan None si TyA no responde o responde con
+    error, y una lista (posiblemente vacía) si la respuesta es válida. Así la
+    caché distingue "catálogo vacío" de "TyA no disponible" y puede conservar
+    el último dato bueno.
+
+Portadas:
+    Los map_* registran la portada en base64 de cada producto en cover_store
+    y dejan en `cover` solo una CoverRef: el catálogo en memoria no guarda las
+    imágenes (ver swagger_server.catalog.covers).
+
+Circuit breakers:
+    Cada endpoint de TyA (/song/list, /genres, ...) tiene su propio circuit
+    breaker (httpconx). Con el circuito abierto las llamadas fallan al
+    instante y las funciones de carga retornan None, sin esperar al timeout.
+"""
+
+import time
+from collections import OrderedDict
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from swagger_server import deadline
+from swagger_server.cache import SingleFlight
+from swagger_server.catalog.covers import cover_store
+from swagger_server.controllers.config import (
+    TYA_SERVICE_URL, TYA_MAX_WORKERS, TYA_TIMEOUT, CATALOG_FETCH_WAIT,
+    TYA_HEDGE_PATHS, TYA_HEDGE_MIN_SAMPLES, TYA_HEDGE_MIN_DELAY,
+    TYA_RETRIES, TYA_RETRIES_BY_PATH, TYA_RETRY_BACKOFF, TYA_RETRY_BACKOFF_MAX
+)
+from swagger_server.httpconx import CircuitoAbierto, circuito_abierto, http_get
+from swagger_server.httpconx.resiliencia import Contadores, Latencias, Politica, espera_reintento
+
+JSON_HEADERS = {"Accept": "application/json"}
+
+# Campo identificador de cada tipo de recurso en las respuestas de TyA
+ID_FIELDS = {
+    "song": "songId",
+    "album": "albumId",
+    "merch": "merchId",
+    "artist": "artistId",
+}
+
+# Pool compartido para las peticiones concurrentes a TyA
+executor = ThreadPoolExecutor(max_workers=TYA_MAX_WORKERS, thread_name_prefix="tya")
+
+# /filter en curso por tipo (modo paged) y últimos IDs válidos de cada tipo
+_filtros = SingleFlight()
+_ultimos_ids = {}
+
+# Pool propio para los intentos con hedge (las cargas ya corren en `executor`)
+_hedges = ThreadPoolExecutor(max_workers=2 * TYA_MAX_WORKERS, thread_name_prefix="tya-hedge")
+# Latencias observadas por endpoint y contadores de peticiones/reintentos/hedges
+_latencias = {}
+contadores = Contadores()
+
+# Respuestas que indican un fallo transitorio de TyA o de su proxy
+ESTADOS_REINTENTABLES = (502, 503, 504)
+
+
+def _politica(path):
+    return Politica(hedge=path in TYA_HEDGE_PATHS, reintentos=TYA_RETRIES_BY_PATH.get(path, TYA_RETRIES))
+
+
+def _latencias_de(path):
+    latencias = _latencias.get(path)
+    if latencias is None:
+        latencias = _latencias.setdefault(path, Latencias(minimo=TYA_HEDGE_MIN_SAMPLES))
+    return latencias
+
+
+def _intento(path, params, timeout):
+    """Un GET a TyA; registra su latencia si llega a responder."""
+    inicio = time.monotonic()
+    response = http_get(
+        f"{TYA_SERVICE_URL}{path}",
+        params=params,
+        timeout=timeout,
+        headers=JSON_HEADERS,
+        circuito_nombre=path
+    )
+    _latencias_de(path).registrar(time.monotonic() - inicio)
+    return response
+
+
+def _intento_con_hedge(path, params, timeout):
+    """
+    Un GET a TyA con hedge: si no responde dentro del p95 del endpoint, se
+    lanza un duplicado y se retorna la primera respuesta que llegue.
+
+    Sin suficientes muestras para estimar el p95 se hace un intento normal.
+    """
+    p95 = _latencias_de(path).percentil(0.95)
+    if p95 is None:
+        return _intento(path, params, timeout)
+
+    intento = deadline.propagar(_intento)
+    primero = _hedges.submit(intento, path, params, timeout)
+    try:
+        return primero.result(timeout=deadline.timeout(max(p95, TYA_HEDGE_MIN_DELAY)))
+    except futures.TimeoutError:
+        pass
+    if deadline.agotado():
+        raise requests.Timeout(f"Presupuesto de la petición agotado esperando a {path}")
+
+    contadores.incrementar(path, "hedges")
+    segundo = _hedges.submit(intento, path, params, timeout)
+    pendientes = {primero, segundo}
+    error = None
+    while pendientes:
+        hechos, pendientes = futures.wait(pendientes, timeout=deadline.restante(),
+                                          return_when=futures.FIRST_COMPLETED)
+        if not hechos:
+            raise requests.Timeout(f"Presupuesto de la petición agotado esperando a {path}")
+        for futuro in hechos:
+            try:
+                response = futuro.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            if futuro is segundo:
+                contadores.incrementar(path, "hedges_ganados")
+            return response
+    raise error
+
+
+def _get_json(path, params=None, timeout=TYA_TIMEOUT):
+    """
+    Realiza un GET a TyA y retorna el JSON decodificado, o None si falla.
+
+    Aplica la política del endpoint: hedge al superar el p95 y reintentos con
+    backoff y jitter ante errores transitorios (ver docstring del módulo).
+    """
+    politica = _politica(path)
+    contadores.incrementar(path, "peticiones")
+    peticion = _intento_con_hedge if politica.hedge else _intento
+
+    for intento in range(politica.reintentos + 1):
+        if intento:
+            pausa = espera_reintento(intento, TYA_RETRY_BACKOFF, TYA_RETRY_BACKOFF_MAX)
+            queda = deadline.restante()
+            if queda is not None and pausa >= queda:
+                break
+            contadores.incrementar(path, "reintentos")
+            time.sleep(pausa)
+        try:
+            response = peticion(path, params, timeout)
+        except CircuitoAbierto:
+            print(f"[DEBUG] tya: {path} no disponible (circuito abierto)")
+            return None
+        except requests.RequestException as e:
+            print(f"Error al conectar con Temas y Autores ({path}): {e}")
+            continue
+        if response.status_code in ESTADOS_REINTENTABLES:
+            print(f"[DEBUG] tya: {path} respondió {response.status_code}")
+            continue
+        if not response.ok:
+            print(f"[DEBUG] tya: {path} respondió {response.status_code}")
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            print(f"Respuesta no válida de Temas y Autores ({path}): {e}")
+            return None
+    return None
+
+
+def estadisticas():
+    """
+    Contadores por endpoint de TyA junto con el p95 de latencia observado.
+
+    Returns:
+        Dict[str, dict]: {path: {"peticiones", "reintentos", "hedges", "hedges_ganados", "p95"}}
+    """
+    datos = contadores.como_dict()
+    for path, latencias in list(_latencias.items()):
+        datos.setdefault(path, {})["p95"] = latencias.percentil(0.95)
+    return datos
+
+
+def extraer_ids(data, tipo):
+    """
+    Extrae la lista de IDs de una respuesta /filter.
+
+    La respuesta puede venir como lista de enteros [1, 2, 3] o como lista de
+    objetos [{"songId": 1}, ...].
+    """
+    if not data:
+        return []
+    if isinstance(data[0], int):
+        return data
+    if isinstance(data[0], dict):
+        campo = ID_FIELDS[tipo]
+        return [item.get(campo) for item in data if item.get(campo)]
+    return []
+
+
+def fetch_ids(tipo):
+    """
+    Obtiene todos los IDs de un tipo de recurso usando GET /{tipo}/filter.
+
+    Args:
+        tipo (str): "song", "album", "merch" o "artist".
+
+    Returns:
+        List[int]|None: IDs en el orden de TyA, o None si TyA falla.
+    """
+    data = _get_json(f"/{tipo}/filter")
+    if data is None:
+        return None
+    return extraer_ids(data, tipo)
+
+
+def fetch_list(tipo, ids, timeout=TYA_TIMEOUT):
+    """
+    Obtiene los detalles completos de varios recursos con GET /{tipo}/list.
+
+    Args:
+        tipo (str): "song", "album", "merch" o "artist".
+        ids (List[int]): IDs a consultar. Si está vacía no se hace petición.
+        timeout (float, optional): Timeout de lectura en segundos.
+
+    Returns:
+        List[dict]|None: Objetos de TyA, o None si TyA falla.
+    """
+    if not ids:
+        return []
+    return _get_json(f"/{tipo}/list", params={"ids": ",".join(map(str, ids))}, timeout=timeout)
+
+
+def _fetch_all(tipo):
+    """Encadena /filter y /list para obtener todos los objetos de un tipo."""
+    ids = fetch_ids(tipo)
+    if ids is None:
+        return None
+    return fetch_list(tipo, ids)
+
+
+# --- Normalización de campos de TyA ---
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value) if value else 0
+    return value
+
+
+def _to_int_list(values):
+    if values and isinstance(values[0], str):
+        return [int(v) for v in values if v]
+    return values
+
+
+def _to_price(value):
+    if isinstance(value, str):
+        value = value.replace(",", ".")
+    return float(value) if value else 0.0
+
+
+def _release_date(obj):
+    return f"{obj.get('releaseDate')}T00:00:00Z" if obj.get('releaseDate') else None
+
+
+# --- Mapeo al modelo Product ---
+# `cover` lleva una CoverRef a la portada en cover_store, no el base64: se
+# convierte de nuevo en la cadena de TyA o en coverUrl al serializar.
+
+def map_song(c):
+    """Transforma una canción de TyA al formato Product de la tienda."""
+    genres = _to_int_list(c.get("genres", []))
+    return {
+        'songId': c.get("songId"),
+        'albumId': c.get("albumId"),
+        'merchId': None,
+        'name': c.get("title"),
+        'price': _to_price(c.get("price", "0")),
+        'description': c.get("description"),
+        'artist': _to_int(c.get("artistId")),
+        'colaborators': _to_int_list(c.get("collaborators", [])),
+        'releaseDate': _release_date(c),
+        'duration': _to_int(c.get("duration")),
+        'genre': genres[0] if genres else 0,
+        'cover': cover_store.registrar(c.get("cover")),
+        'songList': None
+    }
+
+
+def map_album(a):
+    """Transforma un álbum de TyA al formato Product de la tienda."""
+    genres = _to_int_list(a.get("genres", []))
+    return {
+        'songId': None,
+        'albumId': a.get("albumId"),
+        'merchId': None,
+        'name': a.get("title"),
+        'price': _to_price(a.get("price", "0")),
+        'description': a.get("description"),
+        'artist': _to_int(a.get("artistId")),
+        'colaborators': _to_int_list(a.get("collaborators", [])),
+        'releaseDate': _release_date(a),
+        'duration': None,
+        'genre': genres[0] if genres else 0,
+        'cover': cover_store.registrar(a.get("cover")),
+        'songList': _to_int_list(a.get("songs", []))
+    }
+
+
+def map_merch(m):
+    """Transforma un artículo de merchandising de TyA al formato Product."""
+    return {
+        'songId': None,
+        'albumId': None,
+        'merchId': m.get("merchId"),
+        'name': m.get("title"),
+        'price': _to_price(m.get("price", "0")),
+        'description': m.get("description"),
+        'artist': _to_int(m.get("artistId")),
+        'colaborators': _to_int_list(m.get("collaborators", [])),
+        'releaseDate': _release_date(m),
+        'duration': None,
+        'genre': None,  # Merch no tiene género en TyA
+        'cover': cover_store.registrar(m.get("cover")),
+        'songList': None
+    }
+
+
+def tipo_producto(producto):
+    """
+    Retorna (tipo, id) de un producto en formato Product.
+
+    Las canciones también llevan albumId, por lo que se comprueba primero
+    songId, luego merchId y por último albumId.
+    """
+    if producto.get('songId') is not None:
+        return "song", _to_int(producto['songId'])
+    if producto.get('merchId') is not None:
+        return "merch", _to_int(producto['merchId'])
+    return "album", _to_int(producto.get('albumId'))
+
+
+MAPPERS = OrderedDict([
+    ("song", map_song),
+    ("album", map_album),
+    ("merch", map_merch),
+])
+
+
+def degradado():
+    """True si el circuito de algún endpoint de productos de TyA está abierto."""
+    return any(circuito_abierto(f"/{tipo}/{operacion}") for tipo in MAPPERS for operacion in ("filter", "list"))
+
+
+# --- Carga por páginas (modo "paged" de /store) ---
+
+def _ids_compartidos(tipo):
+    """
+    fetch_ids(tipo) compartido entre peticiones concurrentes.
+
+    Retorna los últimos IDs válidos del tipo si TyA falla o si la petición en
+    curso no termina dentro de CATALOG_FETCH_WAIT.
+    """
+    try:
+        ids = _filtros.do(tipo, lambda: fetch_ids(tipo), timeout=deadline.timeout(CATALOG_FETCH_WAIT))
+    except TimeoutError:
+        print(f"[DEBUG] tya: /{tipo}/filter sigue en curso tras {CATALOG_FETCH_WAIT}s, se usan los últimos IDs")
+        ids = None
+    if ids is None:
+        return _ultimos_ids.get(tipo)
+    _ultimos_ids[tipo] = ids
+    return ids
+
+
+def fetch_product_refs():
+    """
+    Obtiene la lista ordenada de productos del catálogo usando solo /filter.
+
+    Lanza en paralelo /song/filter, /album/filter y /merch/filter y concatena
+    los resultados en el orden canciones, álbumes, merch (el mismo orden que
+    el snapshot completo). Las peticiones concurrentes comparten cada /filter;
+    un tipo cuyo /filter falla usa sus últimos IDs conocidos, o vacío.
+
+    Returns:
+        List[Tuple[str, int]]: Pares (tipo, id) de todos los productos.
+    """
+    futuros = [(tipo, executor.submit(deadline.propagar(_ids_compartidos), tipo)) for tipo in MAPPERS]
+    refs = []
+    for tipo, futuro in futuros:
+        refs.extend((tipo, _to_int(i)) for i in deadline.resultado(futuro) or [])
+    return refs
+
+
+def fetch_products(refs):
+    """
+    Obtiene los detalles de los productos indicados ya mapeados a Product.
+
+    Agrupa los IDs por tipo y hace como mucho una petición /list por tipo, en
+    paralelo. Los productos que TyA no devuelve se omiten.
+
+    Args:
+        refs (List[Tuple[str, int]]): Pares (tipo, id), p. ej. los de una página.
+
+    Returns:
+        List[dict]: Productos en el mismo orden que `refs`.
+    """
+    ids_por_tipo = OrderedDict()
+    for tipo, product_id in refs:
+        ids_por_tipo.setdefault(tipo, []).append(product_id)
+
+    futuros = [(tipo, executor.submit(deadline.propagar(fetch_list), tipo, ids))
+               for tipo, ids in ids_por_tipo.items()]
+    detalles = {}
+    for tipo, futuro in futuros:
+        for obj in deadline.resultado(futuro) or []:
+            detalles[(tipo, _to_int(obj.get(ID_FIELDS[tipo])))] = MAPPERS[tipo](obj)
+    return [detalles[ref] for ref in refs if ref in detalles]
+
+
+# --- Cargadores por recurso (usados por la caché del catálogo) ---
+
+def fetch_songs():
+    """Canciones del catálogo ya mapeadas a Product, o None si TyA falla."""
+    canciones = _fetch_all("song")
+    return None if canciones is None else [map_song(c) for c in canciones]
+
+
+def fetch_albums():
+    """Álbumes del catálogo ya mapeados a Product, o None si TyA falla."""
+    albumes = _fetch_all("album")
+    return None if albumes is None else [map_album(a) for a in albumes]
+
+
+def fetch_merch():
+    """Merchandising del catálogo ya mapeado a Product, o None si TyA falla."""
+    merch = _fetch_all("merch")
+    return None if merch is None else [map_merch(m) for m in merch]
+
+
+def fetch_genres():
+    """Catálogo completo de géneros de TyA, o None si TyA falla."""
+    return _get_json("/genres")
+
+
+def fetch_artists():
+    """Catálogo completo de artistas de TyA, o None si TyA falla."""
+    return _fetch_all("artist")
@@ -1,15 +1,42 @@
 from typing import List
-import requests
 import connexion
 """
 controller generated to handled auth operation described at:
 https://connexion.readthedocs.io/en/latest/security.html
 """
 
+import hashlib
+import time
+
 from swagger_server.models.error import Error
+from swagger_server import deadline
+from swagger_server.cache import SingleFlight, TTLCache
+from swagger_server.httpconx import http_get
+from swagger_server.controllers.config import (
+    AUTH_TIMEOUT, AUTH_CACHE_TTL, AUTH_CACHE_MAXSIZE, AUTH_NEGATIVE_TTL,
+    AUTH_JWT_PUBLIC_KEY_FILE, AUTH_JWKS_FILE, AUTH_JWT_ALGORITHMS,
+    AUTH_JWT_AUDIENCE, AUTH_JWT_ISSUER, AUTH_JWT_LEEWAY
+)
+
+try:
+    import jwt
+except ImportError:  # PyJWT es opcional: sin él todos los tokens se validan en SYU
+    jwt = None
+    if AUTH_JWKS_FILE or AUTH_JWT_PUBLIC_KEY_FILE:
+        print("[WARNING] jwt: Hay claves públicas configuradas pero PyJWT no está instalado; "
+              "todos los tokens se validarán contra SYU")
 
 AUTH_SERVER = 'http://localhost:8080'
 
+# sha256(token) → user_info validado por SYU (nunca se guarda el token en claro).
+# Los contadores token_cache.hits / token_cache.misses sirven de métrica.
+token_cache = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_TTL)
+# sha256(token) → True para tokens que SYU ha rechazado recientemente
+tokens_rechazados = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_NEGATIVE_TTL)
+# Validaciones en curso: peticiones simultáneas con el mismo token comparten
+# una única llamada a SYU
+_validaciones = SingleFlight()
+
 def is_valid_token(token):
     """
     Valida un token.
@@ -17,15 +44,155 @@ def is_valid_token(token):
     - Validación JWT
     - Consulta a BD de sesiones/usuarios
     - Integración con OAuth/IAM
+
+    Devuelve el user_info si el token es válido, False si SYU lo rechaza
+    (401/403) y None si no se ha podido validar (SYU caído o error 5xx).
     """
     try:
-        resp = requests.get(f"{AUTH_SERVER}/auth", timeout=2, headers={"Accept": "application/json", "Cookie":f"oversound_auth={token}"})
-        return resp.json() if resp.ok else None
+        resp = http_get(f"{AUTH_SERVER}/auth", timeout=AUTH_TIMEOUT, headers={"Accept": "application/json", "Cookie":f"oversound_auth={token}"})
+        if resp.ok:
+            return resp.json()
+        return False if resp.status_code in (401, 403) else None
     except Exception as e:
         print(f"Couldn't connect to SYU microservice: {e}")
         return None
 
 
+_claves_jwt = None
+
+
+def _cargar_claves_jwt():
+    """
+    Carga (una vez) las claves públicas de SYU configuradas.
+
+    Returns:
+        dict: kid → clave. Con un PEM suelto la única entrada tiene kid None.
+        Vacío si no hay claves configuradas o no se pueden leer (el fallo se
+        recuerda: no se reintenta la lectura en cada petición).
+    """
+    global _claves_jwt
+    if _claves_jwt is None:
+        claves = {}
+        try:
+            if AUTH_JWKS_FILE:
+                with open(AUTH_JWKS_FILE) as f:
+                    for clave in jwt.PyJWKSet.from_json(f.read()).keys:
+                        claves[clave.key_id] = clave.key
+            elif AUTH_JWT_PUBLIC_KEY_FILE:
+                with open(AUTH_JWT_PUBLIC_KEY_FILE) as f:
+                    claves[None] = f.read()
+        except (OSError, ValueError, TypeError, KeyError, AttributeError, jwt.PyJWTError) as e:
+            # Fichero ausente, JSON mal formado o JWKS con estructura inválida
+            print(f"[DEBUG] jwt: No se pudieron cargar las claves públicas: {e}")
+        _claves_jwt = claves
+    return _claves_jwt
+
+
+def _user_info_desde_claims(claims):
+    """Adapta los claims del JWT al formato user_info que devuelve SYU /auth."""
+    user_info = dict(claims)
+    if 'userId' not in user_info and 'sub' in claims:
+        sub = str(claims['sub'])
+        user_info['userId'] = int(sub) if sub.isdigit() else sub
+    if 'scopes' not in user_info:
+        scope = claims.get('scope') or ''
+        user_info['scopes'] = scope.split() if isinstance(scope, str) else list(scope)
+    return user_info
+
+
+def verificar_jwt_local(token):
+    """
+    Verifica un token JWT con las claves públicas configuradas, sin llamar a SYU.
+
+    Comprueba firma, algoritmo, expiración (`exp` obligatorio) y, si están
+    configurados, audiencia y emisor.
+
+    Returns:
+        dict|bool|None: user_info si el token es válido, False si es un JWT de
+        una clave conocida pero inválido (firma, caducado...) y None si no
+        aplica (PyJWT no instalado, sin claves, token opaco o `kid`
+        desconocido), en cuyo caso se valida en SYU.
+    """
+    if jwt is None or token.count('.') != 2:
+        return None
+    claves = _cargar_claves_jwt()
+    if not claves:
+        return None
+    try:
+        cabecera = jwt.get_unverified_header(token)
+    except jwt.PyJWTError:
+        return None  # No es un JWT: token opaco
+    clave = claves.get(cabecera.get('kid'))
+    if clave is None and len(claves) == 1 and None in claves:
+        clave = claves[None]
+    if clave is None:
+        return None  # Clave desconocida (p. ej. rotada): que decida SYU
+    try:
+        claims = jwt.decode(
+            token, clave,
+            algorithms=AUTH_JWT_ALGORITHMS,
+            audience=AUTH_JWT_AUDIENCE,
+            issuer=AUTH_JWT_ISSUER,
+            leeway=AUTH_JWT_LEEWAY,
+            options={"require": ["exp"], "verify_aud": AUTH_JWT_AUDIENCE is not None}
+        )
+    except jwt.PyJWTError as e:
+        print(f"[DEBUG] jwt: Token rechazado en local: {type(e).__name__}: {e}")
+        return False
+    return _user_info_desde_claims(claims)
+
+
+def _clave_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _ttl_token(user_info):
+    """TTL de caché para un token: AUTH_CACHE_TTL sin superar su `exp` (si lo hay)."""
+    exp = user_info.get('exp') if isinstance(user_info, dict) else None
+    if isinstance(exp, (int, float)):
+        return min(AUTH_CACHE_TTL, exp - time.time())
+    return AUTH_CACHE_TTL
+
+
+def validar_token_cacheado(token):
+    """
+    Igual que is_valid_token, pero reutiliza las validaciones recientes.
+
+    - Los JWT firmados con una clave configurada se verifican en local y no
+      llegan a SYU (ver verificar_jwt_local).
+    - Los tokens válidos se cachean con clave sha256(token) durante como
+      mucho AUTH_CACHE_TTL segundos (o hasta su `exp`, si es antes).
+    - Los rechazados por SYU se recuerdan AUTH_NEGATIVE_TTL segundos.
+    - Las validaciones simultáneas del mismo token comparten una sola
+      petición a SYU.
+    """
+    user_info = verificar_jwt_local(token)
+    if user_info is not None:
+        return user_info
+
+    clave = _clave_token(token)
+    user_info = token_cache.get(clave)
+    if user_info is not None:
+        return user_info
+    if tokens_rechazados.get(clave):
+        return False
+
+    def consultar():
+        resultado = is_valid_token(token)
+        if resultado:
+            token_cache.set(clave, resultado, ttl=_ttl_token(resultado))
+        elif resultado is False:
+            tokens_rechazados.set(clave, True)
+        return resultado
+
+    try:
+        # Quien espera a la validación de otra petición no supera su presupuesto
+        return _validaciones.do(clave, consultar, timeout=deadline.restante())
+    except TimeoutError:
+        print("[DEBUG] validar_token_cacheado: Presupuesto agotado esperando a SYU")
+        return None
+
+
 def check_oversound_auth(api_key, required_scopes):
     """
     Verifica autenticación.
@@ -34,6 +201,9 @@ def check_oversound_auth(api_key, required_scopes):
     
     Devuelve dict con info de usuario si es válido.
     Devuelve None si es inválido (Connexion rechaza con 401).
+
+    Las validaciones se cachean y se agrupan (ver validar_token_cacheado), por
+    lo que la mayoría de peticiones de un mismo usuario no llaman a SYU.
     """
     print(f"[DEBUG] check_oversound_auth: Inicio - api_key={api_key[:20] if api_key else None}..., required_scopes={required_scopes}")
     
@@ -43,8 +213,8 @@ def check_oversound_auth(api_key, required_scopes):
         return None
     
     print(f"[DEBUG] check_oversound_auth: Validando token con AUTH_SERVER={AUTH_SERVER}")
-    user_info = is_valid_token(api_key)
-    print(f"[DEBUG] check_oversound_auth: user_info obtenido = {user_info}")
+    user_info = validar_token_cacheado(api_key)
+    print(f"[DEBUG] check_oversound_auth: user_info obtenido = {user_info} (caché: {token_cache.hits} aciertos, {token_cache.misses} fallos)")
 
     if not user_info:
         # Token inválido -> rechazar
@@ -11,6 +11,12 @@ Características:
     - Integración con microservicio TyA para obtener información de productos
     - Validación de autenticación y autorización de usuarios
     - Manejo de cantidades para productos de merchandising
+    - Portadas opcionalmente como URL (covers=url) en lugar de base64
+    - Si TyA no responde (o su circuito está abierto), los productos se toman
+      del último snapshot del catálogo y se marca la respuesta como stale
+    - Presupuesto de tiempo por petición (swagger_server.deadline): las
+      peticiones a TyA usan como timeout el tiempo restante y, si se agota,
+      la respuesta lleva `X-Partial-Response: true`
 
 Dependencias:
     - Microservicio de Autenticación: Validación de tokens y usuarios
@@ -26,14 +32,14 @@ Base de datos:
 
 import connexion
 import six
-import requests
 
 from swagger_server.models.cart_body import CartBody  # noqa: E501
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.product import Product  # noqa: E501
-from swagger_server import util
-from swagger_server.dbconx import db_conectar, db_desconectar
-from swagger_server.controllers.config import TYA_SERVICE_URL
+from swagger_server import deadline, util
+from swagger_server.dbconx import db_transaccion
+from swagger_server.catalog import catalog_cache, cover_store, tya
+from swagger_server.controllers.config import TYA_SERVICE_URL, TYA_ITEM_TIMEOUT
 
 
 
@@ -51,7 +57,9 @@ def add_to_cart(body=None):
         - Debe proporcionar exactamente uno de: songId, albumId o merchId
         - El producto no debe existir previamente en el carrito
     
-    Operaciones en BD:
+    Operaciones en BD (una sola sentencia INSERT ... SELECT ... WHERE NOT EXISTS,
+    que comprueba e inserta a la vez sin necesitar restricciones únicas en
+    las tablas):
         - Inserta en CancionesCarrito si es una canción
         - Inserta en AlbumesCarrito si es un álbum
         - Inserta en MerchCarrito (con unidades) si es merchandising
@@ -80,7 +88,6 @@ def add_to_cart(body=None):
         La transacción se realiza con rollback automático en caso de error.
     """
     print("[DEBUG] add_to_cart: Inicio de la función")
-    db_conexion = None
     try:
         print("[DEBUG] add_to_cart: Verificando si la petición es JSON")
         if not connexion.request.is_json:
@@ -103,74 +110,139 @@ def add_to_cart(body=None):
         print(f"[DEBUG] add_to_cart: user_id obtenido = {user_id}")
 
         print("[DEBUG] add_to_cart: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] add_to_cart: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] add_to_cart: Conexión establecida")
-
-        if body.song_id:
-            print(f"[DEBUG] add_to_cart: Procesando canción con ID {body.song_id}")
-            cursor.execute("SELECT 1 FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
-                           (body.song_id, user_id))
-            if cursor.fetchone():
-                print(f"[DEBUG] add_to_cart: ERROR - La canción {body.song_id} ya está en el carrito")
-                return Error(code="400", message="La canción ya está en el carrito").to_dict(), 400
-            print(f"[DEBUG] add_to_cart: Insertando canción en el carrito")
-            cursor.execute("INSERT INTO CancionesCarrito (idCancion, idUsuario) VALUES (%s, %s)",
-                           (body.song_id, user_id))
-            print(f"[DEBUG] add_to_cart: Canción insertada correctamente")
-
-        elif body.album_id:
-            print(f"[DEBUG] add_to_cart: Procesando álbum con ID {body.album_id}")
-            cursor.execute("SELECT 1 FROM AlbumesCarrito WHERE idAlbum = %s AND idUsuario = %s",
-                           (body.album_id, user_id))
-            if cursor.fetchone():
-                print(f"[DEBUG] add_to_cart: ERROR - El álbum {body.album_id} ya está en el carrito")
-                return Error(code="400", message="El álbum ya está en el carrito").to_dict(), 400
-            print(f"[DEBUG] add_to_cart: Insertando álbum en el carrito")
-            cursor.execute("INSERT INTO AlbumesCarrito (idAlbum, idUsuario) VALUES (%s, %s)",
-                           (body.album_id, user_id))
-            print(f"[DEBUG] add_to_cart: Álbum insertado correctamente")
-
-        elif body.merch_id:
-            print(f"[DEBUG] add_to_cart: Procesando merch con ID {body.merch_id}, unidades={body.unidades}")
-            cursor.execute("SELECT 1 FROM MerchCarrito WHERE idMerch = %s AND idUsuario = %s",
-                           (body.merch_id, user_id))
-            if cursor.fetchone():
-                print(f"[DEBUG] add_to_cart: ERROR - El merch {body.merch_id} ya está en el carrito")
-                return Error(code="400", message="El artículo ya está en el carrito").to_dict(), 400
-            print("[DEBUG] add_to_cart: Insertando merch en el carrito")
-            cursor.execute("INSERT INTO MerchCarrito (idMerch, idUsuario, unidades) VALUES (%s, %s, %s)",
-                           (body.merch_id, user_id, body.unidades))
-            print("[DEBUG] add_to_cart: Merch insertado correctamente")
-
-        else:
-            print("[DEBUG] add_to_cart: ERROR - No se proporcionó songId, albumId ni merchId")
-            return Error(code="400", message="Debes proporcionar songId, albumId o merchId").to_dict(), 400
-        
-        print("[DEBUG] add_to_cart: Haciendo commit de la transacción")
-        db_conexion.commit()
-        cursor.close()
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] add_to_cart: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
+            cursor = db_conexion.cursor()
+            print("[DEBUG] add_to_cart: Conexión establecida")
+
+            # Cada inserción es una única sentencia que sólo inserta si el
+            # producto no está ya en el carrito (rowcount 0 => ya existía)
+            if body.song_id:
+                print(f"[DEBUG] add_to_cart: Insertando canción {body.song_id} en el carrito")
+                cursor.execute("""
+                    INSERT INTO CancionesCarrito (idCancion, idUsuario)
+                    SELECT %(id)s, %(user_id)s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM CancionesCarrito
+                        WHERE idCancion = %(id)s AND idUsuario = %(user_id)s
+                    )
+                """, {"id": body.song_id, "user_id": user_id})
+                if cursor.rowcount == 0:
+                    print(f"[DEBUG] add_to_cart: ERROR - La canción {body.song_id} ya está en el carrito")
+                    return Error(code="400", message="La canción ya está en el carrito").to_dict(), 400
+                print(f"[DEBUG] add_to_cart: Canción insertada correctamente")
+
+            elif body.album_id:
+                print(f"[DEBUG] add_to_cart: Insertando álbum {body.album_id} en el carrito")
+                cursor.execute("""
+                    INSERT INTO AlbumesCarrito (idAlbum, idUsuario)
+                    SELECT %(id)s, %(user_id)s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM AlbumesCarrito
+                        WHERE idAlbum = %(id)s AND idUsuario = %(user_id)s
+                    )
+                """, {"id": body.album_id, "user_id": user_id})
+                if cursor.rowcount == 0:
+                    print(f"[DEBUG] add_to_cart: ERROR - El álbum {body.album_id} ya está en el carrito")
+                    return Error(code="400", message="El álbum ya está en el carrito").to_dict(), 400
+                print(f"[DEBUG] add_to_cart: Álbum insertado correctamente")
+
+            elif body.merch_id:
+                print(f"[DEBUG] add_to_cart: Insertando merch {body.merch_id} en el carrito, unidades={body.unidades}")
+                cursor.execute("""
+                    INSERT INTO MerchCarrito (idMerch, idUsuario, unidades)
+                    SELECT %(id)s, %(user_id)s, %(unidades)s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM MerchCarrito
+                        WHERE idMerch = %(id)s AND idUsuario = %(user_id)s
+                    )
+                """, {"id": body.merch_id, "user_id": user_id, "unidades": body.unidades})
+                if cursor.rowcount == 0:
+                    print(f"[DEBUG] add_to_cart: ERROR - El merch {body.merch_id} ya está en el carrito")
+                    return Error(code="400", message="El artículo ya está en el carrito").to_dict(), 400
+                print("[DEBUG] add_to_cart: Merch insertado correctamente")
+
+            else:
+                print("[DEBUG] add_to_cart: ERROR - No se proporcionó songId, albumId ni merchId")
+                return Error(code="400", message="Debes proporcionar songId, albumId o merchId").to_dict(), 400
+
+            cursor.close()
         print("[DEBUG] add_to_cart: Producto añadido exitosamente")
         return {"message": "Producto añadido al carrito correctamente"}, 200
 
     except Exception as e:
-        if db_conexion:
-            db_conexion.rollback()
         print(f"[DEBUG] add_to_cart: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
 
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
 
 
+def _producto_desde_tya(tipo, producto_data):
+    """
+    Construye un Product a partir de la respuesta de TyA para el carrito.
+
+    Args:
+        tipo (str): "song", "album" o "merch".
+        producto_data (dict): Objeto devuelto por TyA.
 
-def get_cart_products():
+    Returns:
+        Product: Producto con los campos comunes y los específicos del tipo.
+    """
+    producto_schema = Product()
+    producto_schema.name = producto_data.get("title")
+    producto_schema.description = producto_data.get("description")
+    producto_schema.price = producto_data.get("price")
+    producto_schema.artist = producto_data.get("artistId", 0)
+    producto_schema.colaborators = producto_data.get("collaborators", [])
+    producto_schema.cover = producto_data.get("cover")
+    producto_schema.release_date = producto_data.get("releaseDate")
+    if tipo == "song":
+        producto_schema.song_id = producto_data.get("songId")
+        producto_schema.album_id = producto_data.get("albumId")
+        producto_schema.genre = producto_data.get("genres", [0])[0] if producto_data.get("genres") else 0
+        producto_schema.duration = producto_data.get("duration", 0)
+    elif tipo == "album":
+        producto_schema.album_id = producto_data.get("albumId")
+        producto_schema.genre = producto_data.get("genres", [0])[0] if producto_data.get("genres") else 0
+        producto_schema.song_list = producto_data.get("songs", [])
+    else:
+        producto_schema.merch_id = producto_data.get("merchId")
+        producto_schema.genre = None  # Merch no tiene género en TyA
+    return producto_schema
+
+
+def _producto_desde_snapshot(producto, covers="inline"):
+    """
+    Construye un Product a partir de un producto del snapshot del catálogo.
+
+    El snapshot guarda una CoverRef a la portada: con covers=url se convierte
+    en cover_url y si no, en la cadena de TyA reconstruida desde cover_store
+    (la misma que devuelve el carrito cuando responde TyA).
+    """
+    tipo, product_id = tya.tipo_producto(producto)
+    cover = producto.get('cover')
+    return Product(
+        song_id=producto.get('songId'),
+        album_id=producto.get('albumId'),
+        merch_id=producto.get('merchId'),
+        name=producto.get('name'),
+        price=producto.get('price'),
+        description=producto.get('description'),
+        artist=producto.get('artist'),
+        colaborators=producto.get('colaborators'),
+        release_date=producto.get('releaseDate'),
+        duration=producto.get('duration'),
+        genre=producto.get('genre'),
+        cover=cover_store.inline(cover) if covers != "url" else None,
+        cover_url=cover_store.url(tipo, product_id, cover) if covers == "url" else None,
+        song_list=producto.get('songList')
+    )
+
+
+def get_cart_products(covers="inline"):
     """
     Obtiene todos los productos del carrito del usuario autenticado.
     
@@ -181,19 +253,32 @@ def get_cart_products():
     
     Flujo de operación:
         1. Valida el token del usuario
-        2. Consulta IDs de productos en las tablas de carrito
-        3. Para cada ID, realiza petición HTTP al microservicio TyA
+        2. Consulta IDs de productos de las tres tablas de carrito en una sola
+           consulta UNION ALL (filas tipadas: tipo, id, unidades)
+        3. Agrupa los IDs por tipo y hace una petición /list por tipo a TyA,
+           las tres en paralelo
         4. Mapea la respuesta a objetos Product del modelo
         5. Retorna lista de productos con información completa
     
+    Args:
+        covers (str, optional): "inline" (portada en base64, por defecto) o
+            "url" (portada vacía y cover_url apuntando a GET /store/cover).
+    
     Integración con TyA:
-        - GET /song/{id}: Información de canciones
-        - GET /album/{id}: Información de álbumes
-        - GET /merch/{id}: Información de merchandising
+        - GET /song/list?ids=...: Información de canciones
+        - GET /album/list?ids=...: Información de álbumes
+        - GET /merch/list?ids=...: Información de merchandising
     
     Manejo de errores:
-        - Errores de peticiones HTTP a TyA se capturan individualmente
-        - Productos que fallan se omiten de la respuesta (no bloquean el resto)
+        - Errores de peticiones HTTP a TyA se capturan por tipo de producto
+        - Si TyA falla para un tipo (o su circuit breaker está abierto y la
+          llamada se corta al instante), esos productos se toman del último
+          snapshot del catálogo y la respuesta lleva `X-Catalog-Stale: true`
+        - Productos que TyA no devuelve (ni están en el snapshot) se omiten de
+          la respuesta (no bloquean el resto)
+        - Las peticiones a TyA heredan el presupuesto de la petición y se
+          esperan como mucho el tiempo restante; si se agota, se trata como un
+          fallo de TyA y la respuesta lleva `X-Partial-Response: true`
         - Errores se registran en consola con print()
     
     Returns:
@@ -208,11 +293,10 @@ def get_cart_products():
         individual, continúa con los demás en lugar de fallar completamente.
         
     Performance:
-        Realiza múltiples peticiones HTTP síncronas. Para carritos grandes,
-        considerar implementación con peticiones asíncronas o batch.
+        Como mucho 3 peticiones HTTP concurrentes a TyA (una por tipo),
+        independientemente del número de productos del carrito.
     """
     print("[DEBUG] get_cart_products: Inicio de la función")
-    db_conexion = None
     try:
         # Obtener user_id del contexto (ya validado por check_oversound_auth)
         print("[DEBUG] get_cart_products: Obteniendo user_id del contexto")
@@ -221,125 +305,103 @@ def get_cart_products():
         print(f"[DEBUG] get_cart_products: user_id obtenido = {user_id}")
 
         print("[DEBUG] get_cart_products: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] get_cart_products: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] get_cart_products: Conexión establecida")
-
-        canciones = []
-        albumes = []
-        merchs = []
-        productos = []
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] get_cart_products: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
+            cursor = db_conexion.cursor()
+            print("[DEBUG] get_cart_products: Conexión establecida")
+
+            canciones = []
+            albumes = []
+            merchs = []
+            productos = []
         
-        # Canciones
-        print("[DEBUG] get_cart_products: Consultando canciones en el carrito")
-        cursor.execute("""
-            SELECT c.idCancion
-            FROM CancionesCarrito c
-            WHERE c.idUsuario = %s
-        """, (user_id,))
-        for row in cursor.fetchall():
-            canciones.append(row[0])
-        print(f"[DEBUG] get_cart_products: {len(canciones)} canciones encontradas: {canciones}")
-            
-        # Álbumes
-        print("[DEBUG] get_cart_products: Consultando álbumes en el carrito")
-        cursor.execute("""
-            SELECT a.idAlbum
-            FROM AlbumesCarrito a
-            WHERE a.idUsuario = %s
-        """, (user_id,))
-        for row in cursor.fetchall():
-            albumes.append(row[0])
-        print(f"[DEBUG] get_cart_products: {len(albumes)} álbumes encontrados: {albumes}")
-
-        # Merch
-        print("[DEBUG] get_cart_products: Consultando merch en el carrito")
-        cursor.execute("""
-            SELECT m.idMerch, m.unidades
-            FROM MerchCarrito m
-            WHERE m.idUsuario = %s
-        """, (user_id,))
-        for row in cursor.fetchall():
-            merchs.append((row[0], row[1]))
-        print(f"[DEBUG] get_cart_products: {len(merchs)} items de merch encontrados: {merchs}")
+            # Una sola consulta para las tres tablas de carrito: cada fila indica
+            # su tipo ('song', 'album' o 'merch'), el ID y las unidades (solo merch)
+            print("[DEBUG] get_cart_products: Consultando productos en el carrito")
+            cursor.execute("""
+                SELECT 'song' AS tipo, c.idCancion AS id, NULL::integer AS unidades
+                FROM CancionesCarrito c
+                WHERE c.idUsuario = %(user_id)s
+                UNION ALL
+                SELECT 'album', a.idAlbum, NULL
+                FROM AlbumesCarrito a
+                WHERE a.idUsuario = %(user_id)s
+                UNION ALL
+                SELECT 'merch', m.idMerch, m.unidades
+                FROM MerchCarrito m
+                WHERE m.idUsuario = %(user_id)s
+            """, {"user_id": user_id})
+            for tipo, product_id, unidades in cursor.fetchall():
+                if tipo == 'song':
+                    canciones.append(product_id)
+                elif tipo == 'album':
+                    albumes.append(product_id)
+                else:
+                    merchs.append((product_id, unidades))
+            print(f"[DEBUG] get_cart_products: {len(canciones)} canciones encontradas: {canciones}")
+            print(f"[DEBUG] get_cart_products: {len(albumes)} álbumes encontrados: {albumes}")
+            print(f"[DEBUG] get_cart_products: {len(merchs)} items de merch encontrados: {merchs}")
+            cursor.close()
+
+        # La BD ya no hace falta: la conexión ha vuelto al pool antes de esperar a TyA
 
         # Resolvemos IDs de canciones, albumes y merch usando el microservicio TyA.
+        # Una sola petición /list por tipo (como mucho 3), lanzadas en paralelo,
+        # independientemente del tamaño del carrito.
         print(f"[DEBUG] get_cart_products: Resolviendo información de productos desde TyA ({TYA_SERVICE_URL})")
-        for cancion_id in canciones:
-            try:
-                print(f"[DEBUG] get_cart_products: Obteniendo canción {cancion_id} desde TyA")
-                response = requests.get(f"{TYA_SERVICE_URL}/song/{cancion_id}", timeout=3)
-                print(f"[DEBUG] get_cart_products: Respuesta de TyA para canción {cancion_id}: status={response.status_code}")
-                if response.status_code == 200:
-                    producto_data = response.json()
-                    producto_schema = Product()
-                    producto_schema.song_id = producto_data.get("songId")
-                    producto_schema.name = producto_data.get("title")
-                    producto_schema.description = producto_data.get("description")
-                    producto_schema.price = producto_data.get("price")
-                    producto_schema.artist = producto_data.get("artistId", 0)
-                    producto_schema.colaborators = producto_data.get("collaborators", [])
-                    producto_schema.genre = producto_data.get("genres", [0])[0] if producto_data.get("genres") else 0
-                    producto_schema.duration = producto_data.get("duration", 0)
-                    producto_schema.cover = producto_data.get("cover")
-                    producto_schema.release_date = producto_data.get("releaseDate")
-                    producto_schema.album_id = producto_data.get("albumId")
-                    productos.append(producto_schema)
-                    print(f"[DEBUG] get_cart_products: Canción {cancion_id} añadida a productos")
-            except Exception as e:
-                print(f"[DEBUG] get_cart_products: ERROR al obtener canción {cancion_id}: {type(e).__name__}: {e}")
-
-        for album_id in albumes:
-            try:
-                print(f"[DEBUG] get_cart_products: Obteniendo álbum {album_id} desde TyA")
-                response = requests.get(f"{TYA_SERVICE_URL}/album/{album_id}", timeout=3)
-                print(f"[DEBUG] get_cart_products: Respuesta de TyA para álbum {album_id}: status={response.status_code}")
-                if response.status_code == 200:
-                    producto_data = response.json()
-                    producto_schema = Product()
-                    producto_schema.album_id = producto_data.get("albumId")
-                    producto_schema.name = producto_data.get("title")
-                    producto_schema.description = producto_data.get("description")
-                    producto_schema.price = producto_data.get("price")
-                    producto_schema.artist = producto_data.get("artistId", 0)
-                    producto_schema.colaborators = producto_data.get("collaborators", [])
-                    producto_schema.genre = producto_data.get("genres", [0])[0] if producto_data.get("genres") else 0
-                    producto_schema.song_list = producto_data.get("songs", [])
-                    producto_schema.cover = producto_data.get("cover")
-                    producto_schema.release_date = producto_data.get("releaseDate")
-                    productos.append(producto_schema)
-                    print(f"[DEBUG] get_cart_products: Álbum {album_id} añadido a productos")
-            except Exception as e:
-                print(f"[DEBUG] get_cart_products: ERROR al obtener álbum {album_id}: {type(e).__name__}: {e}")
-
-        for merch_tuple in merchs:
-            merch_id = merch_tuple[0]  # El primer elemento es el ID
+        ids_por_tipo = [
+            ("song", canciones),
+            ("album", albumes),
+            ("merch", [merch_tuple[0] for merch_tuple in merchs]),  # El primer elemento es el ID
+        ]
+        futuros = [
+            (tipo, ids, tya.executor.submit(deadline.propagar(tya.fetch_list), tipo, ids, TYA_ITEM_TIMEOUT))
+            for tipo, ids in ids_por_tipo if ids
+        ]
+        stale = False
+        for tipo, ids, futuro in futuros:
             try:
-                print(f"[DEBUG] get_cart_products: Obteniendo merch {merch_id} desde TyA")
-                response = requests.get(f"{TYA_SERVICE_URL}/merch/{merch_id}", timeout=3)
-                print(f"[DEBUG] get_cart_products: Respuesta de TyA para merch {merch_id}: status={response.status_code}")
-                if response.status_code == 200:
-                    producto_data = response.json()
-                    producto_schema = Product()
-                    producto_schema.merch_id = producto_data.get("merchId")
-                    producto_schema.name = producto_data.get("title")
-                    producto_schema.description = producto_data.get("description")
-                    producto_schema.price = producto_data.get("price")
-                    producto_schema.artist = producto_data.get("artistId", 0)
-                    producto_schema.colaborators = producto_data.get("collaborators", [])
-                    producto_schema.genre = None  # Merch no tiene género en TyA
-                    producto_schema.cover = producto_data.get("cover")
-                    producto_schema.release_date = producto_data.get("releaseDate")
-                    productos.append(producto_schema)
-                    print(f"[DEBUG] get_cart_products: Merch {merch_id} añadido a productos")
+                respuesta = deadline.resultado(futuro)
             except Exception as e:
-                print(f"[DEBUG] get_cart_products: ERROR al obtener merch {merch_id}: {type(e).__name__}: {e}")
+                print(f"[DEBUG] get_cart_products: ERROR al obtener {tipo} {ids}: {type(e).__name__}: {e}")
+                respuesta = None
+            if respuesta is None:
+                # TyA no disponible: último snapshot bueno del catálogo, si lo hay
+                snapshot = catalog_cache.ultimo()
+                print(f"[DEBUG] get_cart_products: TyA no devolvió {tipo} {ids}, usando el último snapshot")
+                if snapshot is None:
+                    continue
+                stale = True
+                for product_id in ids:
+                    producto_data = snapshot.index.get((tipo, product_id))
+                    if producto_data is None:
+                        continue
+                    productos.append(_producto_desde_snapshot(producto_data, covers))
+                continue
+            print(f"[DEBUG] get_cart_products: TyA devolvió {len(respuesta)} de {len(ids)} {tipo}")
+            # Respetar el orden del carrito aunque TyA devuelva otro orden
+            por_id = {str(p.get(tya.ID_FIELDS[tipo])): p for p in respuesta}
+            for product_id in ids:
+                producto_data = por_id.get(str(product_id))
+                if producto_data is None:
+                    print(f"[DEBUG] get_cart_products: {tipo} {product_id} no encontrado en TyA")
+                    continue
+                producto = _producto_desde_tya(tipo, producto_data)
+                if covers == "url":
+                    producto.cover_url = cover_store.url(tipo, product_id, cover_store.registrar(producto.cover))
+                    producto.cover = None
+                productos.append(producto)
 
-        cursor.close()
         print(f"[DEBUG] get_cart_products: Total de productos a retornar: {len(productos)}")
+        cabeceras = {}
+        if stale:
+            cabeceras["X-Catalog-Stale"] = "true"
+        if deadline.agotado():
+            cabeceras[deadline.CABECERA_PARCIAL] = "true"
+        if cabeceras:
+            return [p.to_dict() for p in productos], 200, cabeceras
         return [p.to_dict() for p in productos], 200
 
     except Exception as e:
@@ -347,9 +409,6 @@ def get_cart_products():
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
 
 
 def remove_from_cart(product_id, type=None):
@@ -365,11 +424,12 @@ def remove_from_cart(product_id, type=None):
         - "merch" o "2": Merchandising
         - None: Busca en todas las tablas
     
-    Operaciones en BD:
+    Operaciones en BD (una sola sentencia en todos los casos):
         - DELETE en CancionesCarrito si type es "song" o "0"
         - DELETE en AlbumesCarrito si type es "album" o "1"
         - DELETE en MerchCarrito si type es "merch" o "2"
-        - Si type es None, intenta eliminar de las 3 tablas
+        - Si type es None, un único DELETE encadenado (CTE) que elimina de la
+          primera tabla que contenga el producto
     
     Args:
         product_id (int): ID del producto a eliminar del carrito.
@@ -392,7 +452,7 @@ def remove_from_cart(product_id, type=None):
         >>> remove_from_cart(10)
     
     Note:
-        - La función verifica que el producto exista en el carrito antes de eliminar
+        - La existencia del producto se comprueba con el número de filas borradas
         - Si el producto no está en el carrito, retorna error 404
         - La transacción incluye rollback automático en caso de error
     
@@ -400,7 +460,6 @@ def remove_from_cart(product_id, type=None):
         Solo elimina productos del carrito del usuario autenticado,
         no puede eliminar productos de carritos de otros usuarios.
     """
-    db_conexion = None
     try:
         # --- VERIFICAR TOKEN ---
         # Obtener user_id del contexto (ya validado por check_oversound_auth)
@@ -409,85 +468,61 @@ def remove_from_cart(product_id, type=None):
         # --- VERIFICAR TOKEN ---
 
         # Eliminar producto del carrito del usuario autenticado
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] remove_from_cart: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
-        cursor = db_conexion.cursor()
-
-        # Si no se especifica type, intentar eliminar de todas las tablas
-        if type is None:
-            deleted = False
-            
-            # Intentar eliminar de CancionesCarrito
-            cursor.execute("DELETE FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
-                           (product_id, user_id))
-            if cursor.rowcount > 0:
-                deleted = True
-            
-            # Intentar eliminar de AlbumesCarrito
-            if not deleted:
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] remove_from_cart: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
+            cursor = db_conexion.cursor()
+
+            # Si no se especifica type, eliminar de la primera tabla que lo contenga
+            # (canciones, luego álbumes, luego merch) con una única sentencia
+            if type is None:
+                cursor.execute("""
+                    WITH s AS (
+                        DELETE FROM CancionesCarrito
+                        WHERE idCancion = %(id)s AND idUsuario = %(user_id)s
+                        RETURNING 1
+                    ), a AS (
+                        DELETE FROM AlbumesCarrito
+                        WHERE idAlbum = %(id)s AND idUsuario = %(user_id)s
+                          AND NOT EXISTS (SELECT 1 FROM s)
+                        RETURNING 1
+                    ), m AS (
+                        DELETE FROM MerchCarrito
+                        WHERE idMerch = %(id)s AND idUsuario = %(user_id)s
+                          AND NOT EXISTS (SELECT 1 FROM s) AND NOT EXISTS (SELECT 1 FROM a)
+                        RETURNING 1
+                    )
+                    SELECT (SELECT count(*) FROM s) + (SELECT count(*) FROM a) + (SELECT count(*) FROM m)
+                """, {"id": product_id, "user_id": user_id})
+                if not cursor.fetchone()[0]:
+                    return Error(code="404", message="El producto no está en el carrito").to_dict(), 404
+        
+            # Con type: DELETE directo, rowcount 0 => el producto no estaba en el carrito
+            elif type == "song" or type == "0":
+                cursor.execute("DELETE FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
+                               (product_id, user_id))
+                if cursor.rowcount == 0:
+                    return Error(code="404", message="La canción no está en el carrito").to_dict(), 404
+            elif type == "album" or type == "1":
                 cursor.execute("DELETE FROM AlbumesCarrito WHERE idAlbum = %s AND idUsuario = %s",
                                (product_id, user_id))
-                if cursor.rowcount > 0:
-                    deleted = True
-            
-            # Intentar eliminar de MerchCarrito
-            if not deleted:
+                if cursor.rowcount == 0:
+                    return Error(code="404", message="El álbum no está en el carrito").to_dict(), 404
+            elif type == "merch" or type == "2":
                 cursor.execute("DELETE FROM MerchCarrito WHERE idMerch = %s AND idUsuario = %s",
                                (product_id, user_id))
-                if cursor.rowcount > 0:
-                    deleted = True
-            
-            if not deleted:
-                return Error(code="404", message="El producto no está en el carrito").to_dict(), 404
-        
-        elif type == "song" or type == "0":
-            # Verificar que la canción existe en el carrito del usuario
-            cursor.execute("SELECT 1 FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
-                           (product_id, user_id))
-            if not cursor.fetchone():
-                return Error(code="404", message="La canción no está en el carrito").to_dict(), 404
-            
-            cursor.execute("DELETE FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
-                           (product_id, user_id))
-        elif type == "album" or type == "1":
-            # Verificar que el álbum existe en el carrito del usuario
-            cursor.execute("SELECT 1 FROM AlbumesCarrito WHERE idAlbum = %s AND idUsuario = %s",
-                           (product_id, user_id))
-            if not cursor.fetchone():
-                return Error(code="404", message="El álbum no está en el carrito").to_dict(), 404
-            
-            cursor.execute("DELETE FROM AlbumesCarrito WHERE idAlbum = %s AND idUsuario = %s",
-                           (product_id, user_id))
-        elif type == "merch" or type == "2":
-            # Verificar que el merch existe en el carrito del usuario
-            cursor.execute("SELECT 1 FROM MerchCarrito WHERE idMerch = %s AND idUsuario = %s",
-                           (product_id, user_id))
-            if not cursor.fetchone():
-                return Error(code="404", message="El artículo no está en el carrito").to_dict(), 404
-            
-            cursor.execute("DELETE FROM MerchCarrito WHERE idMerch = %s AND idUsuario = %s",
-                           (product_id, user_id))
-        else:
-            return Error(code="400", message="Tipo de producto inválido").to_dict(), 400
-    
-        db_conexion.commit()
-        cursor.close()
+                if cursor.rowcount == 0:
+                    return Error(code="404", message="El artículo no está en el carrito").to_dict(), 404
+            else:
+                return Error(code="400", message="Tipo de producto inválido").to_dict(), 400
+
+            cursor.close()
 
         return {"message": "Producto eliminado del carrito correctamente"}, 200
 
     except Exception as e:
-        if db_conexion:
-            db_conexion.rollback()
         print(f"[DEBUG] remove_from_cart: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
-
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
-
-
-
@@ -1 +1,145 @@
-TYA_SERVICE_URL = "http://localhost:8081"  # ajusta al host de TyA
\ No newline at end of file
+import os
+import tempfile
+
+TYA_SERVICE_URL = "http://localhost:8081"  # ajusta al host de TyA
+
+# --- Cliente HTTP compartido (swagger_server.httpconx) ---
+# Conexiones keep-alive reutilizables por host (TyA, SYU) y número de hosts
+# distintos para los que se mantiene un pool.
+HTTP_POOL_MAXSIZE = int(os.environ.get("TPP_HTTP_POOL_MAXSIZE", "20"))
+HTTP_POOL_CONNECTIONS = int(os.environ.get("TPP_HTTP_POOL_CONNECTIONS", "4"))
+
+# Timeouts (segundos) de las peticiones salientes
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("TPP_HTTP_CONNECT_TIMEOUT", "1.0"))
+TYA_TIMEOUT = float(os.environ.get("TPP_TYA_TIMEOUT", "5.0"))            # catálogo (/store)
+TYA_ITEM_TIMEOUT = float(os.environ.get("TPP_TYA_ITEM_TIMEOUT", "3.0"))  # carrito (/cart)
+AUTH_TIMEOUT = float(os.environ.get("TPP_AUTH_TIMEOUT", "2.0"))          # SYU (/auth)
+
+# Circuit breaker por endpoint de TyA (swagger_server.httpconx.circuit_breaker):
+# se abre si en las últimas TYA_CB_WINDOW llamadas (al menos TYA_CB_MIN_CALLS)
+# la fracción de errores o de llamadas más lentas que TYA_CB_SLOW_SECONDS
+# alcanza su umbral, y tras TYA_CB_OPEN_SECONDS deja pasar una llamada de prueba.
+TYA_CB_ERROR_RATE = float(os.environ.get("TPP_TYA_CB_ERROR_RATE", "0.5"))
+TYA_CB_SLOW_RATE = float(os.environ.get("TPP_TYA_CB_SLOW_RATE", "0.5"))
+TYA_CB_SLOW_SECONDS = float(os.environ.get("TPP_TYA_CB_SLOW_SECONDS", "2.0"))
+TYA_CB_WINDOW = int(os.environ.get("TPP_TYA_CB_WINDOW", "20"))
+TYA_CB_MIN_CALLS = int(os.environ.get("TPP_TYA_CB_MIN_CALLS", "5"))
+TYA_CB_OPEN_SECONDS = float(os.environ.get("TPP_TYA_CB_OPEN_SECONDS", "30"))
+
+# --- Hedged requests y reintentos a TyA (swagger_server.catalog.tya) ---
+# Endpoints en los que, si no hay respuesta al llegar al p95 de latencia
+# observado (con al menos TYA_HEDGE_MIN_SAMPLES muestras, y nunca antes de
+# TYA_HEDGE_MIN_DELAY), se envía una petición duplicada y gana la primera.
+TYA_HEDGE_PATHS = [p.strip() for p in os.environ.get(
+    "TPP_TYA_HEDGE_PATHS", "/song/list,/album/list,/merch/list,/artist/list").split(",") if p.strip()]
+TYA_HEDGE_MIN_SAMPLES = int(os.environ.get("TPP_TYA_HEDGE_MIN_SAMPLES", "20"))
+TYA_HEDGE_MIN_DELAY = float(os.environ.get("TPP_TYA_HEDGE_MIN_DELAY", "0.05"))
+# Reintentos de los GET a TyA ante errores de conexión o 502/503/504, con
+# backoff exponencial (base y tope en segundos) y jitter. TPP_TYA_RETRIES_BY_PATH
+# ajusta el número por endpoint: "/genres=0,/song/list=3".
+TYA_RETRIES = int(os.environ.get("TPP_TYA_RETRIES", "2"))
+TYA_RETRIES_BY_PATH = {}
+for _par in os.environ.get("TPP_TYA_RETRIES_BY_PATH", "").split(","):
+    if "=" in _par:
+        _ruta, _reintentos = _par.split("=", 1)
+        TYA_RETRIES_BY_PATH[_ruta.strip()] = int(_reintentos)
+TYA_RETRY_BACKOFF = float(os.environ.get("TPP_TYA_RETRY_BACKOFF", "0.1"))
+TYA_RETRY_BACKOFF_MAX = float(os.environ.get("TPP_TYA_RETRY_BACKOFF_MAX", "1.0"))
+
+# --- Pool de conexiones a Postgres (swagger_server.dbconx) ---
+# Tamaño mínimo y máximo del pool, segundos que se espera por una conexión
+# libre con el pool agotado, vida máxima de una conexión y segundos de
+# inactividad tras los que se comprueba con SELECT 1 antes de prestarla.
+DB_POOL_MIN = int(os.environ.get("TPP_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("TPP_DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("TPP_DB_POOL_TIMEOUT", "5"))
+DB_MAX_LIFETIME = float(os.environ.get("TPP_DB_MAX_LIFETIME", "1800"))
+DB_PING_IDLE = float(os.environ.get("TPP_DB_PING_IDLE", "30"))
+
+# --- Presupuesto de tiempo por petición (swagger_server.deadline) ---
+# Segundos que puede durar en total una petición, incluidas todas sus llamadas
+# a TyA, SYU y Postgres. 0 = sin límite. TPP_REQUEST_DEADLINES ajusta el valor
+# por operación: "show_storefront_products=4,get_cart_products=3".
+REQUEST_DEADLINE = float(os.environ.get("TPP_REQUEST_DEADLINE", "10"))
+REQUEST_DEADLINES = {
+    "show_storefront_products": 6.0,
+    "search_store_products": 6.0,
+    "get_cart_products": 5.0,
+}
+for _par in os.environ.get("TPP_REQUEST_DEADLINES", "").split(","):
+    if "=" in _par:
+        _operacion, _segundos = _par.split("=", 1)
+        REQUEST_DEADLINES[_operacion.strip()] = float(_segundos)
+
+# Hilos para lanzar en paralelo las peticiones independientes a TyA
+TYA_MAX_WORKERS = int(os.environ.get("TPP_TYA_WORKERS", "8"))
+
+# --- Caché del catálogo de la tienda ---
+# Segundos que un snapshot del catálogo de TyA se considera fresco. Pasado ese
+# tiempo se sigue sirviendo y se refresca en segundo plano. 0 desactiva la caché.
+CATALOG_TTL_SECONDS = float(os.environ.get("TPP_CATALOG_TTL", "300"))
+
+# Modo de obtención de productos para /store:
+#   "snapshot": catálogo completo en memoria (caché con TTL)
+#   "paged": solo se piden a TyA los detalles de los productos de la página
+#            solicitada (memoria y transferencia proporcionales a `limit`)
+STORE_FETCH_MODE = os.environ.get("TPP_STORE_FETCH_MODE", "snapshot")
+
+# Segundos que una petición espera a la carga de TyA que ya está haciendo otra
+# (single-flight) antes de servir el último valor conocido del recurso.
+CATALOG_FETCH_WAIT = float(os.environ.get("TPP_CATALOG_FETCH_WAIT", "10"))
+
+# --- Caché de métodos de pago por usuario ---
+# Segundos que se sirve la lista (enmascarada) de métodos de pago de un usuario
+# sin consultar Postgres. Altas y bajas la invalidan en el proceso que las
+# atiende; el TTL acota la desactualización en el resto. 0 la desactiva.
+PAYMENT_CACHE_TTL = float(os.environ.get("TPP_PAYMENT_CACHE_TTL", "60"))
+PAYMENT_CACHE_MAXSIZE = int(os.environ.get("TPP_PAYMENT_CACHE_MAXSIZE", "10000"))
+
+# --- Caché de validación de tokens (authorization_controller) ---
+# Segundos que se reutiliza la respuesta de SYU /auth para un mismo token. Debe
+# ser bastante menor que la vida del token; si SYU devuelve `exp` se usa el
+# mínimo de ambos. 0 desactiva la caché.
+AUTH_CACHE_TTL = float(os.environ.get("TPP_AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAXSIZE = int(os.environ.get("TPP_AUTH_CACHE_MAXSIZE", "10000"))
+# Segundos que se recuerda un token rechazado por SYU (401/403) para responder
+# localmente a los reintentos. Los fallos de conexión nunca se cachean.
+AUTH_NEGATIVE_TTL = float(os.environ.get("TPP_AUTH_NEGATIVE_TTL", "10"))
+
+# --- Verificación local de tokens JWT (authorization_controller) ---
+# Si SYU emite tokens firmados, basta con configurar su clave pública (PEM) o
+# un fichero JWKS para verificarlos en local sin llamar a /auth. Los tokens
+# opacos siguen validándose contra SYU. Requiere el paquete PyJWT[crypto].
+AUTH_JWT_PUBLIC_KEY_FILE = os.environ.get("TPP_AUTH_JWT_PUBLIC_KEY_FILE", "")
+AUTH_JWKS_FILE = os.environ.get("TPP_AUTH_JWKS_FILE", "")
+AUTH_JWT_ALGORITHMS = [a.strip() for a in os.environ.get("TPP_AUTH_JWT_ALGORITHMS", "RS256,ES256").split(",") if a.strip()]
+AUTH_JWT_AUDIENCE = os.environ.get("TPP_AUTH_JWT_AUDIENCE") or None
+AUTH_JWT_ISSUER = os.environ.get("TPP_AUTH_JWT_ISSUER") or None
+AUTH_JWT_LEEWAY = float(os.environ.get("TPP_AUTH_JWT_LEEWAY", "30"))  # desfase de reloj tolerado (s)
+
+# --- Caché de páginas serializadas de /store ---
+# Número de respuestas (page, limit) ya serializadas a JSON que se guardan por
+# versión del catálogo. 0 desactiva la caché.
+STORE_PAGE_CACHE_MAXSIZE = int(os.environ.get("TPP_STORE_PAGE_CACHE_MAXSIZE", "256"))
+STORE_PAGE_CACHE_TTL = float(os.environ.get("TPP_STORE_PAGE_CACHE_TTL", "3600"))
+
+# --- Caché HTTP de /store (ETag + Cache-Control) ---
+# Cache-Control de /store: segundos que navegador/CDN pueden reutilizar una
+# página sin revalidar, y margen para servirla caducada mientras revalidan.
+STORE_MAX_AGE = int(os.environ.get("TPP_STORE_MAX_AGE", "60"))
+STORE_STALE_WHILE_REVALIDATE = int(os.environ.get("TPP_STORE_SWR", "300"))
+
+# --- Portadas (GET /store/cover) ---
+# Metadatos de portadas que se mantienen en memoria y Cache-Control de la
+# respuesta binaria (las URLs llevan ?v=<hash>, así que pueden ser inmutables).
+COVER_CACHE_MAXSIZE = int(os.environ.get("TPP_COVER_CACHE_MAXSIZE", "4096"))
+COVER_CACHE_TTL = float(os.environ.get("TPP_COVER_CACHE_TTL", "86400"))
+COVER_MAX_AGE = int(os.environ.get("TPP_COVER_MAX_AGE", "31536000"))
+# Directorio del almacén en disco (mmap) de portadas deduplicadas por hash. Se
+# conserva entre reinicios y puede compartirse entre workers. Vacío = en memoria.
+# Por defecto en el directorio temporal (desarrollo); en despliegue el
+# Dockerfile lo fija en un volumen persistente.
+COVER_BLOB_DIR = os.environ.get("TPP_COVER_BLOB_DIR", os.path.join(tempfile.gettempdir(), "tpp-covers"))
+# Tamaño (MB) del fichero de portadas a partir del cual se compacta
+# descartando las que ya no se usan. 0 = no compactar.
+COVER_BLOB_MAX_MB = int(os.environ.get("TPP_COVER_BLOB_MAX_MB", "512"))
@@ -11,6 +11,7 @@ Características:
     - Eliminación de métodos de pago existentes
     - Almacenamiento seguro de información de tarjetas (enmascarada)
     - Asociación de métodos de pago con usuarios específicos
+    - Caché en memoria por usuario de la lista enmascarada de métodos de pago
 
 Seguridad:
     - Números de tarjeta almacenados de forma enmascarada
@@ -34,11 +35,16 @@ import requests
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.payment_method import PaymentMethod  # noqa: E501
 from swagger_server import util
-from swagger_server.dbconx import db_conectar, db_desconectar
+from swagger_server.cache import TTLCache
+from swagger_server.controllers.config import PAYMENT_CACHE_TTL, PAYMENT_CACHE_MAXSIZE
+from swagger_server.dbconx import db_transaccion
 
 # Constantes
 DB_CONNECTION_ERROR_MSG = "Error al conectar con la base de datos"
 
+# user_id → lista de métodos de pago ya enmascarados y serializados
+metodos_pago_cache = TTLCache(maxsize=PAYMENT_CACHE_MAXSIZE, ttl=PAYMENT_CACHE_TTL)
+
 
 def add_payment_method(body=None):
     """
@@ -93,10 +99,10 @@ def add_payment_method(body=None):
     
     Note:
         Utiliza RETURNING en INSERT para obtener el ID del método creado,
-        característica específica de PostgreSQL.
+        característica específica de PostgreSQL. Tras el commit invalida la
+        entrada del usuario en la caché de métodos de pago.
     """
     print("[DEBUG] add_payment_method: Inicio de la función")
-    db_conexion = None
     try:
         print("[DEBUG] add_payment_method: Verificando si la petición es JSON")
         if not connexion.request.is_json:
@@ -114,63 +120,56 @@ def add_payment_method(body=None):
 
         # Conexión a la base de datos
         print("[DEBUG] add_payment_method: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] add_payment_method: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] add_payment_method: Conexión establecida")
-
-        id_metodo = None
-        # Crear el método de pago
-        print("[DEBUG] add_payment_method: Insertando método de pago en la BD")
-        # Limpiar el número de tarjeta: remover espacios y convertir a int
-        card_number_clean = int(body.card_number.replace(" ", ""))
-        cursor.execute(
-            """
-            INSERT INTO MetodosPago (numeroTarjeta, mesValidez, anioVlidez, nombreTarjeta)
-            VALUES (%s, %s, %s, %s)
-            RETURNING idMetodoPago
-            """,
-            (card_number_clean, body.expire_month, body.expire_year, body.card_holder)
-        )
-        result = cursor.fetchone()
-        if not result:
-            print("[DEBUG] add_payment_method: ERROR - No se obtuvo ID del método de pago")
-            db_conexion.rollback()
-            return Error(code="500", message="No se pudo crear el método de pago").to_dict(), 500
-        id_metodo = result[0]
-        print(f"[DEBUG] add_payment_method: Método de pago creado con ID = {id_metodo}")
-
-        # Asociar usuario con método de pago
-        print(f"[DEBUG] add_payment_method: Asociando usuario {user_id} con método {id_metodo}")
-        cursor.execute(
-            """
-            INSERT INTO UsuariosMetodosPago (idUsuario, idMetodoPago)
-            VALUES (%s, %s)
-            """,
-            (user_id, id_metodo)
-        )
-        
-        print("[DEBUG] add_payment_method: Haciendo commit de la transacción")
-        db_conexion.commit()
-        cursor.close()
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] add_payment_method: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
+            cursor = db_conexion.cursor()
+            print("[DEBUG] add_payment_method: Conexión establecida")
+
+            id_metodo = None
+            # Crear el método de pago
+            print("[DEBUG] add_payment_method: Insertando método de pago en la BD")
+            # Limpiar el número de tarjeta: remover espacios y convertir a int
+            card_number_clean = int(body.card_number.replace(" ", ""))
+            cursor.execute(
+                """
+                INSERT INTO MetodosPago (numeroTarjeta, mesValidez, anioVlidez, nombreTarjeta)
+                VALUES (%s, %s, %s, %s)
+                RETURNING idMetodoPago
+                """,
+                (card_number_clean, body.expire_month, body.expire_year, body.card_holder)
+            )
+            result = cursor.fetchone()
+            if not result:
+                print("[DEBUG] add_payment_method: ERROR - No se obtuvo ID del método de pago")
+                db_conexion.rollback()
+                return Error(code="500", message="No se pudo crear el método de pago").to_dict(), 500
+            id_metodo = result[0]
+            print(f"[DEBUG] add_payment_method: Método de pago creado con ID = {id_metodo}")
+
+            # Asociar usuario con método de pago
+            print(f"[DEBUG] add_payment_method: Asociando usuario {user_id} con método {id_metodo}")
+            cursor.execute(
+                """
+                INSERT INTO UsuariosMetodosPago (idUsuario, idMetodoPago)
+                VALUES (%s, %s)
+                """,
+                (user_id, id_metodo)
+            )
+
+            cursor.close()
+        metodos_pago_cache.pop(user_id)
         print("[DEBUG] add_payment_method: Método de pago añadido exitosamente")
 
         return {"message": f"Método de pago agregado con id {id_metodo}", "userId": user_id}, 200
 
     except Exception as e:
-        if db_conexion:
-            db_conexion.rollback()
         print(f"[DEBUG] add_payment_method: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
 
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
-
 
 def delete_payment_method(payment_method_id):
     """
@@ -204,10 +203,10 @@ def delete_payment_method(payment_method_id):
     
     Note:
         La validación de propiedad previene que usuarios eliminen métodos de pago
-        de otros usuarios, mejorando la seguridad del sistema.
+        de otros usuarios, mejorando la seguridad del sistema. Tras el commit
+        invalida la entrada del usuario en la caché de métodos de pago.
     """
     print("[DEBUG] delete_payment_method: Inicio de la función")
-    db_conexion = None
     try:
         # Obtener user_id del contexto (ya validado por check_oversound_auth)
         print("[DEBUG] delete_payment_method: Obteniendo user_id del contexto")
@@ -216,50 +215,43 @@ def delete_payment_method(payment_method_id):
         print(f"[DEBUG] delete_payment_method: user_id obtenido = {user_id}, payment_method_id = {payment_method_id}")
 
         print("[DEBUG] delete_payment_method: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] delete_payment_method: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] delete_payment_method: Conexión establecida")
-
-        # Verificar que el método de pago pertenece al usuario autenticado
-        print(f"[DEBUG] delete_payment_method: Verificando que método {payment_method_id} pertenece a usuario {user_id}")
-        cursor.execute(
-            "SELECT 1 FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
-            (payment_method_id, user_id)
-        )
-        if not cursor.fetchone():
-            print(f"[DEBUG] delete_payment_method: ERROR - Método de pago no encontrado o no pertenece al usuario")
-            return Error(code="404", message="Método de pago no encontrado o no pertenece al usuario").to_dict(), 404
-
-        # Eliminar la asociación usuario-método
-        print(f"[DEBUG] delete_payment_method: Eliminando asociación usuario-método")
-        cursor.execute("DELETE FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
-                      (payment_method_id, user_id))
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] delete_payment_method: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
+            cursor = db_conexion.cursor()
+            print("[DEBUG] delete_payment_method: Conexión establecida")
+
+            # Verificar que el método de pago pertenece al usuario autenticado
+            print(f"[DEBUG] delete_payment_method: Verificando que método {payment_method_id} pertenece a usuario {user_id}")
+            cursor.execute(
+                "SELECT 1 FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
+                (payment_method_id, user_id)
+            )
+            if not cursor.fetchone():
+                print(f"[DEBUG] delete_payment_method: ERROR - Método de pago no encontrado o no pertenece al usuario")
+                return Error(code="404", message="Método de pago no encontrado o no pertenece al usuario").to_dict(), 404
+
+            # Eliminar la asociación usuario-método
+            print(f"[DEBUG] delete_payment_method: Eliminando asociación usuario-método")
+            cursor.execute("DELETE FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
+                          (payment_method_id, user_id))
         
-        # Eliminar el método de pago
-        print(f"[DEBUG] delete_payment_method: Eliminando método de pago")
-        cursor.execute("DELETE FROM MetodosPago WHERE idMetodoPago = %s", (payment_method_id,))
-        
-        print("[DEBUG] delete_payment_method: Haciendo commit de la transacción")
-        db_conexion.commit()
-        cursor.close()
+            # Eliminar el método de pago
+            print(f"[DEBUG] delete_payment_method: Eliminando método de pago")
+            cursor.execute("DELETE FROM MetodosPago WHERE idMetodoPago = %s", (payment_method_id,))
+
+            cursor.close()
+        metodos_pago_cache.pop(user_id)
         print("[DEBUG] delete_payment_method: Método de pago eliminado exitosamente")
         return {"message": "Método de pago eliminado correctamente"}, 200
 
     except Exception as e:
-        if db_conexion:
-            db_conexion.rollback()
         print(f"[DEBUG] delete_payment_method: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
 
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
-
 
 def show_user_payment_methods():
     """
@@ -270,10 +262,11 @@ def show_user_payment_methods():
     
     Flujo de operación:
         1. Valida token y obtiene user_id
-        2. Consulta IDs de métodos de pago en UsuariosMetodosPago
-        3. Para cada ID, consulta detalles completos en MetodosPago
-        4. Construye objetos PaymentMethod y añade ID como atributo adicional
-        5. Retorna lista de métodos serializados
+        2. Si la lista del usuario está en caché, la retorna sin tocar la BD
+        3. Consulta en una sola query (JOIN UsuariosMetodosPago-MetodosPago)
+           los métodos del usuario
+        4. Construye objetos PaymentMethod con el número enmascarado
+        5. Guarda la lista serializada en caché y la retorna
     
     Estructura de respuesta:
         Cada método de pago incluye:
@@ -312,41 +305,43 @@ def show_user_payment_methods():
     Note:
         - Retorna lista vacía [] si el usuario no tiene métodos de pago
         - El campo 'id' se añade dinámicamente y no forma parte del modelo PaymentMethod oficial
-        - La función maneja correctamente el caso de IDs sin métodos asociados (datos huérfanos)
+        - Las asociaciones sin método en MetodosPago (datos huérfanos) se omiten
+          por el propio JOIN
     
     Performance:
-        Realiza N+1 queries (1 para IDs + N para detalles). Para usuarios con muchos
-        métodos de pago, considerar optimizar con JOIN o query única.
+        Una única query con JOIN. Además el resultado (ya enmascarado) se cachea
+        por usuario durante TPP_PAYMENT_CACHE_TTL segundos, de modo que el
+        checkout casi nunca llega a Postgres; add_payment_method y
+        delete_payment_method invalidan la entrada del usuario al escribir.
     """
-    db_conexion = None
     try:
         # Obtener user_id del contexto (ya validado por check_oversound_auth)
         user_info = connexion.context.get('token_info')
         user_id = user_info.get('userId') or user_info.get('id')
 
+        cacheados = metodos_pago_cache.get(user_id)
+        if cacheados is not None:
+            return [dict(m) for m in cacheados], 200
+        # Capturar la generación antes de consultar: si una escritura invalida
+        # la caché mientras tanto, no se guarda un resultado obsoleto
+        generacion = metodos_pago_cache.generation
+
         # Consultar la base de datos con el user_id
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] get_payment_methods: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
-        cursor = db_conexion.cursor()
-
-        ids_metodos_pago = []
-        metodos = []
-        cursor.execute("""
-            SELECT idMetodoPago FROM UsuariosMetodosPago WHERE idUsuario = %s
-        """, (user_id,))
-        rows_ids = cursor.fetchall()
-        ids_metodos_pago = [row[0] for row in rows_ids]
-        if not ids_metodos_pago:
-            return [], 200  # Retornar lista vacía si no hay métodos de pago
-
-        for metodo_id in ids_metodos_pago:
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] get_payment_methods: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message=DB_CONNECTION_ERROR_MSG).to_dict(), 503
+            cursor = db_conexion.cursor()
+
             cursor.execute("""
-                SELECT idMetodoPago, numeroTarjeta, mesValidez, anioVlidez, nombreTarjeta FROM MetodosPago WHERE idMetodoPago = %s
-            """, (metodo_id,))
-            tupla = cursor.fetchone()
-            if tupla:
+                SELECT mp.idMetodoPago, mp.numeroTarjeta, mp.mesValidez, mp.anioVlidez, mp.nombreTarjeta
+                FROM UsuariosMetodosPago ump
+                JOIN MetodosPago mp ON mp.idMetodoPago = ump.idMetodoPago
+                WHERE ump.idUsuario = %s
+                ORDER BY mp.idMetodoPago
+            """, (user_id,))
+            metodos = []
+            for tupla in cursor.fetchall():
                 # Enmascarar el número de tarjeta: mostrar solo los últimos 4 dígitos
                 full_card = str(tupla[1])
                 masked_card = f"**** **** **** {full_card[-4:]}"
@@ -357,19 +352,13 @@ def show_user_payment_methods():
                     card_holder=tupla[4],
                     id=tupla[0]
                 )
-                # No need to add id as attribute since it's now a property
-                metodos.append(metodo)
-        cursor.close()
-        return [m.to_dict() for m in metodos], 200
+                metodos.append(metodo.to_dict())
+            cursor.close()
+        metodos_pago_cache.set(user_id, metodos, generation=generacion)
+        return [dict(m) for m in metodos], 200
 
     except Exception as e:
         print(f"[DEBUG] get_payment_methods: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
-
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
-
-
@@ -48,7 +48,7 @@ from datetime import datetime
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.purchase import Purchase  # noqa: E501
 from swagger_server import util
-from swagger_server.dbconx import db_conectar, db_desconectar
+from swagger_server.dbconx import db_transaccion
 
 def set_purchase(body=None):
     """
@@ -62,10 +62,17 @@ def set_purchase(body=None):
         1. Valida formato JSON del cuerpo
         2. Verifica autenticación del usuario
         3. Inserta registro principal en tabla Compras
-        4. Registra cada canción comprada en CancionesCompra
-        5. Registra cada álbum comprado en AlbumesCompra
-        6. Registra cada artículo de merch en MerchCompra
-        7. Confirma transacción y retorna ID de compra
+        4. Registra las canciones compradas en CancionesCompra
+        5. Registra los álbumes comprados en AlbumesCompra
+        6. Registra los artículos de merch en MerchCompra
+        7. Elimina del carrito los productos comprados
+        8. Confirma transacción y retorna ID de compra
+    
+    Performance:
+        Número constante de sentencias sea cual sea el tamaño de la compra:
+        un INSERT multi-fila (unnest) por tabla de líneas y un
+        DELETE ... WHERE id = ANY(%s) por tabla de carrito. La transacción
+        mantiene los bloqueos mucho menos tiempo que con una sentencia por ID.
     
     Transaccionalidad:
         - Toda la operación se realiza en una transacción única
@@ -131,7 +138,6 @@ def set_purchase(body=None):
         - Enviar notificación/email de confirmación
     """
     print("[DEBUG] create_purchase: Inicio de la función")
-    db_conexion = None
     try:
         # Verifica que el cuerpo sea JSON
         print("[DEBUG] create_purchase: Verificando si la petición es JSON")
@@ -150,146 +156,137 @@ def set_purchase(body=None):
 
         # Conexión con la base de datos
         print("[DEBUG] create_purchase: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] create_purchase: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] create_purchase: Conexión establecida")
-        
-        # --- VALIDAR QUE EL MÉTODO DE PAGO PERTENECE AL USUARIO ---
-        print(f"[DEBUG] create_purchase: Validando método de pago {body.payment_method_id} para usuario {user_id}")
-        cursor.execute(
-            "SELECT 1 FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
-            (body.payment_method_id, user_id)
-        )
-        if not cursor.fetchone():
-            print("[DEBUG] create_purchase: ERROR - El método de pago no pertenece al usuario")
-            return Error(code="403", message="El método de pago no pertenece al usuario o no existe").to_dict(), 403
-        print("[DEBUG] create_purchase: Método de pago validado correctamente")
-        # --- VALIDAR MÉTODO DE PAGO ---
-        
-        # Inserta la compra
-        print(f"[DEBUG] create_purchase: Insertando compra en BD - importe={body.purchase_price}, fecha={body.purchase_date}")
-        cursor.execute(
-            """
-            INSERT INTO Compras (idUsuario, importe, fecha, metodoPago)
-            VALUES (%s, %s, %s, %s)
-            RETURNING idCompra
-            """,
-            (user_id, body.purchase_price, body.purchase_date, body.payment_method_id)
-        )
-        result = cursor.fetchone()
-        if not result:
-            print("[DEBUG] create_purchase: ERROR - No se obtuvo ID de la compra")
-            db_conexion.rollback()
-            return Error(code="500", message="No se pudo registrar la compra").to_dict(), 500
-        id_compra = result[0]
-        print(f"[DEBUG] create_purchase: Compra registrada con ID = {id_compra}")
-        print(f"[DEBUG] create_purchase: Importe: {body.purchase_price}, Fecha: {body.purchase_date}, Método: {body.payment_method_id}")
-
-        # Registrar los productos de la compra en las tablas intermedias
-        body.song_ids = body.song_ids or []
-        body.album_ids = body.album_ids or []
-        body.merch_ids = body.merch_ids or []
-        print(f"[DEBUG] create_purchase: Song IDs: {body.song_ids}")
-        print(f"[DEBUG] create_purchase: Album IDs: {body.album_ids}")
-        print(f"[DEBUG] create_purchase: Merch IDs: {body.merch_ids}")
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] create_purchase: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
+            cursor = db_conexion.cursor()
+            print("[DEBUG] create_purchase: Conexión establecida")
         
-        for song_id in body.song_ids:
+            # --- VALIDAR QUE EL MÉTODO DE PAGO PERTENECE AL USUARIO ---
+            print(f"[DEBUG] create_purchase: Validando método de pago {body.payment_method_id} para usuario {user_id}")
             cursor.execute(
-                "INSERT INTO CancionesCompra (idCompra, idCancion) VALUES (%s, %s)",
-                (id_compra, song_id)
+                "SELECT 1 FROM UsuariosMetodosPago WHERE idMetodoPago = %s AND idUsuario = %s",
+                (body.payment_method_id, user_id)
             )
+            if not cursor.fetchone():
+                print("[DEBUG] create_purchase: ERROR - El método de pago no pertenece al usuario")
+                return Error(code="403", message="El método de pago no pertenece al usuario o no existe").to_dict(), 403
+            print("[DEBUG] create_purchase: Método de pago validado correctamente")
+            # --- VALIDAR MÉTODO DE PAGO ---
         
-        for album_id in body.album_ids:
+            # Inserta la compra
+            print(f"[DEBUG] create_purchase: Insertando compra en BD - importe={body.purchase_price}, fecha={body.purchase_date}")
             cursor.execute(
-                "INSERT INTO AlbumesCompra (idCompra, idAlbum) VALUES (%s, %s)",
-                (id_compra, album_id)
+                """
+                INSERT INTO Compras (idUsuario, importe, fecha, metodoPago)
+                VALUES (%s, %s, %s, %s)
+                RETURNING idCompra
+                """,
+                (user_id, body.purchase_price, body.purchase_date, body.payment_method_id)
             )
+            result = cursor.fetchone()
+            if not result:
+                print("[DEBUG] create_purchase: ERROR - No se obtuvo ID de la compra")
+                db_conexion.rollback()
+                return Error(code="500", message="No se pudo registrar la compra").to_dict(), 500
+            id_compra = result[0]
+            print(f"[DEBUG] create_purchase: Compra registrada con ID = {id_compra}")
+            print(f"[DEBUG] create_purchase: Importe: {body.purchase_price}, Fecha: {body.purchase_date}, Método: {body.payment_method_id}")
+
+            # Registrar los productos de la compra en las tablas intermedias
+            body.song_ids = body.song_ids or []
+            body.album_ids = body.album_ids or []
+            body.merch_ids = body.merch_ids or []
+            print(f"[DEBUG] create_purchase: Song IDs: {body.song_ids}")
+            print(f"[DEBUG] create_purchase: Album IDs: {body.album_ids}")
+            print(f"[DEBUG] create_purchase: Merch IDs: {body.merch_ids}")
         
-        for merch_id in body.merch_ids:
-            cursor.execute(
-                "INSERT INTO MerchCompra (idCompra, idMerch) VALUES (%s, %s)",
-                (id_compra, merch_id)
-            )
+            # Una sola sentencia por tabla: INSERT ... SELECT unnest(array) inserta
+            # todas las líneas de ese tipo de una vez
+            if body.song_ids:
+                cursor.execute(
+                    "INSERT INTO CancionesCompra (idCompra, idCancion) SELECT %s, unnest(%s::integer[])",
+                    (id_compra, body.song_ids)
+                )
         
-        print(f"[DEBUG] create_purchase: Productos registrados para compra {id_compra}")
+            if body.album_ids:
+                cursor.execute(
+                    "INSERT INTO AlbumesCompra (idCompra, idAlbum) SELECT %s, unnest(%s::integer[])",
+                    (id_compra, body.album_ids)
+                )
+        
+            if body.merch_ids:
+                cursor.execute(
+                    "INSERT INTO MerchCompra (idCompra, idMerch) SELECT %s, unnest(%s::integer[])",
+                    (id_compra, body.merch_ids)
+                )
+        
+            print(f"[DEBUG] create_purchase: Productos registrados para compra {id_compra}")
 
-        # --- LIMPIAR CARRITO AUTOMÁTICAMENTE DESPUÉS DE COMPRA EXITOSA ---
-        # IMPORTANTE: Solo limpiamos si el frontend envió IDs. Si las listas están vacías,
-        # significa que el frontend no está enviando los productos correctamente.
-        try:
-            total_deleted = 0
+            # --- LIMPIAR CARRITO AUTOMÁTICAMENTE DESPUÉS DE COMPRA EXITOSA ---
+            # IMPORTANTE: Solo limpiamos si el frontend envió IDs. Si las listas están vacías,
+            # significa que el frontend no está enviando los productos correctamente.
+            try:
+                total_deleted = 0
             
-            # Eliminar canciones del carrito
-            if body.song_ids:
-                print(f"[DEBUG] create_purchase: Eliminando {len(body.song_ids)} canciones del carrito: {body.song_ids}")
-                for song_id in body.song_ids:
+                # Eliminar canciones del carrito
+                if body.song_ids:
+                    print(f"[DEBUG] create_purchase: Eliminando {len(body.song_ids)} canciones del carrito: {body.song_ids}")
                     cursor.execute(
-                        "DELETE FROM CancionesCarrito WHERE idCancion = %s AND idUsuario = %s",
-                        (song_id, user_id)
+                        "DELETE FROM CancionesCarrito WHERE idUsuario = %s AND idCancion = ANY(%s)",
+                        (user_id, body.song_ids)
                     )
                     total_deleted += cursor.rowcount
-            else:
-                print("[DEBUG] create_purchase: ADVERTENCIA - No hay song_ids para eliminar del carrito")
+                else:
+                    print("[DEBUG] create_purchase: ADVERTENCIA - No hay song_ids para eliminar del carrito")
             
-            # Eliminar álbumes del carrito
-            if body.album_ids:
-                print(f"[DEBUG] create_purchase: Eliminando {len(body.album_ids)} álbumes del carrito: {body.album_ids}")
-                for album_id in body.album_ids:
+                # Eliminar álbumes del carrito
+                if body.album_ids:
+                    print(f"[DEBUG] create_purchase: Eliminando {len(body.album_ids)} álbumes del carrito: {body.album_ids}")
                     cursor.execute(
-                        "DELETE FROM AlbumesCarrito WHERE idAlbum = %s AND idUsuario = %s",
-                        (album_id, user_id)
+                        "DELETE FROM AlbumesCarrito WHERE idUsuario = %s AND idAlbum = ANY(%s)",
+                        (user_id, body.album_ids)
                     )
                     total_deleted += cursor.rowcount
-            else:
-                print("[DEBUG] create_purchase: ADVERTENCIA - No hay album_ids para eliminar del carrito")
+                else:
+                    print("[DEBUG] create_purchase: ADVERTENCIA - No hay album_ids para eliminar del carrito")
             
-            # Eliminar merchandising del carrito
-            if body.merch_ids:
-                print(f"[DEBUG] create_purchase: Eliminando {len(body.merch_ids)} items de merch del carrito: {body.merch_ids}")
-                for merch_id in body.merch_ids:
+                # Eliminar merchandising del carrito
+                if body.merch_ids:
+                    print(f"[DEBUG] create_purchase: Eliminando {len(body.merch_ids)} items de merch del carrito: {body.merch_ids}")
                     cursor.execute(
-                        "DELETE FROM MerchCarrito WHERE idMerch = %s AND idUsuario = %s",
-                        (merch_id, user_id)
+                        "DELETE FROM MerchCarrito WHERE idUsuario = %s AND idMerch = ANY(%s)",
+                        (user_id, body.merch_ids)
                     )
                     total_deleted += cursor.rowcount
-            else:
-                print("[DEBUG] create_purchase: ADVERTENCIA - No hay merch_ids para eliminar del carrito")
+                else:
+                    print("[DEBUG] create_purchase: ADVERTENCIA - No hay merch_ids para eliminar del carrito")
             
-            if total_deleted > 0:
-                print(f"[DEBUG] create_purchase: Carrito limpiado - {total_deleted} productos eliminados")
-            else:
-                print(f"[DEBUG] create_purchase: ADVERTENCIA - No se eliminó ningún producto del carrito (listas vacías o productos no encontrados)")
-        except Exception as e:
-            # El error al limpiar el carrito no debe impedir que la compra se registre
-            print(f"[DEBUG] create_purchase: ERROR al limpiar carrito del usuario {user_id}: {e}")
-            import traceback
-            traceback.print_exc()
-        # --- FIN LIMPIEZA DE CARRITO ---
+                if total_deleted > 0:
+                    print(f"[DEBUG] create_purchase: Carrito limpiado - {total_deleted} productos eliminados")
+                else:
+                    print(f"[DEBUG] create_purchase: ADVERTENCIA - No se eliminó ningún producto del carrito (listas vacías o productos no encontrados)")
+            except Exception as e:
+                # El error al limpiar el carrito no debe impedir que la compra se registre
+                print(f"[DEBUG] create_purchase: ERROR al limpiar carrito del usuario {user_id}: {e}")
+                import traceback
+                traceback.print_exc()
+            # --- FIN LIMPIEZA DE CARRITO ---
 
-        print("[DEBUG] create_purchase: Haciendo commit de la transacción")
-        db_conexion.commit()
-        cursor.close()
+            cursor.close()
         print(f"[DEBUG] create_purchase: Compra registrada exitosamente con ID {id_compra}")
 
         return {"message": f"Compra registrada con id {id_compra}", "userId": user_id}, 200
 
     except Exception as e:
-        if db_conexion:
-            db_conexion.rollback()
         print(f"[DEBUG] create_purchase: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
 
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
 
-
-def get_user_purchases():
+def get_user_purchases(limit=None, cursor=None):
     """
     Obtiene el historial de compras del usuario autenticado.
     
@@ -297,6 +294,30 @@ def get_user_purchases():
     adquiridos en cada transacción. Retorna información completa de cada compra:
     ID, fecha, importe, método de pago y listas de productos.
     
+    Performance:
+        Una única consulta: los productos de cada compra se agregan como arrays
+        (ARRAY(subconsulta) sobre CancionesCompra, AlbumesCompra y MerchCompra)
+        en lugar de 3 consultas adicionales por compra (N+1).
+    
+    Paginación (keyset):
+        Si se indica `limit` o `cursor`, se devuelve una página de como mucho
+        `limit` compras (por defecto 20, máximo 100) ordenadas por
+        (fecha, idCompra) descendente, con las compras sin fecha al principio
+        (como en el listado completo, donde `fecha DESC` pone los NULL
+        primero). El `cursor` es opaco y se obtiene del campo
+        `pagination.nextCursor` de la página anterior (null en la última). La
+        clave del cursor es COALESCE(fecha, 'infinity'), que ordena igual que
+        `fecha DESC` y permite comparar también las filas sin fecha. Un cursor
+        cuya fecha no es ISO 8601 se rechaza con 400 antes de ir a la BD.
+        Cada página es un range scan sobre el índice:
+            CREATE INDEX compras_usuario_fecha_idx
+                ON Compras (idUsuario, COALESCE(fecha, 'infinity') DESC, idCompra DESC);
+        Sin `limit` ni `cursor` se mantiene la respuesta original (lista completa).
+    
+    Args:
+        limit (int, optional): Número máximo de compras por página (1-100).
+        cursor (str, optional): Cursor opaco devuelto en la página anterior.
+    
     Returns:
         Tuple[List[Dict], int]: Lista de compras y código HTTP 200, o Error en caso de fallo.
             Cada compra incluye:
@@ -307,9 +328,10 @@ def get_user_purchases():
                 - songIds: Lista de IDs de canciones compradas
                 - albumIds: Lista de IDs de álbumes comprados
                 - merchIds: Lista de IDs de merch comprado
+            Con paginación: {"data": [compras...], "pagination": {"limit": int, "nextCursor": str|null}}
+            Error 400 si el cursor no es válido.
     """
     print("[DEBUG] get_user_purchases: Inicio de la función")
-    db_conexion = None
     try:
         # Obtener user_id del contexto (ya validado por check_oversound_auth)
         print("[DEBUG] get_user_purchases: Obteniendo user_id del contexto")
@@ -317,84 +339,89 @@ def get_user_purchases():
         user_id = user_info.get('userId') or user_info.get('id')
         print(f"[DEBUG] get_user_purchases: user_id obtenido = {user_id}")
 
+        # Validar parámetros de paginación antes de ir a la BD
+        paginar = limit is not None or cursor is not None
+        posicion = None
+        if paginar:
+            limit = min(max(limit or 20, 1), 100)
+            if cursor:
+                try:
+                    estado = util.decode_cursor(cursor)
+                    # "d" es null para las compras sin fecha (van al principio)
+                    fecha = datetime.fromisoformat(estado["d"]) if estado["d"] is not None else "infinity"
+                    posicion = {"fecha": fecha, "id": int(estado["id"])}
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"[DEBUG] get_user_purchases: ERROR - Cursor inválido: {e}")
+                    return Error(code="400", message="Cursor de paginación inválido").to_dict(), 400
+
         # Conectar a la base de datos
         print("[DEBUG] get_user_purchases: Conectando a la base de datos")
-        db_conexion = db_conectar()
-        if db_conexion is None:
-            print("[DEBUG] get_user_purchases: ERROR - No se pudo conectar a la base de datos")
-            return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
-        cursor = db_conexion.cursor()
-        print("[DEBUG] get_user_purchases: Conexión establecida")
+        with db_transaccion() as db_conexion:
+            if db_conexion is None:
+                print("[DEBUG] get_user_purchases: ERROR - No se pudo conectar a la base de datos")
+                return Error(code="503", message="Error al conectar con la base de datos").to_dict(), 503
+            db_cursor = db_conexion.cursor()
+            print("[DEBUG] get_user_purchases: Conexión establecida")
 
-        # Obtener todas las compras del usuario
-        print(f"[DEBUG] get_user_purchases: Consultando compras del usuario {user_id}")
-        cursor.execute("""
-            SELECT idCompra, importe, fecha, metodoPago
-            FROM Compras
-            WHERE idUsuario = %s
-            ORDER BY fecha DESC
-        """, (user_id,))
+            # Obtener todas las compras del usuario con sus productos en una sola
+            # consulta: cada fila trae los arrays de IDs de canciones, álbumes y merch
+            print(f"[DEBUG] get_user_purchases: Consultando compras del usuario {user_id}")
+            filtro_cursor = "AND (COALESCE(c.fecha, 'infinity'), c.idCompra) < (%(fecha)s, %(id)s)" if posicion else ""
+            limite = "LIMIT %(limit)s" if paginar else ""
+            # El orden equivale a fecha DESC (NULLS FIRST, como en Postgres), idCompra DESC
+            db_cursor.execute(f"""
+                SELECT c.idCompra, c.importe, c.fecha, c.metodoPago,
+                       ARRAY(SELECT cc.idCancion FROM CancionesCompra cc WHERE cc.idCompra = c.idCompra) AS song_ids,
+                       ARRAY(SELECT ac.idAlbum FROM AlbumesCompra ac WHERE ac.idCompra = c.idCompra) AS album_ids,
+                       ARRAY(SELECT mc.idMerch FROM MerchCompra mc WHERE mc.idCompra = c.idCompra) AS merch_ids
+                FROM Compras c
+                WHERE c.idUsuario = %(user_id)s {filtro_cursor}
+                ORDER BY COALESCE(c.fecha, 'infinity') DESC, c.idCompra DESC
+                {limite}
+            """, dict(posicion or {}, user_id=user_id, limit=(limit or 0) + 1))
         
-        compras_rows = cursor.fetchall()
-        print(f"[DEBUG] get_user_purchases: Se encontraron {len(compras_rows)} compras")
+            compras_rows = db_cursor.fetchall()
+            print(f"[DEBUG] get_user_purchases: Se encontraron {len(compras_rows)} compras")
         
-        purchases = []
+            purchases = []
         
-        for row in compras_rows:
-            purchase_id, importe, fecha, metodo_pago = row
-            print(f"[DEBUG] get_user_purchases: Procesando compra {purchase_id}")
-            
-            # Obtener canciones de esta compra
-            cursor.execute("""
-                SELECT idCancion
-                FROM CancionesCompra
-                WHERE idCompra = %s
-            """, (purchase_id,))
-            song_ids = [r[0] for r in cursor.fetchall()]
-            print(f"[DEBUG] get_user_purchases: Compra {purchase_id} - {len(song_ids)} canciones")
-            
-            # Obtener álbumes de esta compra
-            cursor.execute("""
-                SELECT idAlbum
-                FROM AlbumesCompra
-                WHERE idCompra = %s
-            """, (purchase_id,))
-            album_ids = [r[0] for r in cursor.fetchall()]
-            print(f"[DEBUG] get_user_purchases: Compra {purchase_id} - {len(album_ids)} álbumes")
+            for row in compras_rows:
+                purchase_id, importe, fecha, metodo_pago, song_ids, album_ids, merch_ids = row
             
-            # Obtener merch de esta compra
-            cursor.execute("""
-                SELECT idMerch
-                FROM MerchCompra
-                WHERE idCompra = %s
-            """, (purchase_id,))
-            merch_ids = [r[0] for r in cursor.fetchall()]
-            print(f"[DEBUG] get_user_purchases: Compra {purchase_id} - {len(merch_ids)} items de merch")
-            
-            # Construir objeto de compra
-            purchase = {
-                'purchaseId': purchase_id,
-                'purchaseDate': fecha.isoformat() if fecha else None,
-                'purchasePrice': float(importe) if importe else 0.0,
-                'paymentMethodId': metodo_pago,
-                'songIds': song_ids,
-                'albumIds': album_ids,
-                'merchIds': merch_ids
-            }
-            purchases.append(purchase)
+                # Construir objeto de compra
+                purchase = {
+                    'purchaseId': purchase_id,
+                    'purchaseDate': fecha.isoformat() if fecha else None,
+                    'purchasePrice': float(importe) if importe else 0.0,
+                    'paymentMethodId': metodo_pago,
+                    'songIds': song_ids or [],
+                    'albumIds': album_ids or [],
+                    'merchIds': merch_ids or []
+                }
+                purchases.append(purchase)
         
-        cursor.close()
+            db_cursor.close()
         print(f"[DEBUG] get_user_purchases: Retornando {len(purchases)} compras")
-        return purchases, 200
+        if not paginar:
+            return purchases, 200
+
+        # Se pidió una fila de más para saber si existe página siguiente
+        next_cursor = None
+        if len(purchases) > limit:
+            purchases = purchases[:limit]
+            ultima = compras_rows[limit - 1]
+            fecha = ultima[2].isoformat() if ultima[2] else None
+            next_cursor = util.encode_cursor({"d": fecha, "id": ultima[0]})
+        return {
+            "data": purchases,
+            "pagination": {
+                "limit": limit,
+                "nextCursor": next_cursor
+            }
+        }, 200
 
     except Exception as e:
         print(f"[DEBUG] get_user_purchases: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
-
-    finally:
-        if db_conexion:
-            db_desconectar(db_conexion)
-
-
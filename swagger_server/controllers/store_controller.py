@@ -20,7 +20,7 @@ Arquitectura:
     Beneficios del patrón:
         - Desacoplamiento entre frontend y TyA
         - Transformación de datos centralizada
-        - Caché potencial (no implementado)
+        - Caché en memoria del catálogo (swagger_server.catalog)
         - Agregación de múltiples fuentes de datos
 
 Dependencias:
@@ -32,6 +32,9 @@ Dependencias:
             - GET /song/list?ids=...: Obtiene detalles completos de canciones por IDs
             - GET /album/list?ids=...: Obtiene detalles completos de álbumes por IDs
             - GET /merch/list?ids=...: Obtiene detalles completos de merch por IDs
+            - GET /genres, /artist/filter, /artist/list: Catálogos para filtros
+
+    Las peticiones a TyA y el mapeo a Product viven en swagger_server.catalog.tya.
 
 Modelo de datos:
     Transforma datos de TyA al modelo Product de TPP, que incluye:
@@ -41,30 +44,310 @@ Modelo de datos:
         - Información específica por tipo (duración para canciones, lista de canciones para álbumes)
 
 Performance:
-    - Realiza 3 peticiones HTTP síncronas al microservicio TyA
-    - Considera implementar caché para reducir latencia y carga en TyA
-    - Timeout configurado a 5 segundos por petición
+    - El catálogo se sirve desde un snapshot en memoria con TTL configurable
+      (TPP_CATALOG_TTL, por defecto 300 s)
+    - Al caducar, el snapshot se refresca en segundo plano (stale-while-revalidate):
+      ninguna petición de usuario espera a TyA salvo la primera carga
+    - Las peticiones independientes a TyA se lanzan en paralelo (TPP_TYA_WORKERS)
+    - Timeout configurado a 5 segundos por petición a TyA
     - Implementa paginación para optimizar transferencia de datos
+    - Modo "paged" opcional que solo pide a TyA los detalles de la página
+    - Las respuestas de cada (page, limit) se guardan ya serializadas a JSON
+      por versión del catálogo y se devuelven tal cual, sin pasar por el
+      JSONEncoder de Flask/Connexion
+    - ETag fuerte por (versión del catálogo, page, limit) y Cache-Control: las
+      visitas repetidas con If-None-Match se responden con 304 sin cuerpo
+    - Con covers=url los listados sustituyen la portada base64 por coverUrl y
+      las imágenes se sirven aparte, en binario y cacheables, desde
+      GET /store/cover/{kind}/{productId}
+    - El catálogo en memoria solo guarda una referencia (CoverRef) a cada
+      portada; con covers=inline la cadena de TyA se reconstruye tal cual desde
+      cover_store al serializar la página
+    - Filtros (genre, artist, type, minPrice, maxPrice) y orden (sort) en el
+      servidor, resueltos con los índices en memoria del snapshot
+    - Búsqueda de texto completo (GET /store/search) sobre un índice invertido
+      que se actualiza de forma incremental con cada refresco del catálogo
+    - Paginación por cursor (scroll infinito): `nextCursor` identifica el último
+      producto entregado y su rango en el orden de la consulta, de modo que la
+      página siguiente se localiza con búsqueda binaria y no se salta ni repite
+      productos aunque el catálogo se refresque entre peticiones
+    - Circuit breaker por endpoint de TyA: si TyA falla o va lento, las
+      llamadas se cortan al instante y se sirve el último snapshot bueno con
+      la cabecera `X-Catalog-Stale: true` (y sin caché compartida)
+    - Presupuesto de tiempo por petición (swagger_server.deadline): si se
+      agota antes de tener el catálogo completo se responde con lo disponible
+      y la cabecera `X-Partial-Response: true`
 """
 
-import requests
+import hashlib
+import json
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+from swagger_server import deadline, util
 from swagger_server.models.error import Error
 from swagger_server.models.product import Product
-from swagger_server.controllers.config import TYA_SERVICE_URL
+from swagger_server.cache import TTLCache
+from swagger_server.catalog import CoverRef, catalog_cache, cover_store, tya
+from swagger_server.catalog.search import tokenizar
+from swagger_server.controllers.config import (
+    STORE_FETCH_MODE, STORE_PAGE_CACHE_MAXSIZE, STORE_PAGE_CACHE_TTL,
+    STORE_MAX_AGE, STORE_STALE_WHILE_REVALIDATE, COVER_MAX_AGE
+)
+
+# (versión del catálogo, inicio de página, limit, covers, filtros) → cuerpo JSON de la respuesta en bytes
+paginas_cache = TTLCache(maxsize=STORE_PAGE_CACHE_MAXSIZE, ttl=STORE_PAGE_CACHE_TTL)
+
+
+def _serializar(cuerpo):
+    """Serializa la respuesta de /store a bytes JSON compactos (UTF-8)."""
+    return json.dumps(cuerpo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _cabeceras_cache(etag, stale=False, parcial=False):
+    if stale or parcial:
+        # Datos antiguos o incompletos: marcarlos y no dejar que se cacheen
+        cabeceras = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if stale:
+            cabeceras["X-Catalog-Stale"] = "true"
+        if parcial:
+            cabeceras[deadline.CABECERA_PARCIAL] = "true"
+        return cabeceras
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={STORE_MAX_AGE}, stale-while-revalidate={STORE_STALE_WHILE_REVALIDATE}",
+    }
+
+
+def _respuesta_json(datos, etag, stale=False, parcial=False):
+    return Response(datos, status=200, mimetype="application/json",
+                    headers=_cabeceras_cache(etag, stale, parcial))
+
+
+def _no_modificado(etag):
+    """
+    True si el cliente ya tiene la versión `etag` (cabecera If-None-Match).
+
+    If-None-Match usa la comparación débil (RFC 7232, 3.2): un `W/"..."` que
+    haya debilitado un proxy o CDN también cuenta.
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def _paginar(total_productos, page, limit):
+    """
+    Normaliza los parámetros de paginación y calcula el slice de la página.
+
+    Returns:
+        Tuple[int, int, int, int, int]: (page, limit, total_pages, start_index, end_index)
+    """
+    # Validar y ajustar parámetros de paginación
+    if page is None or page < 1:
+        page = 1
+    if limit is None or limit < 1:
+        limit = 20
+    if limit > 100:
+        limit = 100
+
+    # Calcular metadata de paginación
+    total_pages = (total_productos + limit - 1) // limit if total_productos > 0 else 1
+
+    # Ajustar página si excede el total
+    if page > total_pages and total_pages > 0:
+        page = total_pages
+
+    # Calcular índices de slice para la página solicitada
+    start_index = (page - 1) * limit
+    end_index = start_index + limit
+    return page, limit, total_pages, start_index, end_index
+
+
+def _con_cover_url(producto):
+    """Copia del producto con coverUrl en lugar de la portada en base64."""
+    tipo, product_id = tya.tipo_producto(producto)
+    ligero = dict(producto)
+    ligero['cover'] = None
+    ligero['coverUrl'] = cover_store.url(tipo, product_id, producto.get('cover'))
+    return ligero
+
+
+def _con_cover_inline(producto):
+    """Copia del producto con la portada en base64, reconstruida desde cover_store."""
+    completo = dict(producto)
+    completo['cover'] = cover_store.inline(producto.get('cover'))
+    return completo
+
+
+def _con_covers(productos, covers):
+    """
+    Productos listos para serializar: la CoverRef de `cover` pasa a coverUrl o a base64.
+
+    Returns:
+        Tuple[List[dict], int]: Productos y número de portadas que ya no están
+        en el almacén (compactadas por otro worker; vuelven a guardarse en el
+        siguiente refresco del catálogo).
+    """
+    if covers == "url":
+        return [_con_cover_url(p) for p in productos], 0
+    pagina = [_con_cover_inline(p) for p in productos]
+    faltan = sum(1 for producto, completo in zip(productos, pagina)
+                 if isinstance(producto.get('cover'), CoverRef) and completo['cover'] is None)
+    return pagina, faltan
+
+
+def _cuerpo_store(productos, page, limit, total_productos, total_pages, genres, artists, covers="inline",
+                  next_cursor=None):
+    """
+    Construye el cuerpo de respuesta de /store: página, metadata y catálogos.
+
+    Returns:
+        Tuple[dict, int]: Cuerpo y número de portadas que faltan (ver _con_covers).
+    """
+    productos, faltan = _con_covers(productos, covers)
+    cuerpo = {
+        "data": productos,
+        "pagination": {
+            "page": page,
+            "limit": limit,
+            "total": total_productos,
+            "totalPages": total_pages,
+            "nextCursor": next_cursor
+        },
+        "genres": genres,
+        "artists": artists
+    }
+    return cuerpo, faltan
+
+
+def _huella_consulta(consulta):
+    """Huella estable (entre procesos) de los filtros de una consulta."""
+    return hashlib.sha1(repr(consulta).encode("utf-8")).hexdigest()[:12]
+
+
+def _crear_cursor(version, huella, clave, rango):
+    """
+    Cursor opaco que apunta justo después de un producto.
+
+    Guarda la versión del catálogo, la huella de la consulta, el (tipo, id)
+    del último producto entregado y su rango en el orden de la consulta.
+    """
+    return util.encode_cursor({"v": version, "q": huella, "k": list(clave), "r": rango})
+
+
+def _inicio_cursor(cursor, snapshot, posiciones, sort, huella):
+    """
+    Índice en `posiciones` en el que empieza la página que sigue a `cursor`.
+
+    Con la misma versión del catálogo el rango guardado es exacto. Si el
+    catálogo se ha refrescado, se reancla en el último producto entregado
+    (su rango en el nuevo orden); si ese producto ya no existe se usa el rango
+    guardado como aproximación.
+
+    Raises:
+        ValueError, KeyError, TypeError: Cursor mal formado o de otra consulta.
+    """
+    estado = util.decode_cursor(cursor)
+    if estado.get("q", "") != huella:
+        raise ValueError("el cursor corresponde a otra consulta")
+    rango = int(estado["r"])
+    if estado.get("v") != snapshot.version:
+        tipo, product_id = estado["k"]
+        posicion = snapshot.posicion.get((tipo, int(product_id)))
+        if posicion is not None:
+            rango = snapshot.indexes.rango_de(posicion, sort)
+    return snapshot.indexes.inicio_tras(posiciones, rango, sort)
+
+
+def _inicio_cursor_refs(cursor, refs):
+    """
+    Índice en `refs` (modo "paged", sin filtros) en el que empieza la página
+    que sigue a `cursor`.
+
+    Se reancla en el último producto entregado; si ya no está en el catálogo
+    se usa el rango guardado, que sin orden es su posición en el catálogo.
+
+    Raises:
+        ValueError, KeyError, TypeError: Cursor mal formado o de otra consulta.
+    """
+    estado = util.decode_cursor(cursor)
+    if estado.get("q", ""):
+        raise ValueError("el cursor corresponde a otra consulta")
+    rango = int(estado["r"])
+    tipo, product_id = estado["k"]
+    try:
+        rango = refs.index((tipo, int(product_id)))
+    except ValueError:
+        pass
+    return min(max(rango + 1, 0), len(refs))
 
-def show_storefront_products(page=1, limit=20):
+
+def show_storefront_products(page=1, limit=20, covers="inline", genre=None, artist=None, type_=None,
+                             min_price=None, max_price=None, sort=None, cursor=None):
     """
     Obtiene y retorna el catálogo paginado de productos de la tienda.
     
-    Consulta el microservicio de Temas y Autores (TyA) para obtener todos los
-    productos disponibles (canciones, álbumes y merchandising) y los transforma
-    al formato Product esperado por el frontend, aplicando paginación a los resultados.
+    Obtiene el catálogo de productos (canciones, álbumes y merchandising) del
+    snapshot en memoria del microservicio de Temas y Autores (TyA), ya
+    transformado al formato Product esperado por el frontend, y aplica la
+    paginación sobre los resultados.
     
     Args:
         page (int, optional): Número de página a retornar (comienza en 1). Default: 1.
         limit (int, optional): Cantidad de productos por página (1-100). Default: 20.
+        covers (str, optional): "inline" (portada en base64 en `cover`, por
+            compatibilidad) o "url" (portada vacía y `coverUrl` apuntando a
+            GET /store/cover). Default: "inline".
+        genre (int, optional): Solo productos de ese género.
+        artist (int, optional): Solo productos de ese artista principal.
+        type_ (str, optional): Solo productos de ese tipo ("song", "album", "merch").
+        min_price (float, optional): Precio mínimo (incluido).
+        max_price (float, optional): Precio máximo (incluido).
+        sort (str, optional): Orden: "price", "releaseDate" o "name"; con "-"
+            delante, descendente. Sin él se mantiene el orden del catálogo.
+        cursor (str, optional): Cursor opaco de `pagination.nextCursor` de la
+            respuesta anterior. Tiene prioridad sobre `page` y debe usarse con
+            los mismos filtros y orden.
+    
+    Filtros y orden:
+        Se resuelven con los índices del snapshot (catalog.indexes): índices
+        invertidos por género, artista y tipo, precios ordenados para el
+        rango de precio y órdenes precalculados. No se recorre el catálogo en
+        cada petición; `total` y `totalPages` se refieren a los productos que
+        cumplen los filtros. Con filtros u orden se usa siempre el snapshot,
+        también en modo "paged".
+    
+    Paginación por cursor:
+        Cada respuesta incluye `pagination.nextCursor` (null en la última
+        página). El cursor guarda la versión del catálogo, la huella de la
+        consulta y el último producto entregado junto con su rango en el
+        orden de la consulta. Como el resultado está ordenado por ese rango,
+        el inicio de la página siguiente se localiza con búsqueda binaria y
+        la página es un slice de `limit` elementos, sin importar lo profunda
+        que sea. Si entre dos peticiones el catálogo cambia de versión, la
+        página siguiente empieza justo después de ese mismo producto en el
+        nuevo orden, en lugar de desplazarse como ocurre con `page`. Un cursor
+        mal formado o de otra consulta se rechaza con 400. En modo "paged" sin
+        filtros el cursor se resuelve sobre la lista de IDs de los /filter,
+        sin cargar el snapshot.
+    
+    Disponibilidad:
+        Las llamadas a TyA pasan por un circuit breaker por endpoint. Mientras
+        alguno está abierto (o la última carga de algún recurso falló) se
+        sirve el último snapshot bueno con la cabecera `X-Catalog-Stale: true`
+        y Cache-Control: no-cache. En modo "paged", si algún circuito de
+        productos está abierto se usa el snapshot en lugar de TyA.
+    
+    Presupuesto de tiempo:
+        La petición tiene un presupuesto total (TPP_REQUEST_DEADLINES). La
+        carga inicial del catálogo se espera como mucho ese tiempo; si se
+        agota, se responde con los recursos ya cargados y la cabecera
+        `X-Partial-Response: true`. En modo "paged" las peticiones a TyA usan
+        como timeout el tiempo restante y las que no llegan se omiten.
     
     Flujo de operación:
+        0. Obtiene el snapshot de catalog_cache. Solo si no existe (o ha caducado,
+           en segundo plano) se ejecutan los pasos 1-4 contra TyA.
         1. Realiza 3 peticiones HTTP al microservicio TyA usando endpoints filter:
            - GET /song/filter: Obtiene IDs de todas las canciones
            - GET /album/filter: Obtiene IDs de todos los álbumes
@@ -100,13 +383,17 @@ def show_storefront_products(page=1, limit=20):
             - Sin duración ni lista de canciones
     
     Manejo de errores:
-        - Si falla la conexión con TyA, retorna listas vacías para ese tipo
+        - Si falla la conexión con TyA, se conserva el último snapshot válido
+          (o listas vacías si nunca se pudo cargar ese tipo)
         - Errores de conexión se registran en consola
         - La función continúa con los tipos disponibles
         - Errores generales retornan objeto Error con código 500
     
     Returns:
-        Dict|Error: Objeto con datos paginados y metadata, o Error en caso de fallo crítico.
+        Response|Dict|Error: Objeto con datos paginados y metadata (en modo
+        snapshot, un Response con el JSON ya serializado, ETag y
+        Cache-Control, o un 304 si el If-None-Match sigue vigente), o Error
+        en caso de fallo crítico.
             Éxito: {
                 "data": [Product, ...],  # Lista de productos de la página actual
                 "pagination": {
@@ -159,15 +446,30 @@ def show_storefront_products(page=1, limit=20):
         - Lista vacía si no hay productos en el rango solicitado
     
     Performance considerations:
-        - 6 peticiones HTTP síncronas (3 para IDs + 3 para detalles)
+        - Con snapshot fresco no se hace ninguna petición a TyA: la página es un
+          slice de la lista en memoria
+        - Refresco (8 peticiones HTTP: filter + list por tipo, géneros y artistas)
+          en segundo plano al caducar el TTL
+        - Las cadenas filter → list de cada recurso se lanzan en paralelo: la
+          carga tarda lo que la cadena más lenta, no la suma de las peticiones
         - Timeout de 5 segundos por petición
-        - No implementa caché (cada request consulta TyA)
-        - Paginación se aplica en memoria después de obtener todos los productos
-        - Implementación actual más eficiente que consultas individuales
+        - Paginación se aplica en memoria sobre el snapshot
+        - Caché de páginas serializadas: la clave es (versión del catálogo,
+          page, limit), de modo que un cambio en TyA invalida todas las
+          páginas de golpe. En un acierto no se construye ningún dict ni se
+          codifica JSON: se devuelven los bytes guardados en un Response
+        - Peticiones condicionales: el ETag se calcula solo con la versión y
+          los parámetros de página, así que un If-None-Match vigente se
+          responde con 304 sin construir ni buscar el cuerpo. Una página a la
+          que le faltan portadas en el almacén lleva otro ETag, se marca como
+          parcial y no se cachea. En modo "paged"
+          no hay versión: el ETag es la huella del cuerpo ya construido, y el
+          304 solo ahorra la transferencia
+        - Modo "paged" (TPP_STORE_FETCH_MODE=paged): en lugar del snapshot
+          completo, se piden los 3 /filter, se calcula la página y solo se
+          llama a /list con los IDs de esa página. Transferencia, parseo JSON y
+          memoria por petición escalan con `limit` y no con el catálogo
         - Considera implementar:
-            * Peticiones asíncronas con asyncio
-            * Caché con TTL configurable
-            * Paginación a nivel de TyA para reducir transferencia
             * Batch único si TyA implementa endpoint combinado
     
     Data transformation:
@@ -182,311 +484,227 @@ def show_storefront_products(page=1, limit=20):
         - Los géneros se manejan como el primer elemento de la lista de TyA
     """
     try:
-        productos = []
-
-        # --- Obtener datos del microservicio Temas y Autores ---
-        try:
-            # PASO 1: Obtener IDs usando endpoints /filter (sin parámetros = todos)
-            # -----------------------------------------------------------------------
-            # Los endpoints /song/filter, /album/filter y /merch/filter retornan
-            # listas de objetos con solo los IDs cuando se llaman sin parámetros.
-            # Esto es más eficiente que obtener objetos completos inicialmente.
-            # Formato de respuesta: [{"songId": 1}, {"songId": 2}, ...]
-            
-            song_ids_response = requests.get(
-                f"{TYA_SERVICE_URL}/song/filter",
-                timeout=5.0,
-                headers={"Accept": "application/json"}
-            )
-            album_ids_response = requests.get(
-                f"{TYA_SERVICE_URL}/album/filter",
-                timeout=5.0,
-                headers={"Accept": "application/json"}
-            )
-            merch_ids_response = requests.get(
-                f"{TYA_SERVICE_URL}/merch/filter",
-                timeout=5.0,
-                headers={"Accept": "application/json"}
-            )
-            
-            # Extraer IDs - puede venir como lista de enteros [1, 2, 3] o lista de objetos [{"songId": 1}]
-            song_ids = []
-            album_ids = []
-            merch_ids = []
-            
-            if song_ids_response.ok:
-                data = song_ids_response.json()
-                if data and len(data) > 0:
-                    # Verificar si es lista de enteros o lista de objetos
-                    if isinstance(data[0], int):
-                        song_ids = data
-                    elif isinstance(data[0], dict):
-                        song_ids = [item.get("songId") for item in data if item.get("songId")]
-            
-            if album_ids_response.ok:
-                data = album_ids_response.json()
-                if data and len(data) > 0:
-                    if isinstance(data[0], int):
-                        album_ids = data
-                    elif isinstance(data[0], dict):
-                        album_ids = [item.get("albumId") for item in data if item.get("albumId")]
-            
-            if merch_ids_response.ok:
-                data = merch_ids_response.json()
-                if data and len(data) > 0:
-                    if isinstance(data[0], int):
-                        merch_ids = data
-                    elif isinstance(data[0], dict):
-                        merch_ids = [item.get("merchId") for item in data if item.get("merchId")]
-            
-            # PASO 2: Obtener detalles completos usando endpoints /list
-            # ----------------------------------------------------------
-            # Los endpoints /song/list, /album/list y /merch/list aceptan múltiples
-            # IDs en formato comma-separated (ej: "1,2,3,5,8") y retornan los objetos
-            # completos con toda la información (title, price, cover, etc.).
-            # Esto permite hacer batch requests en lugar de N peticiones individuales.
-            canciones = []
-            albumes = []
-            merch = []
-            
-            # Solo hacer petición si existen IDs (optimización)
-            if song_ids:
-                ids_str = ",".join(map(str, song_ids))  # Convertir lista a "1,2,3,..."
-                response = requests.get(
-                    f"{TYA_SERVICE_URL}/song/list?ids={ids_str}",
-                    timeout=5.0,
-                    headers={"Accept": "application/json"}
-                )
-                if response.ok:
-                    canciones = response.json()
-            
-            if album_ids:
-                ids_str = ",".join(map(str, album_ids))
-                response = requests.get(
-                    f"{TYA_SERVICE_URL}/album/list?ids={ids_str}",
-                    timeout=5.0,
-                    headers={"Accept": "application/json"}
-                )
-                if response.ok:
-                    albumes = response.json()
-            
-            if merch_ids:
-                ids_str = ",".join(map(str, merch_ids))
-                response = requests.get(
-                    f"{TYA_SERVICE_URL}/merch/list?ids={ids_str}",
-                    timeout=5.0,
-                    headers={"Accept": "application/json"}
-                )
-                if response.ok:
-                    merch = response.json()
-                    
-        except requests.RequestException as e:
-            print(f"Error al conectar con Temas y Autores: {e}")
-            canciones, albumes, merch = [], [], []
-        except Exception as e:
-            print(f"Error inesperado al obtener datos de TyA: {e}")
-            canciones, albumes, merch = [], [], []
-
-        # --- Mapear / Enmascarar canciones ---
-        for c in canciones:
-            # Convertir strings a tipos correctos
-            artist_id = c.get("artistId")
-            if isinstance(artist_id, str):
-                artist_id = int(artist_id) if artist_id else 0
-            
-            duration = c.get("duration")
-            if isinstance(duration, str):
-                duration = int(duration) if duration else 0
-            
-            genres = c.get("genres", [])
-            if genres and isinstance(genres[0], str):
-                genres = [int(g) for g in genres if g]
-            genre = genres[0] if genres else 0
-            
-            collaborators = c.get("collaborators", [])
-            if collaborators and isinstance(collaborators[0], str):
-                collaborators = [int(col) for col in collaborators if col]
-            
-            price_str = c.get("price", "0")
-            if isinstance(price_str, str):
-                price_str = price_str.replace(",", ".")
-            price = float(price_str) if price_str else 0.0
-            
-            productos.append({
-                'songId': c.get("songId"),
-                'albumId': c.get("albumId"),
-                'merchId': None,
-                'name': c.get("title"),
-                'price': price,
-                'description': c.get("description"),
-                'artist': artist_id,
-                'colaborators': collaborators,
-                'releaseDate': f"{c.get('releaseDate')}T00:00:00Z" if c.get('releaseDate') else None,
-                'duration': duration,
-                'genre': genre,
-                'cover': c.get("cover"),
-                'songList': None
-            })
+        filtros = {
+            "genre": genre, "artist": artist, "tipo": type_,
+            "min_price": min_price, "max_price": max_price, "sort": sort
+        }
+        consulta = tuple(filtros.values()) if any(v is not None for v in filtros.values()) else ()
+        huella = _huella_consulta(consulta) if consulta else ""
 
-        # --- Mapear álbumes ---
-        for a in albumes:
-            # Convertir strings a tipos correctos
-            artist_id = a.get("artistId")
-            if isinstance(artist_id, str):
-                artist_id = int(artist_id) if artist_id else 0
-            
-            genres = a.get("genres", [])
-            if genres and isinstance(genres[0], str):
-                genres = [int(g) for g in genres if g]
-            genre = genres[0] if genres else 0
-            
-            collaborators = a.get("collaborators", [])
-            if collaborators and isinstance(collaborators[0], str):
-                collaborators = [int(col) for col in collaborators if col]
-            
-            songs = a.get("songs", [])
-            if songs and isinstance(songs[0], str):
-                songs = [int(s) for s in songs if s]
-            
-            price_str = a.get("price", "0")
-            if isinstance(price_str, str):
-                price_str = price_str.replace(",", ".")
-            price = float(price_str) if price_str else 0.0
-            
-            productos.append({
-                'songId': None,
-                'albumId': a.get("albumId"),
-                'merchId': None,
-                'name': a.get("title"),
-                'price': price,
-                'description': a.get("description"),
-                'artist': artist_id,
-                'colaborators': collaborators,
-                'releaseDate': f"{a.get('releaseDate')}T00:00:00Z" if a.get('releaseDate') else None,
-                'duration': None,
-                'genre': genre,
-                'cover': a.get("cover"),
-                'songList': songs
-            })
+        if STORE_FETCH_MODE == "paged" and not consulta and not tya.degradado():
+            # --- Modo paged: solo se piden a TyA los detalles de la página ---
+            # Los /filter dan la lista ordenada de IDs (ligera); con ella se
+            # calcula la página y solo sus IDs se resuelven con /list.
+            refs = tya.fetch_product_refs()
+            total_productos = len(refs)
+            page, limit, total_pages, start_index, end_index = _paginar(total_productos, page, limit)
+            if cursor:
+                # El cursor se resuelve sobre los refs, sin cargar el snapshot
+                try:
+                    start_index = _inicio_cursor_refs(cursor, refs)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"[DEBUG] show_storefront_products: ERROR - Cursor inválido: {e}")
+                    return Error(code="400", message="Cursor de paginación inválido").to_dict(), 400
+                end_index = start_index + limit
+                page = start_index // limit + 1
+            productos_paginados = tya.fetch_products(refs[start_index:end_index])
+            all_genres = catalog_cache.get('genres')
+            all_artists = catalog_cache.get('artists')
+            # Sin versión: se reancla por producto, tanto sobre los refs como
+            # sobre el snapshot si TyA se degrada entre dos páginas
+            next_cursor = None
+            if end_index < total_productos:
+                next_cursor = _crear_cursor(None, "", refs[end_index - 1], end_index - 1)
+            cuerpo, faltan = _cuerpo_store(productos_paginados, page, limit, total_productos, total_pages,
+                                           all_genres, all_artists, covers, next_cursor)
+            datos = _serializar(cuerpo)
+            # Sin versión del catálogo: el ETag es la huella del cuerpo, así que
+            # un 304 ahorra la transferencia aunque no las llamadas a TyA
+            etag = "p" + hashlib.sha256(datos).hexdigest()[:31]
+            parcial = deadline.agotado() or faltan > 0
+            if _no_modificado(etag):
+                return Response(status=304, headers=_cabeceras_cache(etag, parcial=parcial))
+            return _respuesta_json(datos, etag, parcial=parcial)
 
-        # --- Mapear merch ---
-        for m in merch:
-            # Convertir strings a tipos correctos
-            artist_id = m.get("artistId")
-            if isinstance(artist_id, str):
-                artist_id = int(artist_id) if artist_id else 0
-            
-            collaborators = m.get("collaborators", [])
-            if collaborators and isinstance(collaborators[0], str):
-                collaborators = [int(col) for col in collaborators if col]
-            
-            price_str = m.get("price", "0")
-            if isinstance(price_str, str):
-                price_str = price_str.replace(",", ".")
-            price = float(price_str) if price_str else 0.0
-            
-            productos.append({
-                'songId': None,
-                'albumId': None,
-                'merchId': m.get("merchId"),
-                'name': m.get("title"),
-                'price': price,
-                'description': m.get("description"),
-                'artist': artist_id,
-                'colaborators': collaborators,
-                'releaseDate': f"{m.get('releaseDate')}T00:00:00Z" if m.get('releaseDate') else None,
-                'duration': None,
-                'genre': None,  # Merch no tiene género en TyA
-                'cover': m.get("cover"),
-                'songList': None
-            })
+        # --- Obtener catálogo desde la caché (snapshot de TyA) ---
+        # El snapshot se sirve desde memoria; si ha caducado se refresca en
+        # segundo plano sin hacer esperar a esta petición.
+        snapshot = catalog_cache.snapshot()
+        stale = catalog_cache.degradado()
+        parcial = not snapshot.completo
+        productos = snapshot.products
+        # Posiciones (en snapshot.products) que cumplen los filtros, ya ordenadas
+        posiciones = snapshot.indexes.buscar(**filtros) if consulta else range(len(productos))
+        total_productos = len(posiciones)
+        page, limit, total_pages, start_index, end_index = _paginar(total_productos, page, limit)
 
-        # --- Aplicar paginación ---
-        # Validar y ajustar parámetros de paginación
-        if page is None or page < 1:
-            page = 1
-        if limit is None or limit < 1:
-            limit = 20
-        if limit > 100:
-            limit = 100
-        
-        # Calcular metadata de paginación
-        total_productos = len(productos)
-        total_pages = (total_productos + limit - 1) // limit if total_productos > 0 else 1
-        
-        # Ajustar página si excede el total
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-        
-        # Calcular índices de slice para la página solicitada
-        start_index = (page - 1) * limit
-        end_index = start_index + limit
-        
-        # Aplicar paginación sobre la lista completa
-        productos_paginados = productos[start_index:end_index]
-        
-        # --- Obtener catálogos de géneros y artistas (para filtros del frontend) ---
-        all_genres = []
-        all_artists = []
-        
-        try:
-            # Obtener lista completa de géneros
-            genres_response = requests.get(
-                f"{TYA_SERVICE_URL}/genres",
-                timeout=5.0,
-                headers={"Accept": "application/json"}
-            )
-            if genres_response.ok:
-                all_genres = genres_response.json()
-        except requests.RequestException as e:
-            print(f"Error obteniendo géneros: {e}")
-        
-        try:
-            # Obtener IDs de artistas
-            artist_ids_response = requests.get(
-                f"{TYA_SERVICE_URL}/artist/filter",
-                timeout=5.0,
-                headers={"Accept": "application/json"}
+        if cursor:
+            try:
+                start_index = _inicio_cursor(cursor, snapshot, posiciones, sort, huella)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[DEBUG] show_storefront_products: ERROR - Cursor inválido: {e}")
+                return Error(code="400", message="Cursor de paginación inválido").to_dict(), 400
+            end_index = start_index + limit
+            page = start_index // limit + 1
+            etag = f"{snapshot.version}.@{start_index}.{limit}.{covers}"
+        else:
+            etag = f"{snapshot.version}.{page}.{limit}.{covers}"
+        if consulta:
+            etag += f".{huella}"
+        if _no_modificado(etag):
+            return Response(status=304, headers=_cabeceras_cache(etag, stale, parcial))
+
+        # La clave usa el inicio de la página: page y cursor comparten entradas
+        clave = (snapshot.version, start_index, limit, covers, consulta)
+        datos = paginas_cache.get(clave)
+        if datos is None:
+            next_cursor = None
+            if end_index < total_productos:
+                ultima = posiciones[end_index - 1]
+                next_cursor = _crear_cursor(snapshot.version, huella, tya.tipo_producto(productos[ultima]),
+                                            snapshot.indexes.rango_de(ultima, sort))
+            # Aplicar paginación sobre las posiciones y serializar una vez
+            cuerpo, faltan = _cuerpo_store(
+                [productos[i] for i in posiciones[start_index:end_index]],
+                page, limit, total_productos, total_pages,
+                snapshot.genres, snapshot.artists, covers, next_cursor
             )
-            if artist_ids_response.ok:
-                data = artist_ids_response.json()
-                artist_ids = []
-                if data and len(data) > 0:
-                    # Verificar si es lista de enteros o lista de objetos
-                    if isinstance(data[0], int):
-                        artist_ids = data
-                    elif isinstance(data[0], dict):
-                        artist_ids = [item.get("artistId") for item in data if item.get("artistId")]
-                
-                # Obtener detalles completos de artistas
-                if artist_ids:
-                    ids_str = ",".join(map(str, artist_ids))
-                    artists_response = requests.get(
-                        f"{TYA_SERVICE_URL}/artist/list",
-                        params={"ids": ids_str},
-                        timeout=5.0,
-                        headers={"Accept": "application/json"}
-                    )
-                    if artists_response.ok:
-                        all_artists = artists_response.json()
-        except requests.RequestException as e:
-            print(f"Error obteniendo artistas: {e}")
-        
-        # --- Retornar respuesta con datos paginados, metadata y catálogos ---
-        return {
-            "data": productos_paginados,
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": total_productos,
-                "totalPages": total_pages
-            },
-            "genres": all_genres,
-            "artists": all_artists
-        }, 200
+            datos = _serializar(cuerpo)
+            if faltan:
+                # Portadas que otro worker ha compactado: la página no se
+                # cachea y su ETag no es el de la página completa, para que
+                # el cliente no la conserve con 304 cuando vuelvan a estar
+                print(f"[DEBUG] show_storefront_products: Faltan {faltan} portadas en el almacén")
+                etag += ".incompleta"
+                parcial = True
+            else:
+                paginas_cache.set(clave, datos)
+        return _respuesta_json(datos, etag, stale, parcial)
 
     except Exception as e:
         print(f"[DEBUG] get_store_products: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         return Error(code="500", message=str(e)).to_dict(), 500
+
+
+def search_store_products(q, page=1, limit=20, covers="inline"):
+    """
+    Busca productos del catálogo por texto.
+
+    Busca en el nombre, la descripción y el nombre del artista de cada
+    producto, sin distinguir mayúsculas ni tildes. Todos los términos deben
+    aparecer (el último también como prefijo) y los resultados se ordenan por
+    relevancia: coincidencias en el nombre pesan más que en el artista, y
+    estas más que en la descripción.
+
+    Args:
+        q (str): Texto a buscar.
+        page (int, optional): Número de página (comienza en 1). Default: 1.
+        limit (int, optional): Productos por página (1-100). Default: 20.
+        covers (str, optional): "inline" o "url", como en /store. Default: "inline".
+
+    Returns:
+        Response|Tuple[Error, int]: Mismo sobre que /store sin los catálogos
+        de géneros y artistas:
+            {"data": [Product, ...], "pagination": {page, limit, total, totalPages}}
+
+    Performance:
+        El índice (catalog.search) se mantiene en memoria y se actualiza al
+        reconstruirse el snapshot, reindexando solo los productos que cambian.
+        Las páginas de resultados se guardan serializadas por versión del
+        catálogo y consulta normalizada.
+    """
+    try:
+        snapshot = catalog_cache.snapshot()
+        terminos = tuple(tokenizar(q))
+        claves = catalog_cache.search.buscar(q) if terminos else []
+        productos = [snapshot.index[clave] for clave in claves if clave in snapshot.index]
+        total_productos = len(productos)
+        page, limit, total_pages, start_index, end_index = _paginar(total_productos, page, limit)
+
+        clave = ("search", snapshot.version, terminos, page, limit, covers)
+        datos = paginas_cache.get(clave)
+        faltan = 0
+        if datos is None:
+            pagina, faltan = _con_covers(productos[start_index:end_index], covers)
+            datos = _serializar({
+                "data": pagina,
+                "pagination": {
+                    "page": page,
+                    "limit": limit,
+                    "total": total_productos,
+                    "totalPages": total_pages
+                }
+            })
+            if not faltan:
+                paginas_cache.set(clave, datos)
+        cabeceras = {"X-Catalog-Stale": "true"} if catalog_cache.degradado() else {}
+        if not snapshot.completo or faltan:
+            cabeceras[deadline.CABECERA_PARCIAL] = "true"
+        return Response(datos, status=200, mimetype="application/json", headers=cabeceras)
+
+    except Exception as e:
+        print(f"[DEBUG] search_store_products: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Error(code="500", message=str(e)).to_dict(), 500
+
+
+def show_product_cover(kind, product_id, v=None):
+    """
+    Retorna la portada de un producto del catálogo como imagen binaria.
+
+    La portada se localiza por su hash de contenido (`v`, que llevan todas las
+    URLs que generan /store?covers=url y /cart?covers=url) en cover_store, sin
+    consultar el catálogo: sirve igual en modo "paged" o para productos del
+    carrito que no están en el snapshot, y la imagen es siempre la de ese
+    hash. Sin `v` se recurre al último snapshot ya construido, sin cargarlo.
+    Se sirve con su tipo MIME, un ETag por contenido y Cache-Control de larga
+    duración. Si está en el almacén en disco, el cuerpo es un segmento del
+    fichero de blobs entregado a wsgi.file_wrapper, de modo que el servidor
+    puede usar sendfile.
+
+    Args:
+        kind (str): Tipo de producto: "song", "album" o "merch".
+        product_id (int): ID del producto en TyA.
+        v (str, optional): Hash del contenido de la portada.
+
+    Returns:
+        Response|Tuple[Error, int]:
+            - Response 200 con la imagen, o 304 si If-None-Match coincide
+            - (Error, 404): Hash desconocido, o producto inexistente o sin portada válida
+            - (Error, 500): Error interno del servidor
+    """
+    try:
+        if v:
+            cover = cover_store.por_hash(v)
+        else:
+            snapshot = catalog_cache.ultimo()
+            producto = snapshot.index.get((kind, product_id)) if snapshot is not None else None
+            ref = producto.get('cover') if producto else None
+            cover = cover_store.por_hash(ref.etag) if isinstance(ref, CoverRef) else None
+        if cover is None:
+            return Error(code="404", message="Portada no encontrada").to_dict(), 404
+
+        cabeceras = {
+            "ETag": f'"{cover.etag}"',
+            "Cache-Control": f"public, max-age={COVER_MAX_AGE}, immutable",
+        }
+        if _no_modificado(cover.etag):
+            return Response(status=304, headers=cabeceras)
+
+        cuerpo = cover_store.open(cover)
+        if cuerpo is None:
+            return Error(code="404", message="Portada no encontrada").to_dict(), 404
+        if isinstance(cuerpo, bytes):
+            return Response(cuerpo, status=200, mimetype=cover.mimetype, headers=cabeceras)
+        cabeceras["Content-Length"] = str(cover.size)
+        return Response(wrap_file(request.environ, cuerpo), status=200, mimetype=cover.mimetype,
+                        headers=cabeceras, direct_passthrough=True)
+
+    except Exception as e:
+        print(f"[DEBUG] show_product_cover: EXCEPCIÓN - {type(e).__name__}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Error(code="500", message=str(e)).to_dict(), 500
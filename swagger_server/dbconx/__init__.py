@@ -1,3 +1,3 @@
-from .db_connection import db_conectar, db_desconectar
+from .db_connection import db_conectar, db_desconectar, db_transaccion
 
-__all__ = ['db_conectar', 'db_desconectar']
+__all__ = ['db_conectar', 'db_desconectar', 'db_transaccion']
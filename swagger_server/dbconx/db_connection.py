@@ -1,34 +1,224 @@
+"""
+Conexión a la base de datos PostgreSQL de TPP mediante un pool de conexiones.
+
+En lugar de abrir una conexión nueva (handshake TCP + autenticación) en cada
+petición, las conexiones se toman prestadas de un pool compartido y se
+devuelven al terminar. La API pública se mantiene:
+
+    - db_conectar(): toma una conexión del pool (None si no hay BD disponible)
+    - db_desconectar(conexion): devuelve la conexión al pool
+    - db_transaccion(): context manager que toma una conexión, hace commit al
+      salir (rollback si hay excepción) y la devuelve al pool
+
+Características del pool:
+    - Thread-safe, con tamaño mínimo y máximo (TPP_DB_POOL_MIN / TPP_DB_POOL_MAX,
+      ver swagger_server.controllers.config)
+    - Si está agotado, espera hasta TPP_DB_POOL_TIMEOUT segundos por una conexión
+    - Health check al prestar: se descartan conexiones cerradas, las que superan
+      su tiempo de vida máximo (TPP_DB_MAX_LIFETIME) y las que llevan ociosas
+      más de TPP_DB_PING_IDLE segundos y no responden a un SELECT 1
+    - Al devolver, cualquier transacción pendiente se deshace (rollback)
+    - Se recrea tras un fork para no compartir sockets entre procesos
+
+Presupuesto por petición (swagger_server.deadline):
+    La espera por una conexión libre se recorta al tiempo que le queda a la
+    petición, y en la transacción se fija `SET LOCAL statement_timeout` con ese
+    mismo tiempo, de modo que ninguna consulta sobrepasa el presupuesto.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2 as DB
+from psycopg2 import pool as DBPool
 from psycopg2.extensions import connection
 from typing import Optional
 
-def db_conectar() -> Optional[connection]:
-    ip = "pgnweb.ddns.net"
-    puerto = 5432
-    basedatos = "pt"
+from swagger_server import deadline
+from swagger_server.controllers.config import (
+    DB_MAX_LIFETIME, DB_PING_IDLE, DB_POOL_MAX, DB_POOL_MIN, DB_POOL_TIMEOUT
+)
+
+IP = "pgnweb.ddns.net"
+PUERTO = 5432
+BASEDATOS = "pt"
+USUARIO = "pt_admin"
+CONTRASENA = "12345"
+
+
+class PoolConexiones(object):
+    """
+    Pool de conexiones thread-safe con espera acotada y health checks.
+
+    Envuelve psycopg2.pool.ThreadedConnectionPool añadiendo un semáforo para
+    que, con el pool agotado, los hilos esperen en lugar de fallar, y metadatos
+    por conexión (creación y último uso) para los health checks.
+    """
+
+    def __init__(self, minconn, maxconn, **parametros):
+        self._pool = DBPool.ThreadedConnectionPool(minconn, maxconn, **parametros)
+        self._disponibles = threading.BoundedSemaphore(maxconn)
+        self._maxconn = maxconn
+        self._creada = {}
+        self._ultimo_uso = {}
+        self.pid = os.getpid()
+
+    def _descartar(self, conexion):
+        self._creada.pop(id(conexion), None)
+        self._ultimo_uso.pop(id(conexion), None)
+        self._pool.putconn(conexion, close=True)
+
+    def _es_valida(self, conexion, ahora):
+        if conexion.closed:
+            return False
+        creada = self._creada.setdefault(id(conexion), ahora)
+        if ahora - creada > DB_MAX_LIFETIME:
+            return False
+        if ahora - self._ultimo_uso.get(id(conexion), ahora) > DB_PING_IDLE:
+            try:
+                cursor = conexion.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conexion.rollback()
+            except DB.Error:
+                return False
+        return True
+
+    def obtener(self, timeout=DB_POOL_TIMEOUT):
+        """
+        Toma una conexión sana del pool.
+
+        Returns:
+            connection|None: Conexión lista para usar, o None si no quedó
+            ninguna libre dentro del timeout.
+        """
+        if not self._disponibles.acquire(timeout=timeout):
+            print(f"Pool de conexiones agotado tras esperar {timeout}s")
+            return None
+        try:
+            # Como mucho se descartan todas las conexiones existentes
+            for _ in range(self._maxconn + 1):
+                conexion = self._pool.getconn()
+                ahora = time.monotonic()
+                if self._es_valida(conexion, ahora):
+                    conexion.autocommit = False
+                    self._ultimo_uso[id(conexion)] = ahora
+                    return conexion
+                self._descartar(conexion)
+            raise DB.OperationalError("No se pudo obtener una conexión válida del pool")
+        except Exception:
+            self._disponibles.release()
+            raise
+
+    def devolver(self, conexion):
+        """Devuelve una conexión al pool (deshaciendo transacciones pendientes)."""
+        try:
+            if conexion.closed:
+                self._descartar(conexion)
+            else:
+                self._ultimo_uso[id(conexion)] = time.monotonic()
+                self._pool.putconn(conexion)
+        finally:
+            self._disponibles.release()
 
-    usuario = "pt_admin"
-    contrasena = "12345"
+    def cerrar(self):
+        self._pool.closeall()
 
-    print("---db_conectar---")
-    print("---Conectando a Postgresql---")
 
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            print("---Creando pool de conexiones a Postgresql---")
+            _pool = PoolConexiones(
+                DB_POOL_MIN, DB_POOL_MAX,
+                user=USUARIO, password=CONTRASENA, host=IP, port=PUERTO, database=BASEDATOS
+            )
+        return _pool
+
+
+def _limitar_consultas(conexion):
+    """Fija statement_timeout al presupuesto restante (hasta el fin de la transacción)."""
+    queda = deadline.restante()
+    if queda is None:
+        return
+    cursor = conexion.cursor()
+    cursor.execute("SET LOCAL statement_timeout = %s", (max(1, int(queda * 1000)),))
+    cursor.close()
+
+
+def db_conectar() -> Optional[connection]:
+    """
+    Toma una conexión del pool.
+
+    Si la petición tiene presupuesto de tiempo, la espera por el pool y las
+    consultas de la primera transacción quedan acotadas por lo que le queda.
+
+    Returns:
+        connection|None: Conexión con autocommit desactivado, o None si la base
+        de datos no está disponible, el pool sigue agotado tras el timeout o
+        el presupuesto de la petición se ha agotado.
+    """
+    if deadline.agotado():
+        print("Presupuesto de la petición agotado antes de conectar a la base de datos")
+        return None
     try:
-        conexion = DB.connect(user=usuario, password=contrasena, host=ip, port=puerto, database=basedatos)
-        conexion.autocommit = False
-        print("Conexión realizada a la base de datos", conexion)
+        pool = _obtener_pool()
+        conexion = pool.obtener(timeout=deadline.timeout(DB_POOL_TIMEOUT))
+        if conexion is not None:
+            try:
+                _limitar_consultas(conexion)
+            except DB.Error:
+                pool.devolver(conexion)
+                raise
         return conexion
-    except DB.DatabaseError as error:
+    except (DB.DatabaseError, DBPool.PoolError) as error:
         print("Error en la conexión")
         print(error)
         return None
 
+
 def db_desconectar(conexion):
-    print("---db_desconectar---")
+    """Devuelve al pool una conexión obtenida con db_conectar()."""
     try:
-        conexion.close()
-        print("Desconexión realizada correctamente")
+        _obtener_pool().devolver(conexion)
         return True
-    except DB.DatabaseError as error:
+    except (DB.DatabaseError, DBPool.PoolError) as error:
         print("Error en la desconexión")
-        print(error)
\ No newline at end of file
+        print(error)
+        return False
+
+
+@contextmanager
+def db_transaccion():
+    """
+    Context manager sobre una conexión del pool.
+
+    Hace commit si el bloque termina sin errores y rollback si lanza una
+    excepción; en ambos casos la conexión vuelve al pool. Si no hay conexión
+    disponible se entrega None.
+
+    Examples:
+        >>> with db_transaccion() as conexion:
+        ...     if conexion is None:
+        ...         return Error(code="503", ...).to_dict(), 503
+        ...     cursor = conexion.cursor()
+    """
+    conexion = db_conectar()
+    try:
+        yield conexion
+        if conexion is not None:
+            conexion.commit()
+    except Exception:
+        if conexion is not None:
+            conexion.rollback()
+        raise
+    finally:
+        if conexion is not None:
+            db_desconectar(conexion)
@@ -0,0 +1,135 @@
+"""
+Presupuesto de tiempo (deadline) por petición.
+
+Cada llamada saliente tiene su propio timeout (TyA, SYU, Postgres), pero una
+petición puede encadenar varias y su duración total no estaba acotada. Al
+entrar una petición en la aplicación se fija un instante límite según su
+operación; a partir de ahí:
+
+    - http_get (httpconx) usa como timeout el mínimo entre el suyo y el
+      tiempo restante, y no envía la petición si el presupuesto se agotó
+    - db_conectar (dbconx) espera al pool como mucho el tiempo restante y fija
+      `SET LOCAL statement_timeout` en la transacción
+    - Los controladores esperan a las tareas en paralelo como mucho el tiempo
+      restante y, si se agota, responden con lo que tengan marcando la
+      respuesta con la cabecera `X-Partial-Response: true`
+
+El límite se guarda en un threading.local. Las tareas que se lanzan en otro
+hilo (pool de TyA) lo heredan si se envuelven con propagar().
+
+Configuración (swagger_server.controllers.config):
+    - REQUEST_DEADLINE: presupuesto por defecto (segundos, 0 = sin límite)
+    - REQUEST_DEADLINES: presupuesto por operación (nombre de la función del
+      controlador), p. ej. TPP_REQUEST_DEADLINES="get_cart_products=3"
+"""
+
+import functools
+import threading
+import time
+from concurrent import futures
+
+from flask import request
+
+from swagger_server.controllers.config import REQUEST_DEADLINE, REQUEST_DEADLINES
+
+CABECERA_PARCIAL = "X-Partial-Response"
+
+_local = threading.local()
+
+
+def iniciar(segundos):
+    """Fija el límite del hilo actual a `segundos` desde ahora (<= 0 lo desactiva)."""
+    _local.limite = time.monotonic() + segundos if segundos and segundos > 0 else None
+
+
+def terminar():
+    """Quita el límite del hilo actual."""
+    _local.limite = None
+
+
+def restante():
+    """Segundos que quedan de presupuesto (0 si se agotó), o None si no hay límite."""
+    limite = getattr(_local, "limite", None)
+    if limite is None:
+        return None
+    return max(0.0, limite - time.monotonic())
+
+
+def agotado():
+    """True si hay límite y ya se ha alcanzado."""
+    return restante() == 0.0
+
+
+def timeout(maximo):
+    """
+    Timeout para una operación: `maximo` recortado al tiempo restante.
+
+    Con el presupuesto agotado retorna 0; el llamante debe comprobar
+    agotado() antes de usarlo con librerías que no admiten 0.
+    """
+    queda = restante()
+    if queda is None:
+        return maximo
+    return queda if maximo is None else min(maximo, queda)
+
+
+def propagar(fn):
+    """
+    Envuelve `fn` para que, al ejecutarse en otro hilo, use el mismo límite
+    que el hilo que la envuelve.
+
+    Examples:
+        >>> executor.submit(deadline.propagar(tya.fetch_list), "song", ids)
+    """
+    limite = getattr(_local, "limite", None)
+
+    @functools.wraps(fn)
+    def envoltorio(*args, **kwargs):
+        anterior = getattr(_local, "limite", None)
+        _local.limite = limite
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.limite = anterior
+
+    return envoltorio
+
+
+def resultado(futuro, defecto=None):
+    """
+    Resultado de `futuro` esperando como mucho el tiempo restante.
+
+    Returns:
+        El resultado de la tarea, o `defecto` si el presupuesto se agota antes.
+    """
+    try:
+        return futuro.result(timeout=restante())
+    except futures.TimeoutError:
+        return defecto
+
+
+def presupuesto(endpoint):
+    """
+    Presupuesto (segundos) de la operación a la que corresponde `endpoint`.
+
+    Connexion registra cada operación con el endpoint de Flask
+    "swagger_server_controllers_<modulo>_controller_<funcion>".
+    """
+    operacion = (endpoint or "").rsplit("_controller_", 1)[-1]
+    return REQUEST_DEADLINES.get(operacion, REQUEST_DEADLINE)
+
+
+def instalar(app):
+    """
+    Registra en la aplicación Flask el inicio del presupuesto al entrar cada
+    petición (antes de la autenticación) y su limpieza al terminar.
+    """
+    @app.before_request
+    def _iniciar_deadline():
+        iniciar(presupuesto(request.endpoint))
+
+    @app.teardown_request
+    def _terminar_deadline(_error=None):
+        terminar()
+
+    return app
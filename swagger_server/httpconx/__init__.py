@@ -0,0 +1,6 @@
+from .circuit_breaker import CircuitBreaker, CircuitoAbierto
+from .http_client import circuito, circuito_abierto, http_get, reiniciar_circuitos
+from .resiliencia import Contadores, Latencias, Politica
+
+__all__ = ['CircuitBreaker', 'CircuitoAbierto', 'Contadores', 'Latencias', 'Politica', 'circuito',
+           'circuito_abierto', 'http_get', 'reiniciar_circuitos']
@@ -0,0 +1,159 @@
+"""
+Circuit breaker por endpoint para las llamadas a otros microservicios.
+
+Cuando un servicio (p. ej. TyA) está caído o muy lento, cada petición que lo
+llama espera su timeout completo y los hilos del servidor se acumulan. El
+circuit breaker observa las últimas llamadas a cada endpoint y, si la tasa de
+errores o la de llamadas lentas supera su umbral, "abre el circuito": durante
+un tiempo las llamadas fallan al instante (CircuitoAbierto) sin tocar la red,
+y el llamante sirve su último dato bueno.
+
+Estados:
+    - cerrado: las llamadas pasan y se registra su resultado
+    - abierto: las llamadas se rechazan hasta que pasa `tiempo_abierto`
+    - semiabierto: se deja pasar una única llamada de prueba; si va bien el
+      circuito se cierra (y se olvida el historial), si falla vuelve a abrirse
+
+Cada llamada permitida recibe un ticket de permitir() que entrega después a
+registrar(). Así el resultado de una llamada lenta admitida antes de abrirse
+el circuito no se confunde con el de la prueba, y una llamada que se cortó por
+motivos ajenos al servicio puede registrarse como neutra (exito=None).
+
+Configuración (swagger_server.controllers.config): TYA_CB_*.
+"""
+
+import threading
+import time
+from collections import deque
+
+import requests
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbierto(requests.RequestException):
+    """La llamada se ha rechazado sin enviarla porque el circuito está abierto."""
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker con ventana deslizante de las últimas llamadas.
+
+    Args:
+        nombre (str): Endpoint protegido (solo para los logs).
+        tasa_errores (float): Fracción de errores (0-1) que abre el circuito.
+        tasa_lentas (float): Fracción de llamadas lentas (0-1) que abre el circuito.
+        umbral_lenta (float): Segundos a partir de los que una llamada es lenta.
+        ventana (int): Número de llamadas recientes que se tienen en cuenta.
+        minimo (int): Llamadas mínimas en la ventana antes de poder abrir.
+        tiempo_abierto (float): Segundos que el circuito permanece abierto
+            antes de dejar pasar una llamada de prueba.
+    """
+
+    def __init__(self, nombre, tasa_errores=0.5, tasa_lentas=0.5, umbral_lenta=2.0,
+                 ventana=20, minimo=5, tiempo_abierto=30.0):
+        self.nombre = nombre
+        self.tasa_errores = tasa_errores
+        self.tasa_lentas = tasa_lentas
+        self.umbral_lenta = umbral_lenta
+        self.minimo = minimo
+        self.tiempo_abierto = tiempo_abierto
+        self._lock = threading.Lock()
+        self._llamadas = deque(maxlen=ventana)  # (error, lenta)
+        self._estado = CERRADO
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        # Cambia al abrir o cerrar el circuito; los tickets de un ciclo
+        # anterior se ignoran al registrar
+        self._ciclo = 0
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.tiempo_abierto:
+                return SEMIABIERTO
+            return self._estado
+
+    def permitir(self):
+        """
+        Indica si una llamada puede enviarse.
+
+        En estado semiabierto solo se permite una llamada de prueba a la vez.
+
+        Returns:
+            tuple: Ticket (ciclo, es_prueba) que se entrega a registrar() con
+                el resultado, o None si la llamada no puede enviarse.
+        """
+        with self._lock:
+            if self._estado == CERRADO:
+                return (self._ciclo, False)
+            if self._estado == ABIERTO:
+                if time.monotonic() - self._abierto_desde < self.tiempo_abierto:
+                    return None
+                self._estado = SEMIABIERTO
+            if self._prueba_en_curso:
+                return None
+            self._prueba_en_curso = True
+            return (self._ciclo, True)
+
+    def _abrir(self):
+        self._estado = ABIERTO
+        self._abierto_desde = time.monotonic()
+        self._ciclo += 1
+        print(f"[DEBUG] circuit_breaker: Circuito '{self.nombre}' abierto durante {self.tiempo_abierto}s")
+
+    def registrar(self, ticket, exito, duracion=0.0):
+        """
+        Registra el resultado de una llamada permitida.
+
+        Solo cuenta si el ticket es del ciclo actual del circuito; en estado
+        semiabierto, además, solo cuenta el de la llamada de prueba.
+
+        Args:
+            ticket (tuple): Valor que retornó permitir() para esta llamada.
+            exito (bool): False si la llamada falló (conexión, timeout o 5xx);
+                None si no dice nada del servicio (p. ej. se cortó porque se
+                agotaba el presupuesto de la petición).
+            duracion (float): Segundos que tardó la llamada.
+        """
+        ciclo, prueba = ticket
+        lenta = duracion >= self.umbral_lenta
+        with self._lock:
+            if ciclo != self._ciclo:
+                return
+            if self._estado == SEMIABIERTO:
+                if not prueba:
+                    return
+                self._prueba_en_curso = False
+                if exito is None:
+                    # Sin veredicto: la siguiente llamada hará de prueba
+                    return
+                if exito and not lenta:
+                    self._estado = CERRADO
+                    self._llamadas.clear()
+                    self._ciclo += 1
+                    print(f"[DEBUG] circuit_breaker: Circuito '{self.nombre}' cerrado tras la prueba")
+                else:
+                    self._abrir()
+                return
+            if self._estado == ABIERTO or exito is None:
+                return
+
+            self._llamadas.append((not exito, lenta))
+            total = len(self._llamadas)
+            if total < self.minimo:
+                return
+            errores = sum(1 for error, _ in self._llamadas if error)
+            lentas = sum(1 for _, es_lenta in self._llamadas if es_lenta)
+            if errores >= self.tasa_errores * total or lentas >= self.tasa_lentas * total:
+                self._abrir()
+
+    def reiniciar(self):
+        """Vuelve al estado cerrado sin historial."""
+        with self._lock:
+            self._estado = CERRADO
+            self._llamadas.clear()
+            self._prueba_en_curso = False
+            self._ciclo += 1
@@ -0,0 +1,154 @@
+"""
+Cliente HTTP compartido para las llamadas a otros microservicios.
+
+Todas las peticiones salientes (TyA y SYU) pasan por una única
+requests.Session con un HTTPAdapter dimensionado, de modo que las conexiones
+TCP se reutilizan (keep-alive) en lugar de abrir y cerrar una por petición.
+
+Configuración (swagger_server.controllers.config):
+    - HTTP_POOL_MAXSIZE: conexiones reutilizables por host
+    - HTTP_POOL_CONNECTIONS: número de hosts con pool propio
+    - HTTP_CONNECT_TIMEOUT: timeout de conexión común a todas las peticiones
+    - TYA_TIMEOUT, TYA_ITEM_TIMEOUT, AUTH_TIMEOUT: timeouts de lectura por servicio
+    - TYA_CB_*: umbrales de los circuit breakers
+
+Circuit breakers:
+    Si el llamante indica `circuito` (p. ej. "/song/list"), la petición pasa
+    por el CircuitBreaker de ese endpoint: con el circuito abierto se lanza
+    CircuitoAbierto (una RequestException) sin enviarla, y los errores de
+    conexión, timeouts, respuestas 5xx y llamadas lentas cuentan para abrirlo.
+    Un timeout que salta porque el presupuesto de la petición lo había
+    recortado no dice nada del servicio y se registra como neutro.
+
+Presupuesto por petición:
+    El timeout de lectura se recorta al tiempo que le queda a la petición en
+    curso (swagger_server.deadline). Si ya no queda, se lanza
+    requests.Timeout sin enviar nada ni contarlo en el circuit breaker.
+
+Seguridad:
+    La sesión no guarda cookies: cada petición lleva solo las cabeceras que
+    indica el llamante (p. ej. la cookie oversound_auth del usuario), así una
+    cookie recibida en una respuesta nunca se reenvía en nombre de otro usuario.
+"""
+
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from swagger_server import deadline
+
+from swagger_server.controllers.config import (
+    HTTP_POOL_MAXSIZE, HTTP_POOL_CONNECTIONS, HTTP_CONNECT_TIMEOUT, TYA_TIMEOUT,
+    TYA_CB_ERROR_RATE, TYA_CB_SLOW_RATE, TYA_CB_SLOW_SECONDS, TYA_CB_WINDOW, TYA_CB_MIN_CALLS,
+    TYA_CB_OPEN_SECONDS
+)
+from swagger_server.httpconx.circuit_breaker import ABIERTO, CircuitBreaker, CircuitoAbierto
+
+
+def _crear_sesion():
+    sesion = requests.Session()
+    # Ninguna cookie se almacena ni se envía automáticamente
+    sesion.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=0
+    )
+    sesion.mount("http://", adapter)
+    sesion.mount("https://", adapter)
+    return sesion
+
+
+_sesion = _crear_sesion()
+
+_circuitos = {}
+_circuitos_lock = threading.Lock()
+
+
+def circuito(nombre):
+    """Retorna (creándolo si no existe) el CircuitBreaker del endpoint `nombre`."""
+    with _circuitos_lock:
+        breaker = _circuitos.get(nombre)
+        if breaker is None:
+            breaker = _circuitos[nombre] = CircuitBreaker(
+                nombre,
+                tasa_errores=TYA_CB_ERROR_RATE,
+                tasa_lentas=TYA_CB_SLOW_RATE,
+                umbral_lenta=TYA_CB_SLOW_SECONDS,
+                ventana=TYA_CB_WINDOW,
+                minimo=TYA_CB_MIN_CALLS,
+                tiempo_abierto=TYA_CB_OPEN_SECONDS
+            )
+        return breaker
+
+
+def circuito_abierto(nombre):
+    """True si el circuito del endpoint `nombre` está abierto (rechazando llamadas)."""
+    breaker = _circuitos.get(nombre)
+    return breaker is not None and breaker.estado == ABIERTO
+
+
+def reiniciar_circuitos():
+    """Cierra todos los circuitos y olvida su historial."""
+    with _circuitos_lock:
+        for breaker in _circuitos.values():
+            breaker.reiniciar()
+
+
+def http_get(url, params=None, headers=None, timeout=None, circuito_nombre=None):
+    """
+    Realiza un GET usando el pool de conexiones compartido.
+
+    Args:
+        url (str): URL completa del recurso.
+        params (dict, optional): Parámetros de query string.
+        headers (dict, optional): Cabeceras de la petición.
+        timeout (float, optional): Timeout de lectura en segundos. Por defecto
+            TYA_TIMEOUT. Nunca supera el presupuesto restante de la petición.
+        circuito_nombre (str, optional): Endpoint cuyo circuit breaker protege
+            la llamada. None = sin circuit breaker.
+
+    Returns:
+        requests.Response: Respuesta del servidor.
+
+    Raises:
+        CircuitoAbierto: El circuito del endpoint está abierto.
+        requests.Timeout: El presupuesto de la petición se ha agotado.
+        requests.RequestException: Error de conexión o timeout.
+    """
+    if deadline.agotado():
+        raise requests.Timeout(f"Presupuesto de la petición agotado antes de llamar a {url}")
+    maximo = TYA_TIMEOUT if timeout is None else timeout
+    read_timeout = deadline.timeout(maximo)
+    connect_timeout = min(HTTP_CONNECT_TIMEOUT, read_timeout)
+    breaker = circuito(circuito_nombre) if circuito_nombre else None
+    ticket = breaker.permitir() if breaker is not None else None
+    if breaker is not None and ticket is None:
+        raise CircuitoAbierto(f"Circuito abierto para {circuito_nombre}")
+
+    inicio = time.monotonic()
+    exito = False
+    try:
+        response = _sesion.get(
+            url,
+            params=params,
+            headers=headers,
+            timeout=(connect_timeout, read_timeout)
+        )
+        exito = response.status_code < 500
+        return response
+    except requests.ConnectTimeout:
+        if connect_timeout < HTTP_CONNECT_TIMEOUT:
+            # Cortada por el presupuesto de la petición, no por el servicio
+            exito = None
+        raise
+    except requests.Timeout:
+        if read_timeout < maximo:
+            exito = None
+        raise
+    finally:
+        if breaker is not None:
+            breaker.registrar(ticket, exito, time.monotonic() - inicio)
@@ -0,0 +1,94 @@
+"""
+Piezas para peticiones resilientes: latencias observadas, reintentos con
+backoff y contadores por endpoint.
+
+Las usa el cliente de TyA (swagger_server.catalog.tya) para:
+
+    - Hedged requests: si una petición no ha respondido cuando ya ha pasado
+      el p95 de latencia observado para su endpoint, se lanza un duplicado y
+      se usa la primera respuesta que llegue.
+    - Reintentos de GETs idempotentes ante errores de conexión o 502/503/504,
+      con backoff exponencial acotado y jitter completo (espera aleatoria entre
+      0 y el backoff) para que los clientes no reintenten todos a la vez.
+
+Los contadores permiten ver cuánto cuestan: peticiones, reintentos, hedges
+enviados y hedges que ganaron.
+"""
+
+import random
+import threading
+from collections import Counter, deque
+
+
+class Politica(object):
+    """
+    Política de un endpoint.
+
+    Args:
+        hedge (bool): Si se envía una petición duplicada al superar el p95.
+        reintentos (int): Reintentos como mucho tras el primer intento.
+    """
+
+    __slots__ = ('hedge', 'reintentos')
+
+    def __init__(self, hedge=False, reintentos=0):
+        self.hedge = hedge
+        self.reintentos = reintentos
+
+
+class Latencias(object):
+    """
+    Latencias recientes de un endpoint (ventana deslizante) y sus percentiles.
+
+    Args:
+        ventana (int): Número de muestras recientes que se conservan.
+        minimo (int): Muestras necesarias antes de dar un percentil.
+    """
+
+    def __init__(self, ventana=200, minimo=20):
+        self.minimo = minimo
+        self._muestras = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._lock:
+            self._muestras.append(segundos)
+
+    def percentil(self, p):
+        """Percentil `p` (0-1) de las muestras, o None si aún no hay bastantes."""
+        with self._lock:
+            if len(self._muestras) < self.minimo:
+                return None
+            ordenadas = sorted(self._muestras)
+        return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+
+class Contadores(object):
+    """Contadores thread-safe por endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+
+    def incrementar(self, endpoint, nombre, cantidad=1):
+        with self._lock:
+            self._contadores.setdefault(endpoint, Counter())[nombre] += cantidad
+
+    def como_dict(self):
+        """Copia {endpoint: {contador: valor}} para métricas o logs."""
+        with self._lock:
+            return {endpoint: dict(contadores) for endpoint, contadores in self._contadores.items()}
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+
+
+def espera_reintento(intento, base, tope):
+    """
+    Segundos a esperar antes del reintento número `intento` (desde 1).
+
+    Backoff exponencial (base * 2^(intento-1)) acotado a `tope`, con jitter
+    completo: un valor aleatorio uniforme entre 0 y ese backoff.
+    """
+    return random.uniform(0, min(tope, base * (2 ** (intento - 1))))
@@ -71,6 +71,8 @@ class Product(Model):
         genre (str, optional): Género musical o "Merch" para merchandising.
         cover (str): Imagen de portada codificada en base64. Requerido.
         song_list (List[int], optional): Lista de IDs de canciones (solo álbumes).
+        cover_url (str, optional): URL de la portada en GET /store/cover (solo
+            si el cliente la pide con covers=url; entonces cover va vacío).
     
     JSON Mapping:
         - song_id ↔ songId
@@ -78,6 +80,7 @@ class Product(Model):
         - merch_id ↔ merchId
         - release_date ↔ releaseDate
         - song_list ↔ songList
+        - cover_url ↔ coverUrl
         - (otros campos mantienen el mismo nombre)
     
     Examples:
@@ -133,7 +136,7 @@ class Product(Model):
         Los tipos en colaborators y song_list están definidos como List[int]
         pero en la práctica se almacenan como strings en algunas operaciones.
     """
-    def __init__(self, song_id: int=None, album_id: int=None, merch_id: int=None, name: str=None, price: float=None, description: str=None, artist: int=None, colaborators: List[int]=None, release_date: datetime=None, duration: int=None, genre: int=None, cover: str=None, song_list: List[int]=None):  # noqa: E501
+    def __init__(self, song_id: int=None, album_id: int=None, merch_id: int=None, name: str=None, price: float=None, description: str=None, artist: int=None, colaborators: List[int]=None, release_date: datetime=None, duration: int=None, genre: int=None, cover: str=None, song_list: List[int]=None, cover_url: str=None):  # noqa: E501
         """
         Constructor del modelo Product.
         
@@ -154,6 +157,7 @@ class Product(Model):
             genre (int, optional): ID del género musical.
             cover (str): Portada en formato base64.
             song_list (List[int], optional): Lista de IDs de canciones (solo álbumes).
+            cover_url (str, optional): URL de la portada servida por GET /store/cover.
         
         Note:
             Para crear un producto válido, debe tener al menos uno de:
@@ -172,7 +176,8 @@ class Product(Model):
             'duration': int,
             'genre': int,
             'cover': str,
-            'song_list': List[int]
+            'song_list': List[int],
+            'cover_url': str
         }
 
         self.attribute_map = {
@@ -188,7 +193,8 @@ class Product(Model):
             'duration': 'duration',
             'genre': 'genre',
             'cover': 'cover',
-            'song_list': 'songList'
+            'song_list': 'songList',
+            'cover_url': 'coverUrl'
         }
         self._song_id = song_id
         self._album_id = album_id
@@ -203,6 +209,7 @@ class Product(Model):
         self._genre = genre
         self._cover = cover
         self._song_list = song_list
+        self._cover_url = cover_url
 
     @classmethod
     def from_dict(cls, dikt) -> 'Product':
@@ -533,3 +540,26 @@ class Product(Model):
         """
 
         self._song_list = song_list
+
+    @property
+    def cover_url(self) -> str:
+        """Gets the cover_url of this Product.
+
+        URL of the cover image served by GET /store/cover  # noqa: E501
+
+        :return: The cover_url of this Product.
+        :rtype: str
+        """
+        return self._cover_url
+
+    @cover_url.setter
+    def cover_url(self, cover_url: str):
+        """Sets the cover_url of this Product.
+
+        URL of the cover image served by GET /store/cover  # noqa: E501
+
+        :param cover_url: The cover_url of this Product.
+        :type cover_url: str
+        """
+
+        self._cover_url = cover_url
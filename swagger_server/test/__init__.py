@@ -5,6 +5,8 @@ import connexion
 from flask_testing import TestCase
 from unittest.mock import patch, MagicMock
 
+from swagger_server import deadline
+from swagger_server.controllers.authorization_controller import token_cache, tokens_rechazados
 from swagger_server.encoder import JSONEncoder
 
 
@@ -18,8 +20,12 @@ class BaseTestCase(TestCase):
         app = connexion.App(__name__, specification_dir='../swagger/')
         app.app.json_encoder = JSONEncoder
         app.add_api('swagger.yaml', validate_responses=False)
+        deadline.instalar(app.app)
         return app.app
     
     def tearDown(self):
         # Desactivar modo testing al terminar
         os.environ.pop('TESTING', None)
+        # Evitar que un token validado en un test se reutilice en el siguiente
+        token_cache.clear()
+        tokens_rechazados.clear()
@@ -0,0 +1,151 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+import os
+os.environ['TESTING'] = 'true'  # Activar modo test antes de importar
+
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from swagger_server.controllers import authorization_controller
+from swagger_server.controllers.authorization_controller import (
+    check_oversound_auth, token_cache, tokens_rechazados
+)
+from swagger_server.test import BaseTestCase
+
+
+class TestAuthorizationController(BaseTestCase):
+    """AuthorizationController unit tests"""
+
+    def setUp(self):
+        token_cache.clear()
+        tokens_rechazados.clear()
+
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_check_oversound_auth_cached(self, mock_valid):
+        """Test case for check_oversound_auth con caché de tokens
+
+        Verifica que un token válido solo se consulta a SYU una vez y que la
+        caché no guarda el token en claro.
+        """
+        mock_valid.return_value = {'userId': 1, 'scopes': ['read:cart']}
+
+        for _ in range(3):
+            self.assertEqual(check_oversound_auth('token_abc', None)['userId'], 1)
+
+        self.assertEqual(mock_valid.call_count, 1)
+        self.assertEqual(token_cache.hits, 2)
+        self.assertNotIn('token_abc', token_cache._datos)
+
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_check_oversound_auth_expired(self, mock_valid):
+        """Test case for check_oversound_auth con token caducado
+
+        Verifica que un token cuyo `exp` ya pasó no se cachea.
+        """
+        mock_valid.return_value = {'userId': 1, 'scopes': [], 'exp': 1}
+
+        check_oversound_auth('token_exp', None)
+        check_oversound_auth('token_exp', None)
+
+        self.assertEqual(mock_valid.call_count, 2)
+
+
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_check_oversound_auth_rejected(self, mock_valid):
+        """Test case for check_oversound_auth con token rechazado
+
+        Verifica que un token rechazado por SYU se responde localmente en los
+        reintentos, pero un fallo de conexión no se cachea.
+        """
+        mock_valid.return_value = False
+        for _ in range(3):
+            self.assertIsNone(check_oversound_auth('token_malo', None))
+        self.assertEqual(mock_valid.call_count, 1)
+
+        mock_valid.return_value = None
+        check_oversound_auth('token_sin_syu', None)
+        check_oversound_auth('token_sin_syu', None)
+        self.assertEqual(mock_valid.call_count, 3)
+
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_check_oversound_auth_single_flight(self, mock_valid):
+        """Test case for check_oversound_auth con peticiones simultáneas
+
+        Verifica que varias validaciones concurrentes del mismo token
+        comparten una única llamada a SYU.
+        """
+        barrera = threading.Barrier(4)
+
+        def validar_lento(token):
+            time.sleep(0.2)
+            return {'userId': 1, 'scopes': []}
+        mock_valid.side_effect = validar_lento
+
+        def validar(_):
+            barrera.wait()
+            return check_oversound_auth('token_abc', None)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            resultados = list(pool.map(validar, range(4)))
+
+        self.assertTrue(all(r['userId'] == 1 for r in resultados))
+        self.assertEqual(mock_valid.call_count, 1)
+
+
+    @unittest.skipIf(authorization_controller.jwt is None, "PyJWT no instalado")
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    @patch('swagger_server.controllers.authorization_controller.AUTH_JWT_ALGORITHMS', ['HS256'])
+    @patch('swagger_server.controllers.authorization_controller._cargar_claves_jwt')
+    def test_check_oversound_auth_jwt_local(self, mock_claves, mock_valid):
+        """Test case for check_oversound_auth con verificación JWT local
+
+        Verifica que un JWT firmado con la clave configurada se valida sin
+        llamar a SYU, que uno caducado se rechaza y que un token opaco sigue
+        validándose en SYU.
+        """
+        jwt = authorization_controller.jwt
+        mock_claves.return_value = {None: 'clave-de-pruebas-de-al-menos-32-bytes'}
+        mock_valid.return_value = {'userId': 2, 'scopes': []}
+
+        token = jwt.encode({'sub': '7', 'scope': 'read:cart write:cart', 'exp': int(time.time()) + 600},
+                           'clave-de-pruebas-de-al-menos-32-bytes', algorithm='HS256')
+        user_info = check_oversound_auth(token, ['read:cart'])
+        self.assertEqual(user_info['userId'], 7)
+        self.assertEqual(user_info['scopes'], ['read:cart', 'write:cart'])
+
+        caducado = jwt.encode({'sub': '7', 'exp': int(time.time()) - 600},
+                              'clave-de-pruebas-de-al-menos-32-bytes', algorithm='HS256')
+        self.assertIsNone(check_oversound_auth(caducado, None))
+        mock_valid.assert_not_called()
+
+        self.assertEqual(check_oversound_auth('token_opaco', None)['userId'], 2)
+        mock_valid.assert_called_once_with('token_opaco')
+
+
+    @unittest.skipIf(authorization_controller.jwt is None, "PyJWT no instalado")
+    def test_cargar_claves_jwt_malformed(self):
+        """Test case para un fichero JWKS mal formado
+
+        Verifica que el error no se propaga (no hay 500 en cada petición) y
+        que el fallo se recuerda en lugar de releer el fichero.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            f.write('{"keys": [no es json')
+        self.addCleanup(os.unlink, f.name)
+
+        with patch.object(authorization_controller, 'AUTH_JWKS_FILE', f.name), \
+                patch.object(authorization_controller, '_claves_jwt', None), \
+                patch('builtins.open', wraps=open) as mock_open:
+            self.assertEqual(authorization_controller._cargar_claves_jwt(), {})
+            self.assertEqual(authorization_controller._cargar_claves_jwt(), {})
+            self.assertEqual(mock_open.call_count, 1)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -4,7 +4,7 @@ from __future__ import absolute_import
 import os
 os.environ['TESTING'] = 'true'  # Activar modo test antes de importar
 
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 from flask import json
 from six import BytesIO
@@ -12,13 +12,20 @@ from six import BytesIO
 from swagger_server.models.cart_body import CartBody  # noqa: E501
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.product import Product  # noqa: E501
+from swagger_server.catalog import catalog_cache
 from swagger_server.test import BaseTestCase
 
 
 class TestCartController(BaseTestCase):
     """CartController integration test stubs"""
 
-    @patch('swagger_server.controllers.cart_controller.db_conectar')
+    def setUp(self):
+        # db_transaccion devuelve la conexión al pool real: evitarlo en los tests
+        patcher = patch('swagger_server.dbconx.db_connection.db_desconectar')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_add_to_cart(self, mock_db):
         """Test case for add_to_cart
         
@@ -44,7 +51,7 @@ class TestCartController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
-    @patch('swagger_server.controllers.cart_controller.db_conectar')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_get_cart_products(self, mock_db):
         """Test case for get_cart_products
         
@@ -65,7 +72,7 @@ class TestCartController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
-    @patch('swagger_server.controllers.cart_controller.db_conectar')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_remove_from_cart(self, mock_db):
         """Test case for remove_from_cart
         
@@ -87,6 +94,119 @@ class TestCartController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_add_to_cart_duplicate(self, mock_auth, mock_db):
+        """Test case for add_to_cart con un producto ya presente
+
+        Verifica que el alta es un único INSERT ... WHERE NOT EXISTS y que si
+        no inserta ninguna fila se responde 400.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['write:cart']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.rowcount = 0
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/cart', method='POST', data=json.dumps({'albumId': 4}),
+                                    content_type='application/json')
+
+        self.assert400(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+        sql, params = mock_cursor.execute.call_args[0]
+        self.assertIn('WHERE NOT EXISTS', sql)
+        self.assertNotIn('ON CONFLICT', sql)
+        self.assertEqual(params, {"id": 4, "user_id": 1})
+
+    @patch('swagger_server.dbconx.db_connection.db_desconectar')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_add_to_cart_rollback(self, mock_auth, mock_db, mock_desconectar):
+        """Test case for add_to_cart con un error de BD
+
+        Verifica que db_transaccion deshace la transacción (sin commit) y
+        devuelve la conexión al pool.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['write:cart']}
+        mock_conn = mock_db.return_value
+        mock_conn.cursor.return_value.execute.side_effect = Exception("fallo de BD")
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/cart', method='POST', data=json.dumps({'songId': 1}),
+                                    content_type='application/json')
+
+        self.assertStatus(response, 500, 'Response body is : ' + response.data.decode('utf-8'))
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+        mock_desconectar.assert_called_once_with(mock_conn)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_get_cart_products_batched(self, mock_auth, mock_db, mock_get):
+        """Test case for get_cart_products con peticiones agrupadas
+
+        Verifica que los productos del carrito se resuelven con una petición
+        /list por tipo y se devuelven en el orden del carrito.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['read:cart']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [('song', 3, None), ('song', 1, None), ('song', 2, None), ('merch', 7, 2)]
+
+        def side_effect(url, params=None, **kwargs):
+            ids = [int(i) for i in params['ids'].split(',')]
+            if url.endswith('/song/list'):
+                datos = [{"songId": i, "title": f"Song {i}", "price": 1.0} for i in sorted(ids)]
+            else:
+                datos = [{"merchId": i, "title": f"Merch {i}", "price": 9.0} for i in ids]
+            return MagicMock(ok=True, **{'json.return_value': datos})
+
+        mock_get.side_effect = side_effect
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/cart', method='GET')
+
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p.get('song_id') for p in data[:3]], [3, 1, 2])
+        self.assertEqual(data[3]['merch_id'], 7)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_get_cart_products_stale(self, mock_auth, mock_db, mock_get):
+        """Test case for get_cart_products con TyA caído
+
+        Verifica que si TyA no responde los productos se toman del último
+        snapshot del catálogo y la respuesta se marca como stale.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['read:cart']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [('song', 2, None), ('song', 5, None)]
+
+        def catalogo(url, *args, **kwargs):
+            if url.endswith('/song/filter'):
+                return MagicMock(ok=True, **{'json.return_value': [1, 2]})
+            if url.endswith('/song/list'):
+                return MagicMock(ok=True, **{'json.return_value': [
+                    {"songId": 1, "title": "Uno", "price": "1"}, {"songId": 2, "title": "Dos", "price": "2"}]})
+            return MagicMock(ok=True, **{'json.return_value': []})
+
+        mock_get.side_effect = catalogo
+        catalog_cache.invalidate()
+        catalog_cache.snapshot()
+        mock_get.side_effect = None
+        mock_get.return_value = MagicMock(ok=False, status_code=503)
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/cart', method='GET')
+
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.headers.get('X-Catalog-Stale'), 'true')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([(p['song_id'], p['name']) for p in data], [(2, 'Dos')])
+        catalog_cache.invalidate()
+
     def test_cart_without_auth(self):
         """Test case for cart operations without authentication
         
@@ -9,6 +9,7 @@ from unittest.mock import patch
 from flask import json
 from six import BytesIO
 
+from swagger_server.controllers.payment_controller import metodos_pago_cache
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.payment_method import PaymentMethod  # noqa: E501
 from swagger_server.test import BaseTestCase
@@ -17,7 +18,14 @@ from swagger_server.test import BaseTestCase
 class TestPaymentController(BaseTestCase):
     """PaymentController integration test stubs"""
 
-    @patch('swagger_server.controllers.payment_controller.db_conectar')
+    def setUp(self):
+        # db_transaccion devuelve la conexión al pool real: evitarlo en los tests
+        patcher = patch('swagger_server.dbconx.db_connection.db_desconectar')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metodos_pago_cache.clear()
+
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_add_payment_method(self, mock_db):
         """Test case for add_payment_method
         
@@ -47,7 +55,7 @@ class TestPaymentController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
-    @patch('swagger_server.controllers.payment_controller.db_conectar')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_delete_payment_method(self, mock_db):
         """Test case for delete_payment_method
 
@@ -68,7 +76,7 @@ class TestPaymentController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
-    @patch('swagger_server.controllers.payment_controller.db_conectar')
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     def test_show_user_payment_methods(self, mock_db):
         """Test case for show_user_payment_methods
         
@@ -90,6 +98,40 @@ class TestPaymentController(BaseTestCase):
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
 
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_show_user_payment_methods_cached(self, mock_auth, mock_db):
+        """Test case for show_user_payment_methods con caché
+
+        Verifica que la lista se obtiene con una única query, que la segunda
+        lectura se sirve desde caché y que un alta la invalida.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['read:payment', 'write:payment']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [(1, 1234567812345678, 12, 2030, 'John Doe')]
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/payment', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data[0]['card_number'], '**** **** **** 5678')
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+
+        response = self.client.open('/payment', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(mock_db.call_count, 1)
+
+        mock_cursor.fetchone.return_value = (2,)
+        body = PaymentMethod(card_number='8765432187654321', expire_month=1,
+                             expire_year=2031, card_holder='John Doe')
+        response = self.client.open('/payment', method='POST', data=json.dumps(body),
+                                    content_type='application/json')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        mock_cursor.fetchall.return_value = []
+        response = self.client.open('/payment', method='GET')
+        self.assertEqual(json.loads(response.data.decode('utf-8')), [])
+
+
 if __name__ == '__main__':
     import unittest
     unittest.main()
@@ -10,6 +10,7 @@ import collections.abc
 if not hasattr(collections, 'Callable'):
     collections.Callable = collections.abc.Callable
 
+from datetime import datetime
 from unittest.mock import patch
 
 from flask import json
@@ -17,13 +18,20 @@ from six import BytesIO
 
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.purchase import Purchase  # noqa: E501
+from swagger_server import util
 from swagger_server.test import BaseTestCase
 
 
 class TestPurchasesController(BaseTestCase):
     """PurchasesController integration test stubs"""
 
-    @patch('swagger_server.controllers.purchases_controller.db_conectar')
+    def setUp(self):
+        # db_transaccion devuelve la conexión al pool real: evitarlo en los tests
+        patcher = patch('swagger_server.dbconx.db_connection.db_desconectar')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
     @patch('swagger_server.controllers.purchases_controller.requests.post')
     def test_set_purchase(self, mock_post, mock_db):
         """Test case for set_purchase
@@ -65,6 +73,128 @@ class TestPurchasesController(BaseTestCase):
         
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_set_purchase_bulk(self, mock_auth, mock_db):
+        """Test case for set_purchase con un carrito grande
+
+        Verifica que el número de sentencias no depende del número de
+        productos: 2 (validación + compra) + 1 INSERT y 1 DELETE por tipo.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['write:purchases']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchone.side_effect = [(1,), (100,)]
+        mock_cursor.rowcount = 1
+
+        body = Purchase(
+            purchase_price=99.0,
+            purchase_date='2025-11-16T10:00:00Z',
+            payment_method_id=1,
+            song_ids=list(range(1, 41)),
+            album_ids=list(range(1, 6)),
+            merch_ids=list(range(1, 6))
+        )
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open(
+            '/purchase',
+            method='POST',
+            data=json.dumps(body),
+            content_type='application/json'
+        )
+
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(mock_cursor.execute.call_count, 8)
+        sql, params = mock_cursor.execute.call_args_list[2][0]
+        self.assertIn('unnest', sql)
+        self.assertEqual(params, (100, list(range(1, 41))))
+
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_get_user_purchases(self, mock_auth, mock_db):
+        """Test case for get_user_purchases
+
+        Verifica que el historial se construye con una única consulta que
+        incluye los productos de cada compra.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['read:purchases']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [
+            (2, 9.99, datetime(2025, 11, 20, 10, 0), 1, [4], [], [7, 8]),
+            (1, 1.99, datetime(2025, 11, 16, 10, 0), 1, [1, 2], [3], []),
+        ]
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/purchase', method='GET')
+
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['purchaseId'] for p in data], [2, 1])
+        self.assertEqual(data[0]['merchIds'], [7, 8])
+        self.assertEqual(data[1]['songIds'], [1, 2])
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+
+    @patch('swagger_server.dbconx.db_connection.db_conectar')
+    @patch('swagger_server.controllers.authorization_controller.is_valid_token')
+    def test_get_user_purchases_keyset(self, mock_auth, mock_db):
+        """Test case for get_user_purchases con paginación por cursor
+
+        Verifica que se devuelve como mucho `limit` compras con el cursor de
+        la página siguiente, y que un cursor inválido se rechaza con 400.
+        """
+        mock_auth.return_value = {'userId': 1, 'scopes': ['read:purchases']}
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [
+            (3, 5.0, datetime(2025, 11, 21, 10, 0), 1, [], [], []),
+            (2, 9.99, datetime(2025, 11, 20, 10, 0), 1, [4], [], []),
+            (1, 1.99, datetime(2025, 11, 16, 10, 0), 1, [1], [], []),
+        ]
+
+        self.client.set_cookie('localhost', 'oversound_auth', 'test_token_123')
+        response = self.client.open('/purchase?limit=2', method='GET')
+
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['purchaseId'] for p in data['data']], [3, 2])
+        self.assertIsNotNone(data['pagination']['nextCursor'])
+
+        response = self.client.open(
+            '/purchase', method='GET',
+            query_string=[('cursor', data['pagination']['nextCursor']), ('limit', 2)]
+        )
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        sql, params = mock_cursor.execute.call_args[0]
+        self.assertIn("(COALESCE(c.fecha, 'infinity'), c.idCompra) <", sql)
+        self.assertEqual((params['fecha'], params['id']), (datetime(2025, 11, 20, 10, 0), 2))
+
+        # Compras sin fecha: van al principio y el cursor sigue siendo válido
+        mock_cursor.fetchall.return_value = [
+            (5, 1.0, None, 1, [], [], []),
+            (4, 1.0, None, 1, [], [], []),
+            (3, 1.0, None, 1, [], [], []),
+        ]
+        response = self.client.open('/purchase?limit=2', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertIsNone(data['data'][0]['purchaseDate'])
+        response = self.client.open(
+            '/purchase', method='GET',
+            query_string=[('cursor', data['pagination']['nextCursor']), ('limit', 2)]
+        )
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        sql, params = mock_cursor.execute.call_args[0]
+        self.assertEqual((params['fecha'], params['id']), ('infinity', 4))
+
+        llamadas = mock_cursor.execute.call_count
+        response = self.client.open('/purchase?cursor=no-es-un-cursor', method='GET')
+        self.assert400(response, 'Response body is : ' + response.data.decode('utf-8'))
+
+        # Cursor bien codificado pero con una fecha manipulada: 400 sin llegar a la BD
+        cursor = util.encode_cursor({"d": "'; DROP TABLE Compras; --", "id": 1})
+        response = self.client.open('/purchase', method='GET', query_string=[('cursor', cursor)])
+        self.assert400(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(mock_cursor.execute.call_count, llamadas)
+
     def test_purchase_without_auth(self):
         """Test case for purchase without authentication
         
@@ -4,73 +4,90 @@ from __future__ import absolute_import
 import os
 os.environ['TESTING'] = 'true'  # Activar modo test antes de importar
 
+import base64
+import hashlib
+import socket
+import tempfile
+import threading
+import time
 from unittest.mock import patch, MagicMock
 
+import requests
 from flask import json
 from six import BytesIO
 
 from swagger_server.models.error import Error  # noqa: E501
 from swagger_server.models.product import Product  # noqa: E501
+from swagger_server.catalog import BlobStore, catalog_cache, cover_store, tya
+from swagger_server.controllers import cart_controller, store_controller
+from swagger_server import deadline
+from swagger_server.httpconx import Latencias, circuito, http_get, reiniciar_circuitos
 from swagger_server.test import BaseTestCase
 
 class TestStoreController(BaseTestCase):
     """StoreController integration test stubs"""
 
-    @patch('swagger_server.controllers.store_controller.requests.get')
+    def setUp(self):
+        # Cada test parte de un catálogo vacío para no depender del orden
+        catalog_cache.invalidate()
+        store_controller.paginas_cache.clear()
+
+    def _mock_tya(self, mock_get, canciones=(), albumes=(), merch=(), artistas=()):
+        """
+        Simula TyA en `mock_get`: /<tipo>/filter devuelve los IDs de la lista
+        de ese tipo y /<tipo>/list sus objetos (solo los de `ids`, si se
+        piden); el resto de endpoints, una lista vacía. Las listas se leen en
+        cada petición, así que el test puede modificarlas entre llamadas.
+
+        Returns:
+            callable: La función instalada como side_effect, para envolverla.
+        """
+        recursos = {
+            'song': (canciones, 'songId'),
+            'album': (albumes, 'albumId'),
+            'merch': (merch, 'merchId'),
+            'artist': (artistas, 'artistId'),
+        }
+
+        def respuesta(url, params=None, **kwargs):
+            _, tipo, endpoint = url.rsplit('/', 2)
+            datos = []
+            if tipo in recursos:
+                objetos, campo = recursos[tipo]
+                if endpoint == 'filter':
+                    datos = [o[campo] for o in objetos]
+                elif endpoint == 'list':
+                    ids = (params or {}).get('ids')
+                    pedidos = None if ids is None else set(str(ids).split(','))
+                    datos = [o for o in objetos if pedidos is None or str(o[campo]) in pedidos]
+            return MagicMock(ok=True, status_code=200, **{'json.return_value': datos})
+
+        mock_get.side_effect = respuesta
+        return respuesta
+
+    @patch('swagger_server.catalog.tya.http_get')
     def test_show_storefront_products(self, mock_get):
         """Test case for show_storefront_products
         
         Verifica que el endpoint /store retorna productos paginados
         desde el microservicio TyA.
         """
-        # Mock de las respuestas del microservicio TyA
-        mock_response_filter = MagicMock()
-        mock_response_filter.ok = True
-        mock_response_filter.json.return_value = [
-            {"songId": 1},
-            {"songId": 2}
-        ]
-        
-        mock_response_list = MagicMock()
-        mock_response_list.ok = True
-        mock_response_list.json.return_value = [
+        self._mock_tya(mock_get, canciones=[
             {
-                "songId": 1,
-                "title": "Test Song 1",
+                "songId": i,
+                "title": f"Test Song {i}",
                 "artistId": 1,
                 "albumId": 1,
-                "price": 1.99,
+                "price": precio,
                 "description": "Test",
                 "releaseDate": "2024-01-01",
-                "duration": 180,
-                "cover": "base64...",
-                "genres": [1],
-                "collaborators": []
-            },
-            {
-                "songId": 2,
-                "title": "Test Song 2",
-                "artistId": 1,
-                "albumId": 1,
-                "price": 2.99,
-                "description": "Test",
-                "releaseDate": "2024-01-01",
-                "duration": 200,
+                "duration": duracion,
                 "cover": "base64...",
                 "genres": [1],
                 "collaborators": []
             }
-        ]
-        
-        # Configurar mock para retornar diferentes respuestas según la URL
-        def side_effect(url, *args, **kwargs):
-            if 'filter' in url:
-                return mock_response_filter
-            elif 'list' in url:
-                return mock_response_list
-            return MagicMock(ok=False)
-        
-        mock_get.side_effect = side_effect
+            for i, precio, duracion in ((1, 1.99, 180), (2, 2.99, 200))
+        ])
         
         # Hacer la petición
         response = self.client.open(
@@ -91,6 +108,687 @@ class TestStoreController(BaseTestCase):
         self.assertIn('total', data['pagination'])
         self.assertIn('totalPages', data['pagination'])
 
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_cached(self, mock_get):
+        """Test case for show_storefront_products con caché
+
+        Verifica que una segunda petición con el snapshot fresco se sirve
+        desde memoria sin volver a consultar TyA.
+        """
+        self._mock_tya(mock_get)
+
+        response = self.client.open('/store?page=1&limit=10', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        llamadas = mock_get.call_count
+        self.assertGreater(llamadas, 0)
+
+        response = self.client.open('/store?page=2&limit=10', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(mock_get.call_count, llamadas)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_concurrent(self, mock_get):
+        """Test case for show_storefront_products con peticiones concurrentes
+
+        Verifica que las peticiones /filter de los distintos recursos se lanzan
+        en paralelo: la barrera solo se libera si las 4 están en curso a la vez.
+        """
+        barrera = threading.Barrier(4, timeout=5)
+        respuesta = self._mock_tya(mock_get)
+
+        def side_effect(url, *args, **kwargs):
+            if 'filter' in url:
+                barrera.wait()
+            return respuesta(url, *args, **kwargs)
+
+        mock_get.side_effect = side_effect
+
+        response = self.client.open('/store', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertFalse(barrera.broken)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_catalog_single_flight(self, mock_get):
+        """Test case para la coalescencia de cargas del catálogo
+
+        Verifica que varias peticiones concurrentes con la caché vacía hacen
+        una sola cadena de peticiones a TyA por recurso, y que si la carga en
+        curso se alarga más que la espera se sirve el último valor conocido.
+        """
+        liberar = threading.Event()
+        llamadas = []
+        respuesta = self._mock_tya(mock_get, canciones=[{"songId": 1, "title": "Uno", "price": "1"}])
+
+        def side_effect(url, *args, **kwargs):
+            llamadas.append(url)
+            if url.endswith('/song/filter'):
+                liberar.wait(5)
+            return respuesta(url, *args, **kwargs)
+
+        mock_get.side_effect = side_effect
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(catalog_cache.snapshot())) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(0.2)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertEqual(len(resultados), 6)
+        self.assertEqual(sum(url.endswith('/song/filter') for url in llamadas), 1)
+        self.assertTrue(all(len(r.products) == 1 for r in resultados))
+
+        # Carga lenta con valor previo: la espera acotada devuelve el último valor
+        liberar.clear()
+        lider = threading.Thread(target=catalog_cache._load, args=('songs',))
+        with patch.object(catalog_cache, 'espera', 0.1):
+            lider.start()
+            time.sleep(0.05)
+            inicio = time.monotonic()
+            valor = catalog_cache._load('songs')
+            self.assertLess(time.monotonic() - inicio, 1)
+        liberar.set()
+        lider.join(5)
+        self.assertEqual([p['songId'] for p in valor], [1])
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_catalog_rebuild_outside_lock(self, mock_get):
+        """Test case para la reconstrucción del snapshot
+
+        Verifica que mientras el hilo que ha cargado un recurso nuevo
+        reconstruye el snapshot (índices y búsqueda), las peticiones siguen
+        recibiendo el snapshot anterior sin esperar, y que al terminar se
+        sustituye por el nuevo.
+        """
+        canciones = [{"songId": 1, "title": "Uno", "price": "1"}]
+        self._mock_tya(mock_get, canciones=canciones)
+        anterior = catalog_cache.snapshot()
+
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        actualizar = catalog_cache.search.actualizar
+
+        def actualizar_lento(*args):
+            liberar.wait(5)
+            return actualizar(*args)
+
+        canciones.append({"songId": 2, "title": "Dos", "price": "1"})
+        with patch.object(catalog_cache.search, 'actualizar', side_effect=actualizar_lento):
+            refresco = threading.Thread(target=catalog_cache._load, args=('songs',))
+            refresco.start()
+            time.sleep(0.1)
+            inicio = time.monotonic()
+            self.assertIs(catalog_cache.snapshot(), anterior)
+            self.assertLess(time.monotonic() - inicio, 1)
+            liberar.set()
+            refresco.join(5)
+        self.assertEqual([p['songId'] for p in catalog_cache.snapshot().products], [1, 2])
+
+    @patch('swagger_server.httpconx.http_client._sesion')
+    def test_show_storefront_products_circuit_breaker(self, mock_sesion):
+        """Test case para el circuit breaker de TyA
+
+        Verifica que tras varios fallos seguidos el circuito de un endpoint se
+        abre y deja de llamar a TyA, que /store sirve entonces el último
+        snapshot bueno marcado como stale, y que una llamada de prueba con
+        éxito vuelve a cerrarlo.
+        """
+        reiniciar_circuitos()
+        self.addCleanup(reiniciar_circuitos)
+        respuesta = self._mock_tya(mock_sesion.get, canciones=[{"songId": 1, "title": "Uno", "price": "1"}])
+        catalog_cache.snapshot()
+
+        mock_sesion.get.side_effect = requests.ConnectionError("TyA caído")
+        breaker = circuito('/song/filter')
+        for _ in range(breaker.minimo):
+            self.assertIsNone(tya.fetch_songs())
+        llamadas = mock_sesion.get.call_count
+        self.assertIsNone(tya.fetch_songs())
+        self.assertEqual(mock_sesion.get.call_count, llamadas)
+        self.assertTrue(tya.degradado())
+
+        catalog_cache._load('songs')
+        response = self.client.open('/store', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.headers.get('X-Catalog-Stale'), 'true')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual([p['songId'] for p in json.loads(response.data)['data']], [1])
+
+        # Pasado el tiempo de apertura, una prueba correcta cierra el circuito
+        mock_sesion.get.side_effect = respuesta
+        with patch.object(breaker, 'tiempo_abierto', 0):
+            self.assertEqual(len(tya.fetch_songs()), 1)
+        self.assertFalse(tya.degradado())
+
+    @patch.dict('swagger_server.deadline.REQUEST_DEADLINES', {'show_storefront_products': 0.3})
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_deadline(self, mock_get):
+        """Test case for show_storefront_products con presupuesto de tiempo
+
+        Verifica que si TyA tarda más que el presupuesto de la operación se
+        responde a tiempo con los recursos disponibles y la cabecera
+        X-Partial-Response, y que el snapshot parcial no se guarda.
+        """
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        respuesta = self._mock_tya(mock_get, canciones=[{"songId": 1, "title": "Uno", "price": "1"}],
+                                   merch=[{"merchId": 4, "title": "Taza", "price": "8"}])
+
+        def side_effect(url, *args, **kwargs):
+            if url.endswith('/song/filter'):
+                liberar.wait(5)
+            return respuesta(url, *args, **kwargs)
+
+        mock_get.side_effect = side_effect
+
+        inicio = time.monotonic()
+        response = self.client.open('/store', method='GET')
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.headers.get('X-Partial-Response'), 'true')
+        self.assertEqual([p['merchId'] for p in json.loads(response.data)['data']], [4])
+
+        liberar.set()
+        time.sleep(0.2)
+        response = self.client.open('/store', method='GET')
+        self.assertNotIn('X-Partial-Response', response.headers)
+        self.assertEqual(json.loads(response.data)['pagination']['total'], 2)
+
+    @patch('swagger_server.httpconx.http_client._sesion')
+    def test_http_get_deadline(self, mock_sesion):
+        """Test case para el recorte de timeouts al presupuesto de la petición"""
+        mock_sesion.get.return_value = MagicMock(status_code=200)
+        self.addCleanup(deadline.terminar)
+        deadline.iniciar(0.5)
+        http_get('http://tya/song/list', timeout=5)
+        _, lectura = mock_sesion.get.call_args[1]['timeout']
+        self.assertLessEqual(lectura, 0.5)
+
+        deadline.iniciar(0.001)
+        time.sleep(0.01)
+        with self.assertRaises(requests.Timeout):
+            http_get('http://tya/song/list', timeout=5)
+        self.assertEqual(mock_sesion.get.call_count, 1)
+
+    @patch('swagger_server.httpconx.http_client._sesion')
+    def test_circuit_breaker_neutral_results(self, mock_sesion):
+        """Test case para los resultados que no cuentan en el circuit breaker
+
+        Verifica que un timeout recortado por el presupuesto de la petición no
+        cuenta como fallo de TyA, y que con el circuito semiabierto el
+        resultado de una llamada admitida antes de abrirse no cierra el
+        circuito: solo cuenta el de la llamada de prueba.
+        """
+        reiniciar_circuitos()
+        self.addCleanup(reiniciar_circuitos)
+        self.addCleanup(deadline.terminar)
+        breaker = circuito('/song/list')
+
+        mock_sesion.get.side_effect = requests.ReadTimeout("lenta")
+        deadline.iniciar(0.5)
+        for _ in range(breaker.minimo):
+            with self.assertRaises(requests.Timeout):
+                http_get('http://tya/song/list', timeout=5, circuito_nombre='/song/list')
+        deadline.terminar()
+        self.assertEqual(breaker.estado, 'cerrado')
+
+        tardia = breaker.permitir()
+        for _ in range(breaker.minimo):
+            breaker.registrar(breaker.permitir(), False)
+        self.assertEqual(breaker.estado, 'abierto')
+
+        with patch.object(breaker, 'tiempo_abierto', 0):
+            prueba = breaker.permitir()
+            self.assertIsNotNone(prueba)
+            self.assertIsNone(breaker.permitir())
+            breaker.registrar(tardia, True)
+            self.assertEqual(breaker.estado, 'semiabierto')
+            breaker.registrar(prueba, True)
+            self.assertEqual(breaker.estado, 'cerrado')
+
+    @patch('swagger_server.catalog.tya.TYA_RETRY_BACKOFF', 0.001)
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_tya_retries(self, mock_get):
+        """Test case para los reintentos a TyA
+
+        Verifica que los errores de conexión y los 503 se reintentan hasta
+        obtener respuesta y que los reintentos quedan contados.
+        """
+        tya.contadores.reiniciar()
+        mock_get.side_effect = [
+            requests.ConnectionError("reset"),
+            MagicMock(ok=False, status_code=503),
+            MagicMock(ok=True, status_code=200, **{'json.return_value': [{"id": 1, "name": "Rock"}]}),
+        ]
+
+        self.assertEqual(tya.fetch_genres(), [{"id": 1, "name": "Rock"}])
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(tya.estadisticas()['/genres']['reintentos'], 2)
+
+        mock_get.side_effect = None
+        mock_get.return_value = MagicMock(ok=False, status_code=404)
+        self.assertIsNone(tya.fetch_genres())
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_tya_hedged_request(self, mock_get):
+        """Test case para las hedged requests a TyA
+
+        Verifica que si una petición a un /list tarda más que el p95 observado
+        se envía un duplicado y se usa la primera respuesta.
+        """
+        tya.contadores.reiniciar()
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        latencias = Latencias(minimo=5)
+        for _ in range(20):
+            latencias.registrar(0.01)
+        llamadas = []
+
+        def side_effect(url, *args, **kwargs):
+            llamadas.append(url)
+            if len(llamadas) == 1:
+                liberar.wait(5)
+            return MagicMock(ok=True, status_code=200, **{'json.return_value': [{"songId": 1}]})
+
+        mock_get.side_effect = side_effect
+
+        with patch.dict(tya._latencias, {'/song/list': latencias}):
+            inicio = time.monotonic()
+            self.assertEqual(tya.fetch_list('song', [1]), [{"songId": 1}])
+            self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(len(llamadas), 2)
+        self.assertEqual(tya.estadisticas()['/song/list']['hedges'], 1)
+        self.assertEqual(tya.estadisticas()['/song/list']['hedges_ganados'], 1)
+
+    @patch('swagger_server.controllers.store_controller.STORE_FETCH_MODE', 'paged')
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_paged(self, mock_get):
+        """Test case for show_storefront_products en modo paged
+
+        Verifica que solo se piden a TyA los detalles de los productos de la
+        página solicitada.
+        """
+        self._mock_tya(mock_get, canciones=[{"songId": i, "title": f"Song {i}", "price": "1,99"} for i in range(1, 26)])
+
+        response = self.client.open('/store?page=2&limit=10', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['pagination']['total'], 25)
+        self.assertEqual(data['pagination']['totalPages'], 3)
+        self.assertEqual([p['songId'] for p in data['data']], list(range(11, 21)))
+
+        peticiones_list = [c for c in mock_get.call_args_list if c[0][0].endswith('/song/list')]
+        self.assertEqual(len(peticiones_list), 1)
+        self.assertEqual(peticiones_list[0][1]['params']['ids'], ",".join(map(str, range(11, 21))))
+
+        # La página siguiente por cursor también se resuelve con /filter y un /list
+        with patch.object(store_controller.catalog_cache, 'snapshot') as mock_snapshot:
+            response = self.client.open('/store?limit=10&cursor=' + data['pagination']['nextCursor'],
+                                        method='GET')
+            mock_snapshot.assert_not_called()
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['songId'] for p in data['data']], list(range(21, 26)))
+        self.assertIsNone(data['pagination']['nextCursor'])
+        peticiones_list = [c for c in mock_get.call_args_list if c[0][0].endswith('/song/list')]
+        self.assertEqual(peticiones_list[-1][1]['params']['ids'], ",".join(map(str, range(21, 26))))
+
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_serialized(self, mock_get):
+        """Test case for show_storefront_products con páginas serializadas
+
+        Verifica que una página repetida se sirve con los mismos bytes sin
+        volver a serializarla, y que un cambio en el catálogo la invalida.
+        """
+        canciones = [{"songId": 1, "title": "Canción", "price": "1,99"}]
+        self._mock_tya(mock_get, canciones=canciones)
+
+        with patch.object(store_controller, '_serializar', wraps=store_controller._serializar) as serializar:
+            primera = self.client.open('/store?page=1&limit=10', method='GET')
+            segunda = self.client.open('/store?page=1&limit=10', method='GET')
+            self.assert200(segunda, 'Response body is : ' + segunda.data.decode('utf-8'))
+            self.assertEqual(primera.data, segunda.data)
+            self.assertEqual(serializar.call_count, 1)
+            self.assertEqual(json.loads(segunda.data)['data'][0]['name'], 'Canción')
+
+            canciones[0]["title"] = "Otra canción"
+            catalog_cache.invalidate()
+            tercera = self.client.open('/store?page=1&limit=10', method='GET')
+            self.assertEqual(json.loads(tercera.data)['data'][0]['name'], 'Otra canción')
+            self.assertEqual(serializar.call_count, 2)
+
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_etag(self, mock_get):
+        """Test case for show_storefront_products con petición condicional
+
+        Verifica que la respuesta incluye ETag y Cache-Control, y que un
+        If-None-Match vigente se responde con 304 sin cuerpo.
+        """
+        self._mock_tya(mock_get)
+
+        response = self.client.open('/store?page=1&limit=10', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        etag = response.headers['ETag']
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        with patch.object(store_controller, '_serializar') as serializar:
+            response = self.client.open('/store?page=1&limit=10', method='GET',
+                                        headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            self.assertEqual(response.headers['ETag'], etag)
+            serializar.assert_not_called()
+
+        response = self.client.open('/store?page=1&limit=5', method='GET',
+                                    headers={'If-None-Match': etag})
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        # Un ETag debilitado por un proxy (W/"...") también vale para el 304
+        response = self.client.open('/store?page=1&limit=10', method='GET',
+                                    headers={'If-None-Match': 'W/' + etag})
+        self.assertEqual(response.status_code, 304)
+
+        # En modo paged el ETag es la huella del cuerpo
+        with patch.object(store_controller, 'STORE_FETCH_MODE', 'paged'):
+            response = self.client.open('/store?page=1&limit=10', method='GET')
+            self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+            etag = response.headers['ETag']
+            response = self.client.open('/store?page=1&limit=10', method='GET',
+                                        headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_product_cover(self, mock_get):
+        """Test case for show_product_cover y /store?covers=url
+
+        Verifica que con covers=url los listados llevan coverUrl en lugar del
+        base64 y que la portada se sirve en binario con caché de larga duración.
+        """
+        imagen = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+        cover = "data:image/png;base64," + base64.b64encode(imagen).decode("ascii")
+        self._mock_tya(mock_get, canciones=[{"songId": 1, "title": "Canción", "price": "1,99", "cover": cover}])
+
+        # El snapshot solo guarda la referencia; el base64 se reconstruye al serializar
+        response = self.client.open('/store', method='GET')
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['data'][0]['cover'], cover)
+        self.assertEqual(catalog_cache.snapshot().products[0]['cover'].etag, hashlib.sha256(imagen).hexdigest())
+
+        response = self.client.open('/store?covers=url', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        producto = json.loads(response.data.decode('utf-8'))['data'][0]
+        self.assertIsNone(producto['cover'])
+        self.assertTrue(producto['coverUrl'].startswith('/store/cover/song/1?v='))
+
+        version = producto['coverUrl'].split('?v=')[1]
+        with self.app.test_request_context(producto['coverUrl']):
+            response = store_controller.show_product_cover('song', 1, v=version)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.response), imagen)
+        response.close()
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        with self.app.test_request_context('/store/cover/song/1',
+                                           headers={'If-None-Match': response.headers['ETag']}):
+            self.assertEqual(store_controller.show_product_cover('song', 1).status_code, 304)
+
+        with self.app.test_request_context('/store/cover/album/1'):
+            _, status = store_controller.show_product_cover('album', 1)
+        self.assertEqual(status, 404)
+
+        # La portada se localiza por su hash, sin cargar el catálogo: sirve
+        # para productos que no están en el snapshot (p. ej. del carrito)
+        otra = b"\xff\xd8\xff" + b"\x01" * 16
+        url = cover_store.url('merch', 7, cover_store.registrar(base64.b64encode(otra).decode("ascii")))
+        with patch.object(catalog_cache, 'snapshot') as mock_snapshot, \
+                self.app.test_request_context(url):
+            response = store_controller.show_product_cover('merch', 7, v=url.split('?v=')[1])
+            mock_snapshot.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.response), otra)
+        response.close()
+        self.assertEqual(response.mimetype, 'image/jpeg')
+
+        with self.app.test_request_context('/store/cover/merch/7?v=' + '0' * 64):
+            _, status = store_controller.show_product_cover('merch', 7, v='0' * 64)
+        self.assertEqual(status, 404)
+
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_filters(self, mock_get):
+        """Test case for show_storefront_products con filtros y orden
+
+        Verifica que los filtros se combinan, que el orden se aplica y que la
+        paginación se calcula sobre los productos filtrados.
+        """
+        canciones = [
+            {"songId": i, "title": f"Canción {i}", "price": str(i), "genres": [1 + i % 2], "artistId": 7}
+            for i in range(1, 11)
+        ]
+        merch = [{"merchId": 1, "title": "Camiseta", "price": "15", "artistId": 7}]
+        self._mock_tya(mock_get, canciones=canciones, merch=merch)
+
+        response = self.client.open('/store?genre=2&sort=-price&limit=3', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['songId'] for p in data['data']], [9, 7, 5])
+        self.assertEqual(data['pagination']['total'], 5)
+        self.assertEqual(data['pagination']['totalPages'], 2)
+
+        with self.app.test_request_context('/store'):
+            response = store_controller.show_storefront_products(
+                artist=7, min_price=8, max_price=15, sort='price')
+        data = json.loads(response.get_data())
+        self.assertEqual([p['name'] for p in data['data']],
+                         ['Canción 8', 'Canción 9', 'Canción 10', 'Camiseta'])
+
+        with self.app.test_request_context('/store'):
+            response = store_controller.show_storefront_products(type_='merch')
+        self.assertEqual(json.loads(response.get_data())['pagination']['total'], 1)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_cursor(self, mock_get):
+        """Test case for show_storefront_products con paginación por cursor
+
+        Verifica que encadenando nextCursor se recorre el catálogo completo sin
+        repetir productos, que tras un refresco del catálogo la página
+        siguiente empieza justo después del último producto entregado y que
+        un cursor inválido o de otra consulta se rechaza con 400.
+        """
+        canciones = [{"songId": i, "title": f"Canción {i}", "price": str(i)} for i in range(1, 6)]
+        self._mock_tya(mock_get, canciones=canciones)
+
+        vistos = []
+        response = self.client.open('/store?limit=2&sort=-price', method='GET')
+        while True:
+            self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+            data = json.loads(response.data.decode('utf-8'))
+            vistos.extend(p['songId'] for p in data['data'])
+            siguiente = data['pagination']['nextCursor']
+            if siguiente is None:
+                break
+            response = self.client.open('/store', method='GET',
+                                        query_string=[('limit', 2), ('sort', '-price'), ('cursor', siguiente)])
+        self.assertEqual(vistos, [5, 4, 3, 2, 1])
+
+        response = self.client.open('/store?limit=2', method='GET')
+        siguiente = json.loads(response.data.decode('utf-8'))['pagination']['nextCursor']
+
+        # Entra una canción al principio del catálogo: con `page` se repetiría la 2
+        canciones.insert(0, {"songId": 9, "title": "Nueva", "price": "9"})
+        catalog_cache.invalidate()
+        response = self.client.open('/store', method='GET', query_string=[('limit', 2), ('cursor', siguiente)])
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['songId'] for p in data['data']], [3, 4])
+
+        response = self.client.open('/store', method='GET',
+                                    query_string=[('sort', 'name'), ('cursor', siguiente)])
+        self.assert400(response)
+        response = self.client.open('/store?cursor=no-es-un-cursor', method='GET')
+        self.assert400(response)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_search_store_products(self, mock_get):
+        """Test case for search_store_products
+
+        Verifica que la búsqueda ignora tildes y mayúsculas, busca también por
+        nombre de artista, ordena por relevancia y refleja los cambios del
+        catálogo tras un refresco.
+        """
+        canciones = [
+            {"songId": 1, "title": "Canción del verano", "artistId": 1, "price": "1"},
+            {"songId": 2, "title": "Otra", "artistId": 2, "price": "1", "description": "Una canción triste"},
+            {"songId": 3, "title": "Malamente", "artistId": 1, "price": "1"},
+        ]
+        artistas = [{"artistId": 1, "artisticName": "Rosalía"}, {"artistId": 2, "artisticName": "Otro"}]
+        self._mock_tya(mock_get, canciones=canciones, artistas=artistas)
+
+        response = self.client.open('/store/search?q=CANCION', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([p['songId'] for p in data['data']], [1, 2])
+        self.assertEqual(data['pagination']['total'], 2)
+
+        response = self.client.open('/store/search?q=rosalia mala', method='GET')
+        self.assertEqual([p['songId'] for p in json.loads(response.data)['data']], [3])
+
+        canciones[2]["title"] = "Canción nueva"
+        catalog_cache.invalidate()
+        response = self.client.open('/store/search?q=cancion', method='GET')
+        self.assertEqual(json.loads(response.data)['pagination']['total'], 3)
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_cover_inline_fidelity(self, mock_get):
+        """Test case for covers=inline
+
+        Verifica que /store y /cart devuelven la cadena de portada de TyA byte
+        a byte: base64 sin prefijo, base64 partido en líneas, la misma imagen
+        con distinto tipo MIME declarado y cadenas que no son base64.
+        """
+        imagen = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+        codificada = base64.b64encode(imagen).decode("ascii")
+        portadas = {
+            1: codificada,
+            2: "data:image/x-png;base64," + codificada,
+            3: "data:image/png;base64," + codificada,
+            4: codificada[:40] + "\n" + codificada[40:],
+            5: "no es base64!",
+        }
+
+        self._mock_tya(mock_get, canciones=[{"songId": i, "title": f"Canción {i}", "cover": c}
+                                            for i, c in portadas.items()])
+
+        response = self.client.open('/store', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        por_id = {p['songId']: p['cover'] for p in json.loads(response.data.decode('utf-8'))['data']}
+        self.assertEqual(por_id, portadas)
+
+        snapshot = catalog_cache.snapshot()
+        for product_id, cover in portadas.items():
+            producto = cart_controller._producto_desde_snapshot(snapshot.index[('song', product_id)])
+            self.assertEqual(producto.cover, cover)
+            self.assertEqual(cart_controller._producto_desde_tya("song", {"title": "Canción", "price": 1.0, "cover": cover}).cover, cover)
+
+    def test_cover_blob_store(self):
+        """Test case for BlobStore
+
+        Verifica que los blobs se deduplican por contenido, se leen desde el
+        mmap sin copia y se conservan al reabrir el almacén.
+        """
+        with tempfile.TemporaryDirectory() as directorio:
+            blobs = BlobStore(directorio)
+            h1 = blobs.put(b"portada-1", "image/png")
+            h2 = blobs.put(b"portada-2", "image/jpeg")
+            self.assertEqual(blobs.put(b"portada-1", "image/png"), h1)
+            self.assertEqual(len(blobs), 2)
+
+            vista, mimetype = blobs.get(h2)
+            self.assertIsInstance(vista, memoryview)
+            self.assertEqual((bytes(vista), mimetype), (b"portada-2", "image/jpeg"))
+            vista.release()
+
+            reabierto = BlobStore(directorio)
+            segmento = reabierto.open(h1)
+            self.assertEqual(segmento.read(), b"portada-1")
+            segmento.close()
+            self.assertIsNone(reabierto.get("0" * 64))
+
+        # Compactación al superar max_bytes: se conservan los blobs usados
+        # desde la compactación anterior o en el periodo previo
+        with tempfile.TemporaryDirectory() as directorio:
+            blobs = BlobStore(directorio, max_bytes=100)
+            viejo = blobs.put(b"v" * 40, "image/png")
+            blobs.compactar()
+            blobs.compactar()
+            self.assertIn(viejo, blobs)
+            vivo = blobs.put(b"a" * 40, "image/png")
+            blobs.get(vivo)[0].release()
+            blobs.put(b"b" * 40, "image/png")  # Supera max_bytes: compacta
+            self.assertNotIn(viejo, blobs)
+            self.assertEqual(len(blobs), 2)
+            self.assertLessEqual(os.path.getsize(blobs.ruta_datos), 80)
+
+            # Otro proceso (otra instancia) detecta la compactación y relee el índice
+            vista, _ = BlobStore(directorio).get(vivo)
+            self.assertEqual(bytes(vista), b"a" * 40)
+            vista.release()
+
+        # Entre procesos: no se compactan los blobs que retiene el catálogo
+        # vivo de otro proceso, y put() vuelve a guardar los que desaparecen
+        with tempfile.TemporaryDirectory() as directorio:
+            worker_a = BlobStore(directorio)
+            worker_b = BlobStore(directorio)
+            retenido = worker_a.put(b"r" * 40, "image/png")
+            suelto = worker_a.put(b"s" * 40, "image/png")
+            worker_a.retener([retenido])
+            # Fichero de un proceso de este host que ya no existe
+            muerto = os.path.join(directorio, f"covers.vivos.{socket.gethostname()}.999999999")
+            with open(muerto, 'w') as f:
+                f.write(suelto + "\n")
+            worker_b.compactar()
+            worker_b.compactar()
+            self.assertFalse(os.path.exists(muerto))
+            self.assertIn(retenido, worker_a)
+            self.assertNotIn(suelto, worker_a)
+            self.assertEqual(worker_a.put(b"s" * 40, "image/png"), suelto)
+            vista, _ = worker_b.get(suelto)
+            self.assertEqual(bytes(vista), b"s" * 40)
+            vista.release()
+
+    @patch('swagger_server.catalog.tya.http_get')
+    def test_show_storefront_products_missing_covers(self, mock_get):
+        """Test case for show_storefront_products sin el blob de una portada
+
+        Verifica que una página cuyas portadas ya no están en el almacén no se
+        cachea, va marcada como parcial y no comparte ETag con la completa.
+        """
+        cover = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x02" * 32).decode("ascii")
+
+        self._mock_tya(mock_get, canciones=[{"songId": 1, "title": "Canción", "price": 1.0, "cover": cover}])
+        catalog_cache.snapshot()
+
+        with patch.object(cover_store.blobs, 'get', return_value=None):
+            response = self.client.open('/store', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertIsNone(json.loads(response.data.decode('utf-8'))['data'][0]['cover'])
+        self.assertEqual(response.headers['X-Partial-Response'], 'true')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        incompleta = response.headers['ETag']
+        self.assertEqual(len(store_controller.paginas_cache), 0)
+
+        response = self.client.open('/store', method='GET', headers={'If-None-Match': incompleta})
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['data'][0]['cover'], cover)
+        self.assertNotEqual(response.headers['ETag'], incompleta)
+        self.assertEqual(len(store_controller.paginas_cache), 1)
+
 
 if __name__ == '__main__':
     import unittest
@@ -1,4 +1,6 @@
+import base64
 import datetime
+import json
 
 import six
 import typing
@@ -140,3 +142,34 @@ def _deserialize_dict(data, boxed_type):
     """
     return {k: _deserialize(v, boxed_type)
             for k, v in six.iteritems(data)}
+
+
+def encode_cursor(data):
+    """Encodes pagination state as an opaque, URL-safe cursor.
+
+    :param data: JSON-serializable pagination state.
+    :type data: dict
+    :return: cursor string.
+    :rtype: str
+    """
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor created by encode_cursor.
+
+    :param cursor: cursor string.
+    :type cursor: str
+    :return: pagination state.
+    :rtype: dict
+    :raises ValueError: if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw.decode('utf-8'))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor: {}".format(e))
+    if not isinstance(data, dict):
+        raise ValueError("Invalid cursor")
+    return data